@@ -0,0 +1,320 @@
+import math
+import random
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import courier_of_possibilities as game
+
+# ==========================
+# Courier Advisor
+# ==========================
+# Open-loop Monte Carlo tree search over whole turns. A tree edge is one
+# turn's decision (delivery effect, mission advice); the random parts of a
+# turn (jitter, side effect, paradox scenario) are re-drawn on every
+# iteration, so a node holds the statistics of "this sequence of decisions"
+# over everything the dice might do.
+#
+# Pairs with the same (harmony, ripple) delivery effect play identically
+# for the endings, so edges are keyed by effect class: 16 classes x 3
+# advice instead of 20 parcels x 6 civs x 3. At the root only the classes
+# the current offer can reach are legal; deeper turns assume the free
+# [R] refresh and allow all of them. Classes come from the catalog's tag
+# index (game.delivery_groups), at most four civ groups per parcel, so
+# they cost parcels x 4 rather than parcels x civs to work out.
+#
+# Reward: golden 1.0, bittersweet 0.5, chaotic 0.1, nothing yet 0, times
+# DISCOUNT per turn taken, so reaching the same ending sooner scores higher.
+
+ENDING_REWARD = {game.ENDING_GOLDEN: 1.0, game.ENDING_BITTERSWEET: 0.5, game.ENDING_CHAOTIC: 0.1}
+DISCOUNT = 0.97
+
+Advice = namedtuple("Advice", "parcel civ advice value visits iterations")
+
+
+class Node:
+    __slots__ = ("visits", "total", "children")
+
+    def __init__(self):
+        self.visits = 0
+        self.total = 0.0
+        self.children = {}  # (effect class, advice index) -> Node
+
+
+def effect_classes():
+    # (classes, groups): classes[e] = representative (parcel index, civ
+    # index); groups[p] = [(e, civ bitset)], the civs for which parcel p
+    # has effect class e, ordered by their lowest civ index.
+    index = {}
+    classes = []
+    groups = []
+    for parcel in game.PARCELS:
+        pi = parcel["index"]
+        row = {}
+        for (harmony, _, ripple), civs in game.delivery_groups(parcel):
+            e = index.get((harmony, ripple))
+            if e is None:
+                e = index[harmony, ripple] = len(classes)
+                classes.append((pi, game.first_index(civs)))
+            row[e] = row.get(e, 0) | civs
+        groups.append(sorted(row.items(), key=lambda group: game.first_index(group[1])))
+    return classes, groups
+
+
+# ==========================
+# Simulation
+# ==========================
+
+
+def _best_patch(scenario):
+    options = scenario["options"]
+    return min(range(len(options)), key=lambda i: (options[i][1]["ripple"], -options[i][1]["harmony_all"]))
+
+
+def play_turn(state, parcel, civ, advice, rng, last_turn=False):
+    # One turn of the rules with the given decisions; returns the ending if
+    # the turn finished the game. The finale is attempted as soon as it is
+    # golden, or on the last simulated turn whatever it gives.
+    state.turn += 1
+    game.resolve_delivery(state, parcel, civ, rng)
+    game.draw_mission_scenario(rng)
+    game.apply_mission_advice(state, civ, advice)
+    if game.paradox_due(state):
+        scenario = game.trigger_paradox(state, rng)
+        game.apply_paradox_patch(state, scenario, _best_patch(scenario))
+    if game.final_puzzle_ready(state) and (state.ripple_index <= game.PARADOX_THRESHOLD or last_turn):
+        state.unlocked_final = True
+        return game.ending_for(state, 3)
+    return None
+
+
+def rollout(state, turns_left, rng, classes, scores):
+    # Default policy: mostly the best-scoring effect class, sometimes a
+    # random one, always the calmest advice.
+    calm = min(range(len(game.MISSION_OPTIONS)), key=lambda i: game.MISSION_OPTIONS[i][1]["ripple"])
+    best = max(range(len(classes)), key=scores.__getitem__)
+    for used in range(turns_left):
+        e = best if rng.random() < 0.8 else rng.randrange(len(classes))
+        pi, ci = classes[e]
+        ending = play_turn(state, game.PARCELS[pi], game.CIVILIZATIONS[ci], calm, rng, used == turns_left - 1)
+        if ending:
+            return ENDING_REWARD[ending] * DISCOUNT ** (used + 1)
+    return 0.0
+
+
+_worker_tables = None
+
+
+def _init_worker(packs):
+    # A spawned worker starts from the built-in catalog: install the game's
+    # content packs, in the same order, so effect classes index the same
+    # parcels and civs as in the game.
+    global _worker_tables
+    if packs:
+        from courier_content import install_packs
+
+        install_packs(packs, missing_only=True)
+    classes, _ = effect_classes()
+    _worker_tables = classes, _class_scores(classes)
+
+
+def _rollout_job(job):
+    # Runs in a worker process: (state, turns_left, seed) -> reward.
+    state, turns_left, seed = job
+    classes, scores = _worker_tables
+    return rollout(state, turns_left, random.Random(seed), classes, scores)
+
+
+def _class_scores(classes):
+    scores = []
+    for pi, ci in classes:
+        harmony, _, ripple = game.EFFECT_TABLE[pi][ci]
+        scores.append(harmony - 2 * ripple)
+    return scores
+
+
+# ==========================
+# Search
+# ==========================
+
+
+class CourierAdvisor:
+    def __init__(self, budget=0.05, horizon=12, workers=0, batch=None, exploration=0.7, seed=None, packs=()):
+        # budget: seconds per advise() call. workers > 0 farms rollouts out
+        # to that many processes, `batch` leaves at a time (virtual loss
+        # keeps the leaves of one batch apart). packs: the content pack
+        # paths the game installed, for the workers to install too.
+        self.budget = budget
+        self.horizon = horizon
+        self.exploration = exploration
+        self.rng = random.Random(seed)
+        self.classes, self.groups = effect_classes()
+        self.scores = _class_scores(self.classes)
+        advice_count = len(game.MISSION_OPTIONS)
+        self.all_actions = [(e, a) for e in range(len(self.classes)) for a in range(advice_count)]
+        self.workers = workers
+        self.batch = batch or 2 * workers
+        self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(list(packs),)) if workers else None
+        self.root = Node()
+        self.root_state = None
+        self.root_actions = []
+        self.offer = []
+
+    # -- public API
+
+    def advise(self, state, offer, stop=None):
+        # Best (parcel, civ, advice) for this turn, given the parcels on
+        # offer, or None if there is nothing to choose from. Returns within
+        # the time budget, with whatever the search found by then; sooner if
+        # the `stop` threading.Event gets set. The search forks `state` on
+        # every iteration, so when it runs on another thread it must be
+        # given a copy the game does not touch (state.fork() made by the
+        # game's thread).
+        deadline = time.perf_counter() + self.budget
+        if not offer:
+            return None
+        self.root_state = state
+        self.offer = offer
+        self.root_actions = sorted({
+            (e, a)
+            for parcel in offer
+            for e, _ in self.groups[parcel["index"]]
+            for a in range(len(game.MISSION_OPTIONS))
+        })
+        iterations = 0
+        while True:
+            iterations += self._search_batch() if self.pool else self._search_once()
+            if time.perf_counter() >= deadline or (stop is not None and stop.is_set()):
+                break
+        return self._recommend(iterations)
+
+    def best_civ(self, parcel):
+        # Best destination for a parcel the player picked, from the last search.
+        _, civs = max(self.groups[parcel["index"]], key=lambda group: self._class_value(group[0]))
+        return game.CIVILIZATIONS[game.first_index(civs)]
+
+    def best_advice(self, parcel, civ):
+        e = self._class(parcel, civ)
+        return max(range(len(game.MISSION_OPTIONS)), key=lambda a: self._rank(self.root.children.get((e, a))))
+
+    def commit(self, parcel, civ, advice):
+        # The player made their move: keep that subtree for the next turn.
+        action = (self._class(parcel, civ), advice)
+        self.root = self.root.children.get(action) or Node()
+
+    def reset(self):
+        # The game went somewhere the tree does not cover (an undo).
+        self.root = Node()
+
+    def close(self):
+        if self.pool:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    # -- tree policy
+
+    def _mean(self, node):
+        return node.total / node.visits if node and node.visits else -1.0
+
+    def _rank(self, node):
+        # Most visited wins (the robust child), mean reward breaks ties.
+        return (node.visits, self._mean(node)) if node else (0, -1.0)
+
+    def _class(self, parcel, civ):
+        bit = 1 << civ["index"]
+        for e, civs in self.groups[parcel["index"]]:
+            if civs & bit:
+                return e
+
+    def _class_value(self, e):
+        return max(self._rank(self.root.children.get((e, a))) for a in range(len(game.MISSION_OPTIONS)))
+
+    def _select(self, node, actions):
+        # UCB1 over legal actions; untried ones first.
+        untried = [a for a in actions if a not in node.children]
+        if untried:
+            action = self.rng.choice(untried)
+            node.children[action] = Node()
+            return action, True
+        log_n = math.log(node.visits + 1)
+        c = self.exploration
+        best = None
+        best_score = -1.0
+        children = node.children
+        for action in actions:
+            child = children[action]
+            score = child.total / child.visits + c * math.sqrt(log_n / child.visits)
+            if score > best_score:
+                best, best_score = action, score
+        return best, False
+
+    def _descend(self, rng):
+        # Walk the tree; returns (path, state at the leaf, turns used,
+        # reward if the game ended inside the tree, else None).
+        state = self.root_state.fork()
+        node = self.root
+        path = [node]
+        actions = self.root_actions
+        for depth in range(self.horizon):
+            action, new = self._select(node, actions)
+            node = node.children[action]
+            path.append(node)
+            e, advice = action
+            pi, ci = self.classes[e]
+            ending = play_turn(state, game.PARCELS[pi], game.CIVILIZATIONS[ci], advice, rng, depth == self.horizon - 1)
+            if ending:
+                return path, state, depth + 1, ENDING_REWARD[ending] * DISCOUNT ** (depth + 1)
+            if new:
+                return path, state, depth + 1, None
+            actions = self.all_actions
+        return path, state, self.horizon, 0.0
+
+    def _backup(self, path, reward):
+        for node in path:
+            node.visits += 1
+            node.total += reward
+
+    def _search_once(self):
+        path, state, used, reward = self._descend(self.rng)
+        if reward is None:
+            rest = rollout(state, self.horizon - used, self.rng, self.classes, self.scores)
+            reward = DISCOUNT ** used * rest
+        self._backup(path, reward)
+        return 1
+
+    def _search_batch(self):
+        # Pick `batch` leaves, each one adding a virtual loss (a visit with
+        # reward 0) on its path so the next pick spreads out, then roll them
+        # all out in the pool and replace the virtual losses with results.
+        pending = []
+        for _ in range(self.batch):
+            path, state, used, reward = self._descend(self.rng)
+            self._backup(path, 0.0)
+            if reward is None:
+                job = (state, self.horizon - used, self.rng.randrange(2**32))
+                pending.append((path, used, self.pool.submit(_rollout_job, job)))
+            else:
+                self._backup_virtual(path, reward)
+        for path, used, future in pending:
+            self._backup_virtual(path, DISCOUNT ** used * future.result())
+        return self.batch
+
+    def _backup_virtual(self, path, reward):
+        for node in path:
+            node.total += reward
+
+    def _recommend(self, iterations):
+        children = self.root.children
+        legal = [a for a in self.root_actions if a in children]
+        if not legal:
+            return None  # nothing on offer reached the tree
+        e, advice = max(legal, key=lambda a: self._rank(children[a]))
+        # A concrete offered parcel and civ with that effect; root_actions
+        # only holds classes the offer reaches, so there is one.
+        parcel, civs = next(
+            (parcel, civs) for parcel in self.offer
+            for group, civs in self.groups[parcel["index"]] if group == e
+        )
+        civ = game.CIVILIZATIONS[game.first_index(civs)]
+        node = children[(e, advice)]
+        return Advice(parcel, civ, advice, self._mean(node), node.visits, iterations)
@@ -0,0 +1,321 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import random
+import time
+from collections import Counter, namedtuple
+
+import courier_of_possibilities as game
+
+# ==========================
+# Courier Policies
+# ==========================
+# A policy answers every question main_loop would ask a player. Anything with
+# these six methods can be plugged into play_game / run_batch.
+
+
+class RandomPolicy:
+    def choose_parcel(self, state, offer, rng):
+        return rng.choice(offer)
+
+    def choose_civ(self, state, parcel, rng):
+        return rng.choice(game.CIVILIZATIONS)
+
+    def choose_advice(self, state, parcel, civ, rng):
+        return rng.randrange(len(game.MISSION_OPTIONS))
+
+    def choose_patch(self, state, scenario, rng):
+        return rng.randrange(len(scenario["options"]))
+
+    def attempt_final(self, state, rng):
+        return True
+
+    def final_answers(self, state, rng):
+        return [rng.randrange(len(opts)) for _, opts in game.FINAL_PUZZLE_STEPS]
+
+
+class CozyPolicy:
+    # Greedy: best harmony-minus-ripple delivery, calm advice, cheapest patch,
+    # and only attempt the finale once the golden ending is in reach.
+
+    def choose_parcel(self, state, offer, rng):
+        return max(offer, key=lambda parcel: self._best_civ(parcel)[0])
+
+    def choose_civ(self, state, parcel, rng):
+        return self._best_civ(parcel)[1]
+
+    def choose_advice(self, state, parcel, civ, rng):
+        return min(
+            range(len(game.MISSION_OPTIONS)),
+            key=lambda i: (game.MISSION_OPTIONS[i][1]["ripple"], -game.MISSION_OPTIONS[i][1]["harmony"]),
+        )
+
+    def choose_patch(self, state, scenario, rng):
+        options = scenario["options"]
+        return min(range(len(options)), key=lambda i: (options[i][1]["ripple"], -options[i][1]["harmony_all"]))
+
+    def attempt_final(self, state, rng):
+        return state.ripple_index <= game.PARADOX_THRESHOLD
+
+    def final_answers(self, state, rng):
+        return [max(range(len(opts)), key=lambda i: opts[i][1]) for _, opts in game.FINAL_PUZZLE_STEPS]
+
+    def _best_civ(self, parcel):
+        # Scores: +3 if the civ prefers one of the parcel's tags, -6 if it
+        # hates one. The catalog's tag index gives each group of civs at
+        # once; the first civ of the best group wins.
+        lovers = game.civs_loving(parcel)
+        haters = game.civs_hating(parcel)
+        everyone = (1 << len(game.CIVILIZATIONS)) - 1
+        for score, civs in ((3, lovers & ~haters), (0, everyone & ~(lovers | haters)), (-3, lovers & haters), (-6, haters)):
+            if civs:
+                return score - parcel["base_ripple"], game.CIVILIZATIONS[game.first_index(civs)]
+
+
+POLICIES = {
+    "random": RandomPolicy,
+    "cozy": CozyPolicy,
+}
+
+
+def resolve_policy(spec):
+    # "random", "cozy", or "some.module:PolicyClass"
+    if spec in POLICIES:
+        return POLICIES[spec]()
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"Unknown policy {spec!r}; use one of {sorted(POLICIES)} or module:Class")
+    return getattr(importlib.import_module(module_name), attr)()
+
+
+# ==========================
+# Headless Playthroughs
+# ==========================
+
+UNFINISHED = "unfinished"
+
+GameRecord = namedtuple("GameRecord", "ending turns unlock_turn paradoxes_triggered ripple_index")
+
+
+def play_game(policy, rng, max_turns=200):
+    state = game.GameState()
+    while state.turn < max_turns:
+        record = play_turn(policy, state, rng)
+        if record:
+            return record
+    return GameRecord(UNFINISHED, state.turn, None, state.paradoxes_triggered, state.ripple_index)
+
+
+def play_turn(policy, state, rng):
+    # One turn of play_game; the GameRecord if it ended the game, else None.
+    state.turn += 1
+    offer = game.offer_parcels(rng)
+    parcel = policy.choose_parcel(state, offer, rng)
+    civ = policy.choose_civ(state, parcel, rng)
+    delivery = game.resolve_delivery(state, parcel, civ, rng)
+    game.emit_delivery(state, parcel, civ, delivery)
+
+    game.draw_mission_scenario(rng)
+    advice = policy.choose_advice(state, parcel, civ, rng)
+    game.apply_mission_advice(state, civ, advice)
+    game.emit_advice(state, civ, advice)
+
+    if game.paradox_due(state):
+        scenario = game.trigger_paradox(state, rng)
+        game.emit_paradox(state, scenario)
+        patch = policy.choose_patch(state, scenario, rng)
+        game.apply_paradox_patch(state, scenario, patch)
+        game.emit_patch(state, scenario, patch)
+
+    if game.final_puzzle_ready(state) and policy.attempt_final(state, rng):
+        state.unlocked_final = True
+        score = game.score_final_answers(policy.final_answers(state, rng))
+        ending = game.ending_for(state, score)
+        game.emit_ending(state, ending)
+        return GameRecord(ending, state.turn, state.turn, state.paradoxes_triggered, state.ripple_index)
+    return None
+
+
+# ==========================
+# Batch Runner
+# ==========================
+
+BatchReport = namedtuple(
+    "BatchReport", "games endings unlock_turns paradoxes ripple seconds workers"
+)
+
+
+def apply_tuning(tuning):
+    # tuning: {"paradox_threshold": int, "max_ripple": int, "base_ripple": {parcel_id: int}}
+    if not tuning:
+        return
+    if tuning.get("paradox_threshold") is not None:
+        game.PARADOX_THRESHOLD = tuning["paradox_threshold"]
+    if tuning.get("max_ripple") is not None:
+        game.MAX_RIPPLE = tuning["max_ripple"]
+    for parcel_id, value in (tuning.get("base_ripple") or {}).items():
+        game.PARCELS_BY_ID[parcel_id]["base_ripple"] = value
+    game.build_catalog_index()
+
+
+def current_tuning():
+    # The rules apply_tuning() changes, as they are now: a tuning that puts
+    # them back.
+    return {
+        "paradox_threshold": game.PARADOX_THRESHOLD,
+        "max_ripple": game.MAX_RIPPLE,
+        "base_ripple": {parcel["id"]: parcel["base_ripple"] for parcel in game.PARCELS},
+    }
+
+
+_worker_policy = None
+
+
+def _init_worker(policy_spec, tuning):
+    global _worker_policy
+    apply_tuning(tuning)
+    _worker_policy = resolve_policy(policy_spec)
+
+
+def _run_chunk(job):
+    seed, chunk_idx, games, max_turns = job
+    # Each chunk owns an independent stream, so results depend on the seed
+    # and chunk size only, never on how many workers happened to run them.
+    rng = random.Random(f"{seed}:{chunk_idx}")
+    endings = Counter()
+    unlock_turns = Counter()
+    paradoxes = Counter()
+    ripple = Counter()
+    for _ in range(games):
+        record = play_game(_worker_policy, rng, max_turns)
+        endings[record.ending] += 1
+        if record.unlock_turn is not None:
+            unlock_turns[record.unlock_turn] += 1
+        paradoxes[record.paradoxes_triggered] += 1
+        ripple[record.ripple_index] += 1
+    return endings, unlock_turns, paradoxes, ripple
+
+
+def run_batch(games, policy="cozy", seed=0, workers=None, chunk_size=2000, max_turns=200, tuning=None):
+    workers = workers or os.cpu_count() or 1
+    jobs = []
+    for chunk_idx, start in enumerate(range(0, games, chunk_size)):
+        jobs.append((seed, chunk_idx, min(chunk_size, games - start), max_turns))
+
+    totals = [Counter(), Counter(), Counter(), Counter()]
+    started = time.perf_counter()
+    if workers == 1:
+        # Runs in this process, so the tuned rules must not outlive the batch.
+        untuned = current_tuning() if tuning else None
+        _init_worker(policy, tuning)
+        try:
+            for partial in map(_run_chunk, jobs):
+                for total, counts in zip(totals, partial):
+                    total.update(counts)
+        finally:
+            apply_tuning(untuned)
+    else:
+        with multiprocessing.Pool(workers, initializer=_init_worker, initargs=(policy, tuning)) as pool:
+            for partial in pool.imap_unordered(_run_chunk, jobs):
+                for total, counts in zip(totals, partial):
+                    total.update(counts)
+    elapsed = time.perf_counter() - started
+    return BatchReport(games, *totals, elapsed, workers)
+
+
+def _mean(counts):
+    n = sum(counts.values())
+    return sum(value * k for value, k in counts.items()) / n if n else float("nan")
+
+
+def _percentile(counts, pct):
+    n = sum(counts.values())
+    if not n:
+        return None
+    rank = pct / 100 * (n - 1)
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen > rank:
+            return value
+    return max(counts)
+
+
+def format_report(report):
+    lines = [
+        f"Games: {report.games:,} in {report.seconds:.2f}s "
+        f"({report.games / max(report.seconds, 1e-9):,.0f} games/s on {report.workers} worker(s))",
+        "",
+        "Endings:",
+    ]
+    for ending in (game.ENDING_GOLDEN, game.ENDING_BITTERSWEET, game.ENDING_CHAOTIC, UNFINISHED):
+        count = report.endings.get(ending, 0)
+        lines.append(f"  {ending:<18} {count:>10,}  {100 * count / max(report.games, 1):6.2f}%")
+    lines.append("")
+    if report.unlock_turns:
+        lines.append(
+            "Turns to unlock:    mean {:.2f}  p50 {}  p90 {}  p99 {}".format(
+                _mean(report.unlock_turns),
+                _percentile(report.unlock_turns, 50),
+                _percentile(report.unlock_turns, 90),
+                _percentile(report.unlock_turns, 99),
+            )
+        )
+    if report.paradoxes:
+        lines.append(
+            "Paradoxes / game:   mean {:.2f}  p90 {}  max {}".format(
+                _mean(report.paradoxes), _percentile(report.paradoxes, 90), max(report.paradoxes)
+            )
+        )
+    if report.ripple:
+        lines.append(
+            "Final ripple_index: mean {:.2f}  p50 {}  p90 {}".format(
+                _mean(report.ripple), _percentile(report.ripple, 50), _percentile(report.ripple, 90)
+            )
+        )
+    return "\n".join(lines)
+
+
+def _parse_base_ripple(items):
+    overrides = {}
+    for item in items or []:
+        parcel_id, _, value = item.partition("=")
+        if parcel_id not in game.PARCELS_BY_ID or not value:
+            raise SystemExit(f"--base-ripple expects parcel_id=value, got {item!r}")
+        overrides[parcel_id] = int(value)
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play many headless Courier games and summarize the outcomes.")
+    parser.add_argument("-n", "--games", type=int, default=100_000)
+    parser.add_argument("--policy", default="cozy", help=f"{', '.join(POLICIES)} or module:Class")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="default: all CPU cores")
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--paradox-threshold", type=int, default=None)
+    parser.add_argument("--max-ripple", type=int, default=None)
+    parser.add_argument("--base-ripple", action="append", metavar="PARCEL=N")
+    args = parser.parse_args(argv)
+
+    tuning = {
+        "paradox_threshold": args.paradox_threshold,
+        "max_ripple": args.max_ripple,
+        "base_ripple": _parse_base_ripple(args.base_ripple),
+    }
+    report = run_batch(
+        args.games,
+        policy=args.policy,
+        seed=args.seed,
+        workers=args.workers,
+        chunk_size=args.chunk_size,
+        max_turns=args.max_turns,
+        tuning=tuning,
+    )
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
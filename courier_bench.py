@@ -0,0 +1,536 @@
+import argparse
+import asyncio
+import contextvars
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import textwrap
+import time
+
+import courier_batch
+import courier_of_possibilities as game
+from courier_terminal import CURRENT_CONSOLE, AnsiTerminal, Console, Renderer, VirtualClock, _shared_prefix
+
+# Screens that clear once per ordinary turn: choose_parcel,
+# choose_civilization, ripple_animation, the hand-over screen in main_loop,
+# mission_phase and the courier status screen.
+CLEARS_PER_TURN = 6
+
+
+def _per_call(fn, number, repeat=5, min_time=0.2):
+    # Best seconds per call over rounds of `number` calls; the minimum is the
+    # least noisy estimate on a shared box. Rounds go on until there have
+    # been `repeat` of them and `min_time` seconds were spent timing, so a
+    # call of a few microseconds is not judged on a few milliseconds.
+    best = float("inf")
+    rounds = 0
+    spent = 0.0
+    while rounds < repeat or spent < min_time:
+        started = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - started
+        best = min(best, elapsed / number)
+        rounds += 1
+        spent += elapsed
+    return best
+
+
+# ==========================
+# Benchmarks
+# ==========================
+
+
+def bench_clear(quick=False):
+    null = open(os.devnull, "w")
+    shell_clear = "cls" if os.name == "nt" else "clear"
+    command = f"{shell_clear} > {os.devnull} 2>&1"
+
+    def subprocess_clear():
+        os.system(command)
+
+    renderer = Renderer(stream=null, terminal=AnsiTerminal(null))
+
+    def escape_clear():
+        renderer.clear()
+        renderer.flush()
+
+    try:
+        forked = _per_call(subprocess_clear, 10 if quick else 100)
+        in_process = _per_call(escape_clear, 1000 if quick else 20000)
+    finally:
+        null.close()
+    return {
+        "subprocess_clear_us": forked * 1e6,
+        "escape_clear_us": in_process * 1e6,
+        "per_turn_before_ms": forked * CLEARS_PER_TURN * 1e3,
+        "per_turn_after_ms": in_process * CLEARS_PER_TURN * 1e3,
+        "per_turn_saved_ms": (forked - in_process) * CLEARS_PER_TURN * 1e3,
+    }
+
+
+class _FakeTty(io.StringIO):
+    def isatty(self):
+        return True
+
+
+class ScriptedPlayer:
+    # Answers main_loop's prompts by looking at the prompt text. Invalid
+    # answers are mixed in on purpose so the in-place redraws get exercised
+    # too.
+
+    def __init__(self, seed, max_turns):
+        self.rng = random.Random(seed)
+        self.max_turns = max_turns
+        self.turns = 0
+
+    def __call__(self, prompt):
+        rng = self.rng
+        if "Select a parcel" in prompt:
+            return rng.choice(["1", "2", "3", "r", "x"])
+        if "Select a destination" in prompt:
+            return rng.choice(["1", "2", "3", "4", "5", "6", "9"])
+        if "advise" in prompt:
+            return rng.choice(["1", "3", "3"])
+        if "paradox patch" in prompt:
+            return "2"
+        if "(y/n)" in prompt:
+            return "y"
+        if "Choice:" in prompt:
+            self.turns += 1
+            return "q" if self.turns >= self.max_turns else ""
+        if "Choose:" in prompt:
+            return rng.choice(["1", "2"])
+        return ""
+
+
+class ScriptedConsole(Console):
+    # Types the scripted answer once the prompt is on screen and the console
+    # is waiting for it.
+
+    def __init__(self, answer, **kwargs):
+        super().__init__(**kwargs)
+        self.answer = answer
+
+    async def ask(self, prompt):
+        asyncio.get_running_loop().call_soon(lambda: self.feed(self.answer(prompt)))
+        return await super().ask(prompt)
+
+
+def run_scripted(session, screen, *args):
+    async def drive():
+        CURRENT_CONSOLE.set(session)
+        try:
+            return await screen(*args)
+        finally:
+            session.renderer.flush()
+
+    return asyncio.run(drive())
+
+
+class _FloorRenderer(Renderer):
+    # Also counts what no renderer could avoid sending: the changed tail of
+    # every screen line, each time the screen is flushed.
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.changed_bytes = 0
+        self._shown = [""]
+
+    def flush(self):
+        super().flush()
+        shown = self._shown
+        for i, line in enumerate(self._lines):
+            before = shown[i] if i < len(shown) else ""
+            if line != before:
+                self.changed_bytes += len(line[_shared_prefix(before, line):].encode("utf-8", "replace")) + 1
+        self._shown = list(self._lines)
+
+
+def _bench_renderer(differential):
+    return _FloorRenderer(stream=_FakeTty(), terminal=AnsiTerminal(), differential=differential, size=(100, 60))
+
+
+def _scripted_session(differential, seed=7, max_turns=12, clock=None):
+    # Colors are pinned on so the byte counts do not depend on whether the
+    # benchmark itself runs in a terminal.
+    renderer = _bench_renderer(differential)
+    player = ScriptedPlayer(seed, max_turns)
+    clock = clock if clock is not None else VirtualClock(record=False)
+    run_scripted(ScriptedConsole(player, renderer=renderer, clock=clock, color=True), game.main_loop, seed)
+    return renderer, player.turns
+
+
+def _redraw_bytes(differential):
+    # Bytes needed to redraw the destination screen after a wrong answer:
+    # the readouts stay, only the error line and the prompt change.
+    renderer = _bench_renderer(differential)
+    state = game.GameState()
+    game.resolve_delivery(state, game.PARCELS[0], game.CIVILIZATIONS[0], random.Random(1))
+    marks = []
+
+    def answer(prompt):
+        marks.append(renderer.bytes_written)
+        return "9" if len(marks) == 1 else "1"
+
+    run_scripted(ScriptedConsole(answer, renderer=renderer, clock=VirtualClock(record=False), color=True), game.choose_civilization, state)
+    return marks[1] - marks[0]
+
+
+def bench_screen_bytes(quick=False):
+    full, turns = _scripted_session(differential=False)
+    diffed, _ = _scripted_session(differential=True)
+    turns = max(turns, 1)
+    floor = diffed.changed_bytes
+    full, diffed = full.bytes_written, diffed.bytes_written
+    redraw_full = _redraw_bytes(False)
+    redraw_diff = _redraw_bytes(True)
+    return {
+        "full_redraw_bytes_per_turn": full / turns,
+        "differential_bytes_per_turn": diffed / turns,
+        "turn_reduction_pct": 100 * (1 - diffed / full),
+        # The new text on each turn's screens, which bounds any redraw scheme.
+        "changed_text_bytes_per_turn": floor / turns,
+        "in_place_redraw_full_bytes": redraw_full,
+        "in_place_redraw_diff_bytes": redraw_diff,
+    }
+
+
+def _null_console(null):
+    return Console(renderer=Renderer(stream=null, terminal=AnsiTerminal(null)), clock=VirtualClock(record=False))
+
+
+def _rendered(fn, session):
+    # Calls fn() with `session` as the current console, then flushes what
+    # it drew.
+    context = contextvars.copy_context()
+    context.run(CURRENT_CONSOLE.set, session)
+
+    def call():
+        context.run(fn)
+        session.renderer.flush()
+
+    return call
+
+
+def _midgame_state(seed=11, turns=6):
+    # A state a few cozy turns in: some ripple, some history.
+    policy = courier_batch.resolve_policy("cozy")
+    rng = random.Random(seed)
+    state = game.GameState()
+    for _ in range(turns):
+        courier_batch.play_turn(policy, state, rng)
+    return state
+
+
+def bench_rules(quick=False):
+    # The rules on their own: one delivery, and one whole turn through
+    # step(), cycling through every parcel and destination.
+    pairs = [(parcel, civ) for parcel in game.PARCELS for civ in game.CIVILIZATIONS]
+    number = 2000 if quick else 20000
+    state = game.GameState(game.HISTORY_WINDOW)
+    rng = random.Random(1)
+    deliveries = itertools.cycle(pairs)
+
+    def deliver():
+        parcel, civ = next(deliveries)
+        game.apply_parcel_effects(state, parcel, civ, rng)
+
+    actions = itertools.cycle([game.TurnAction(parcel, civ, 2, 1, False, None) for parcel, civ in pairs])
+    turn_state = game.GameState(game.HISTORY_WINDOW)
+    streams = game.RngStreams(1)
+
+    def turn():
+        game.step(turn_state, next(actions), streams)
+
+    return {
+        "apply_parcel_effects_us": _per_call(deliver, number) * 1e6,
+        "step_us": _per_call(turn, number) * 1e6,
+    }
+
+
+def bench_layout(quick=False):
+    # Box and paragraph layout for the bodies the game actually shows: the
+    # mission debrief box as built from raw text and as the game builds it
+    # (pre-wrapped at import), and wrapping a paradox text.
+    scenario = game.MISSION_SCENARIOS[0]
+    raw_body = [str(scenario), "", "They ask how to lean into this new idea."]
+    body = [scenario, "", "They ask how to lean into this new idea."]
+    title = f"Mission Debrief: {game.PARCELS[0]['name']} -> {game.CIVILIZATIONS[0]['name']}"
+    paragraph = " ".join(str(game.PARADOX_SCENARIOS[0]["text"]).split())
+    number = 500 if quick else 5000
+    null = open(os.devnull, "w")
+    try:
+        session = _null_console(null)
+        raw_box = _rendered(lambda: game.draw_box(title, raw_body, color=game.FG_BLUE), session)
+        box = _rendered(lambda: game.draw_box(title, body, color=game.FG_BLUE), session)
+        return {
+            "draw_box_us": _per_call(raw_box, number) * 1e6,
+            "draw_box_prewrapped_us": _per_call(box, number) * 1e6,
+            "textwrap_fill_us": _per_call(lambda: textwrap.fill(paragraph, width=game.WRAP_WIDTH), number) * 1e6,
+        }
+    finally:
+        null.close()
+
+
+def bench_ripple_status(quick=False):
+    state = _midgame_state()
+    null = open(os.devnull, "w")
+    try:
+        status = _rendered(lambda: game.show_ripple_status(state), _null_console(null))
+        return {"show_ripple_status_us": _per_call(status, 2000 if quick else 20000) * 1e6}
+    finally:
+        null.close()
+
+
+def bench_game(quick=False):
+    # Headless games from GameState() to an ending, cozy policy, fixed seeds.
+    games = 200 if quick else 2000
+    policy = courier_batch.resolve_policy("cozy")
+    best = float("inf")
+    turns = 0
+    for _ in range(3):
+        turns = 0
+        started = time.perf_counter()
+        for seed in range(games):
+            turns += courier_batch.play_game(policy, random.Random(seed)).turns
+        best = min(best, time.perf_counter() - started)
+    return {
+        "game_us": best / games * 1e6,
+        "turn_us": best / turns * 1e6,
+        "turns_per_game": turns / games,
+    }
+
+
+def bench_batch(quick=False):
+    # courier_batch throughput on one worker (no pool start-up in the number).
+    games = 5000 if quick else 50000
+    report = courier_batch.run_batch(games, policy="cozy", seed=0, workers=1)
+    return {"games_per_s": games / report.seconds}
+
+
+def bench_playthrough(quick=False):
+    # A scripted game on the virtual clock: how long it takes to run versus
+    # how long the same delays would have kept a player waiting.
+    clock = VirtualClock()
+    started = time.perf_counter()
+    _, turns = _scripted_session(differential=True, max_turns=6 if quick else 12, clock=clock)
+    wall = time.perf_counter() - started
+    return {
+        "turns": turns,
+        "wall_ms": wall * 1e3,
+        "timed_output_s": clock.now(),
+        "delays_recorded": len(clock.timeline),
+        "speedup": clock.now() / wall,
+    }
+
+
+BENCHMARKS = {
+    "clear": bench_clear,
+    "screen_bytes": bench_screen_bytes,
+    "playthrough": bench_playthrough,
+    "rules": bench_rules,
+    "layout": bench_layout,
+    "ripple_status": bench_ripple_status,
+    "game": bench_game,
+    "batch": bench_batch,
+}
+
+
+# ==========================
+# Baselines
+# ==========================
+# --save writes the results as a JSON baseline; --compare runs again and
+# checks every metric against one. Both run the benchmarks in several
+# fresh processes (--runs) and keep each metric's best; a timing moves
+# with the machine's load from one process to the next, and the baseline
+# stores that spread (worst vs best, in percent) next to the result. A
+# metric that got worse by more than the tolerance plus the noise seen on
+# either side is a regression (exit status 1). DIRECTIONS says which way
+# is worse. INFORMATIONAL metrics are shown but never judged: the
+# os.system clear the game no longer makes is only there for scale, and a
+# busy machine should not fail the comparison over it. Any other metric
+# describes the workload (turns played, delays scheduled), and if one of
+# those changed the two runs did not do the same work and the comparison
+# says so.
+
+BASELINE_VERSION = 2  # 2 added "spread"; a version 1 baseline counts as noiseless
+DEFAULT_TOLERANCE = 10.0  # percent
+DEFAULT_RUNS = 5  # processes per --save / --compare
+
+LOWER_IS_BETTER = -1
+HIGHER_IS_BETTER = 1
+DIRECTIONS = {
+    "escape_clear_us": LOWER_IS_BETTER,
+    "per_turn_after_ms": LOWER_IS_BETTER,
+    "full_redraw_bytes_per_turn": LOWER_IS_BETTER,
+    "differential_bytes_per_turn": LOWER_IS_BETTER,
+    "changed_text_bytes_per_turn": LOWER_IS_BETTER,
+    "turn_reduction_pct": HIGHER_IS_BETTER,
+    "in_place_redraw_full_bytes": LOWER_IS_BETTER,
+    "in_place_redraw_diff_bytes": LOWER_IS_BETTER,
+    "wall_ms": LOWER_IS_BETTER,
+    "speedup": HIGHER_IS_BETTER,
+    "apply_parcel_effects_us": LOWER_IS_BETTER,
+    "step_us": LOWER_IS_BETTER,
+    "draw_box_us": LOWER_IS_BETTER,
+    "draw_box_prewrapped_us": LOWER_IS_BETTER,
+    "textwrap_fill_us": LOWER_IS_BETTER,
+    "show_ripple_status_us": LOWER_IS_BETTER,
+    "game_us": LOWER_IS_BETTER,
+    "turn_us": LOWER_IS_BETTER,
+    "games_per_s": HIGHER_IS_BETTER,
+}
+INFORMATIONAL = {"subprocess_clear_us", "per_turn_before_ms", "per_turn_saved_ms"}
+
+
+def run_isolated(names, quick, runs):
+    # Runs the benchmarks `runs` times, each in a fresh interpreter, and
+    # returns (results, spread): every metric's best value, and how far its
+    # worst run was from that, in percent.
+    command = [sys.executable, os.path.abspath(__file__), *names, "--json", "--runs", "1"]
+    if quick:
+        command.append("--quick")
+    samples = [json.loads(subprocess.run(command, capture_output=True, text=True, check=True).stdout) for _ in range(runs)]
+    results = {}
+    spread = {}
+    for name, metrics in samples[0].items():
+        results[name] = {}
+        spread[name] = {}
+        for metric in metrics:
+            values = [sample[name][metric] for sample in samples]
+            if DIRECTIONS.get(metric) == HIGHER_IS_BETTER:
+                best, worst = max(values), min(values)
+            else:
+                best, worst = min(values), max(values)
+            results[name][metric] = best
+            spread[name][metric] = abs(worst - best) / abs(best) * 100 if best else 0.0
+    return results, spread
+
+
+def save_baseline(path, results, quick, spread=None):
+    baseline = {
+        "version": BASELINE_VERSION,
+        "quick": quick,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+        "spread": spread or {},
+    }
+    with open(path, "w", encoding="utf-8") as out:
+        json.dump(baseline, out, indent=2)
+        out.write("\n")
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("version") not in (1, BASELINE_VERSION):
+        raise ValueError(f"{path}: not a version {BASELINE_VERSION} benchmark baseline")
+    return baseline
+
+
+def compare(baseline, results, tolerance=DEFAULT_TOLERANCE, spread=None):
+    # [(benchmark, metric, before, after, change_pct, limit_pct, verdict)]
+    # for every metric in both; limit_pct is the tolerance plus the larger
+    # spread of the two sides, and verdict is "regression", "improved",
+    # "ok", "info", "workload changed" or "new".
+    rows = []
+    spread = spread or {}
+    for name, metrics in results.items():
+        before_metrics = baseline["results"].get(name, {})
+        before_spread = baseline.get("spread", {}).get(name, {})
+        for metric, after in metrics.items():
+            before = before_metrics.get(metric)
+            if before is None:
+                rows.append((name, metric, None, after, None, None, "new"))
+                continue
+            change = (after - before) / abs(before) * 100 if before else (0.0 if after == before else float("inf"))
+            limit = tolerance + max(before_spread.get(metric, 0.0), spread.get(name, {}).get(metric, 0.0))
+            direction = DIRECTIONS.get(metric)
+            if metric in INFORMATIONAL:
+                limit, verdict = None, "info"
+            elif direction is None:
+                limit, verdict = None, ("ok" if after == before else "workload changed")
+            elif change * direction < -limit:
+                verdict = "regression"
+            elif change * direction > limit:
+                verdict = "improved"
+            else:
+                verdict = "ok"
+            rows.append((name, metric, before, after, change, limit, verdict))
+    return rows
+
+
+def format_comparison(rows, tolerance):
+    lines = [f"{'benchmark':<14} {'metric':<28} {'baseline':>12} {'now':>12} {'change':>8} {'limit':>7}"]
+    for name, metric, before, after, change, limit, verdict in rows:
+        before_text = "-" if before is None else f"{before:12.3f}"
+        change_text = "" if change is None else f"{change:+7.1f}%"
+        limit_text = "" if limit is None else f"{limit:6.1f}%"
+        flag = "" if verdict in ("ok", "info") else f"  {verdict.upper()}"
+        lines.append(f"{name:<14} {metric:<28} {before_text:>12} {after:12.3f} {change_text:>8} {limit_text:>7}{flag}")
+    regressions = sum(1 for row in rows if row[6] == "regression")
+    lines.append(f"{regressions} regression(s) beyond {tolerance:g}% plus noise")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Courier of Possibilities benchmarks")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--quick", action="store_true", help="fewer iterations")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("--save", metavar="PATH", help="write the results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the results with a saved baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, metavar="PCT",
+                        help=f"change beyond the measured noise that counts as a regression (default {DEFAULT_TOLERANCE:g}%%)")
+    parser.add_argument("--runs", type=int, metavar="N",
+                        help=f"processes to run the benchmarks in (default {DEFAULT_RUNS} with --save or --compare, else 1)")
+    args = parser.parse_args(argv)
+
+    names = args.names or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    baseline = None
+    if args.compare:
+        try:
+            baseline = load_baseline(args.compare)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
+        if baseline["quick"] != args.quick:
+            sys.stderr.write(f"warning: baseline was {'' if baseline['quick'] else 'not '}run with --quick\n")
+
+    runs = args.runs if args.runs is not None else (DEFAULT_RUNS if args.save or args.compare else 1)
+    if runs < 1:
+        parser.error("--runs must be at least 1")
+    spread = None
+    if runs > 1:
+        results, spread = run_isolated(names, args.quick, runs)
+    else:
+        results = {name: BENCHMARKS[name](quick=args.quick) for name in names}
+    if args.save:
+        save_baseline(args.save, results, args.quick, spread)
+    if args.json:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    elif baseline is None:
+        for name, metrics in results.items():
+            print(name)
+            for metric, value in metrics.items():
+                print(f"  {metric:<24} {value:12.3f}")
+    if baseline is not None:
+        rows = compare(baseline, results, args.tolerance, spread)
+        print(format_comparison(rows, args.tolerance), file=sys.stderr if args.json else sys.stdout)
+        if any(row[6] == "regression" for row in rows):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
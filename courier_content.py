@@ -0,0 +1,450 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+import courier_of_possibilities as game
+
+# ==========================
+# Content Packs
+# ==========================
+# A content pack is a JSON file that adds to the built-in catalog; every
+# section is optional:
+#
+#   {"name": "Lost Socks Expansion",
+#    "parcels": [{"id", "name", "tags": [...], "base_ripple"}],
+#    "civilizations": [{"id", "name", "ascii_art", "motto",
+#                       "preferred_tags": [...], "hated_tags": [...]}],
+#    "side_effects": ["..."],
+#    "mission_scenarios": ["..."],
+#    "paradoxes": [{"text", "options": [{"label", "ripple", "harmony_all", "flavor"}]}]}
+#
+# The mission advice options stay the built-in three: journals, saves and
+# the solver know them by index.
+#
+# The first load of a pack validates it and compiles it into a binary cache
+# file named after a hash of the pack's bytes; every later load maps that
+# file and skips JSON and validation. In the cache all tags are interned
+# into one table, and mission / paradox text and flavors are stored already
+# wrapped to WRAP_WIDTH. Ids, names and tags are read at load time (the
+# rules need them); ASCII art, mottos and paradox text and options stay in
+# the mapped file until a screen first reads them.
+
+CACHE_MAGIC = b"CPC1"
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "courier_of_possibilities"
+)
+
+# Every string is a (offset, length) reference into the text blob at the
+# end of the file.
+# magic, version, wrap width, then counts: tags, tag list entries, parcels,
+# civs, side effects, mission scenarios, paradoxes, paradox options
+CACHE_HEAD = struct.Struct("<4sHHIIIIIIII")
+REF = struct.Struct("<II")
+PARCEL_RECORD = struct.Struct("<IIIIIHh")  # id, name, first tag, tag count, base ripple
+CIV_RECORD = struct.Struct("<IIIIIIIIIHIH")  # id, name, art, motto, preferred (first, count), hated (first, count)
+PARADOX_RECORD = struct.Struct("<IIIH")  # text, first option, option count
+OPTION_RECORD = struct.Struct("<IIIIhh")  # label, flavor, ripple, harmony_all
+
+
+# ==========================
+# Validation
+# ==========================
+
+
+def _fail(path, where, message):
+    raise ValueError(f"{path}: {where}: {message}")
+
+
+def _text(path, where, value, empty=False):
+    if not isinstance(value, str) or (not empty and not value.strip()):
+        _fail(path, where, "expected a non-empty string" if not empty else "expected a string")
+    return value
+
+
+def _int(path, where, value, low, high):
+    if isinstance(value, bool) or not isinstance(value, int) or not low <= value <= high:
+        _fail(path, where, f"expected a whole number from {low} to {high}")
+    return value
+
+
+def _tags(path, where, value):
+    if not isinstance(value, list) or not all(isinstance(tag, str) and tag for tag in value):
+        _fail(path, where, "expected a list of tag names")
+    return sorted(set(value))
+
+
+def _items(path, raw, section):
+    items = raw.get(section, [])
+    if not isinstance(items, list):
+        _fail(path, section, "expected a list")
+    return items
+
+
+def _record(path, where, item, fields):
+    if not isinstance(item, dict):
+        _fail(path, where, "expected an object")
+    missing = [name for name in fields if name not in item]
+    if missing:
+        _fail(path, where, f"missing {', '.join(missing)}")
+
+
+def validate(raw, path="<pack>"):
+    # The pack in a normalised form (lists, sorted tags), or ValueError
+    # naming the first problem.
+    if not isinstance(raw, dict):
+        _fail(path, "pack", "expected a JSON object")
+    limit = game.MAX_RIPPLE
+    pack = {"name": _text(path, "name", raw.get("name", os.path.basename(path)))}
+
+    ids = set()
+    pack["parcels"] = []
+    for i, item in enumerate(_items(path, raw, "parcels")):
+        where = f"parcels[{i}]"
+        _record(path, where, item, ("id", "name", "tags", "base_ripple"))
+        if _text(path, where + ".id", item["id"]) in ids:
+            _fail(path, where, f"duplicate id {item['id']!r}")
+        ids.add(item["id"])
+        pack["parcels"].append({
+            "id": item["id"],
+            "name": _text(path, where + ".name", item["name"]),
+            "tags": _tags(path, where + ".tags", item["tags"]),
+            "base_ripple": _int(path, where + ".base_ripple", item["base_ripple"], 0, limit),
+        })
+
+    ids = set()
+    pack["civilizations"] = []
+    for i, item in enumerate(_items(path, raw, "civilizations")):
+        where = f"civilizations[{i}]"
+        _record(path, where, item, ("id", "name", "motto", "preferred_tags", "hated_tags"))
+        if _text(path, where + ".id", item["id"]) in ids:
+            _fail(path, where, f"duplicate id {item['id']!r}")
+        ids.add(item["id"])
+        pack["civilizations"].append({
+            "id": item["id"],
+            "name": _text(path, where + ".name", item["name"]),
+            "ascii_art": _text(path, where + ".ascii_art", item.get("ascii_art", ""), empty=True),
+            "motto": _text(path, where + ".motto", item["motto"]),
+            "preferred_tags": _tags(path, where + ".preferred_tags", item["preferred_tags"]),
+            "hated_tags": _tags(path, where + ".hated_tags", item["hated_tags"]),
+        })
+
+    for section in ("side_effects", "mission_scenarios"):
+        pack[section] = [_text(path, f"{section}[{i}]", text) for i, text in enumerate(_items(path, raw, section))]
+
+    pack["paradoxes"] = []
+    for i, item in enumerate(_items(path, raw, "paradoxes")):
+        where = f"paradoxes[{i}]"
+        _record(path, where, item, ("text", "options"))
+        if not isinstance(item["options"], list) or not 1 <= len(item["options"]) <= 9:
+            _fail(path, where + ".options", "expected a list of 1 to 9 options")
+        options = []
+        for j, option in enumerate(item["options"]):
+            at = f"{where}.options[{j}]"
+            _record(path, at, option, ("label", "ripple", "harmony_all", "flavor"))
+            options.append({
+                "label": _text(path, at + ".label", option["label"]),
+                "ripple": _int(path, at + ".ripple", option["ripple"], -limit, limit),
+                "harmony_all": _int(path, at + ".harmony_all", option["harmony_all"], -limit, limit),
+                "flavor": _text(path, at + ".flavor", option["flavor"]),
+            })
+        pack["paradoxes"].append({"text": _text(path, where + ".text", item["text"]), "options": options})
+    return pack
+
+
+# ==========================
+# Compiled Cache
+# ==========================
+
+
+def compile_pack(pack, wrap=game.WRAP_WIDTH):
+    # Validated pack -> cache file bytes.
+    blob = bytearray()
+    refs = {}
+
+    def ref(text):
+        # Equal strings are stored once.
+        found = refs.get(text)
+        if found is None:
+            data = text.encode("utf-8")
+            found = refs[text] = (len(blob), len(data))
+            blob.extend(data)
+        return found
+
+    def wrapped(text):
+        return ref(game.prewrap(text, wrap))
+
+    tag_index = {}
+    tag_list = array("I")
+
+    def tags(names):
+        first = len(tag_list)
+        for name in names:
+            tag_list.append(tag_index.setdefault(name, len(tag_index)))
+        return first, len(names)
+
+    parcels = [PARCEL_RECORD.pack(*ref(p["id"]), *ref(p["name"]), *tags(p["tags"]), p["base_ripple"])
+               for p in pack["parcels"]]
+    civs = [
+        CIV_RECORD.pack(*ref(v["id"]), *ref(v["name"]), *ref(v["ascii_art"]), *ref(v["motto"]),
+                        *tags(v["preferred_tags"]), *tags(v["hated_tags"]))
+        for v in pack["civilizations"]
+    ]
+    side_effects = [REF.pack(*ref(text)) for text in pack["side_effects"]]
+    scenarios = [REF.pack(*wrapped(text)) for text in pack["mission_scenarios"]]
+    paradoxes = []
+    options = []
+    for scenario in pack["paradoxes"]:
+        paradoxes.append(PARADOX_RECORD.pack(*wrapped(scenario["text"]), len(options), len(scenario["options"])))
+        for o in scenario["options"]:
+            options.append(OPTION_RECORD.pack(*ref(o["label"]), *wrapped(o["flavor"]), o["ripple"], o["harmony_all"]))
+    tag_refs = [REF.pack(*ref(name)) for name in tag_index]
+
+    head = CACHE_HEAD.pack(
+        CACHE_MAGIC, CACHE_VERSION, wrap, len(tag_refs), len(tag_list), len(parcels), len(civs),
+        len(side_effects), len(scenarios), len(paradoxes), len(options),
+    )
+    sections = [head, *tag_refs, tag_list.tobytes(), *parcels, *civs, *side_effects, *scenarios, *paradoxes, *options]
+    return b"".join(sections) + bytes(blob)
+
+
+class LazyRecord(dict):
+    # A catalog dict whose bulky fields are decoded from the pack's cache
+    # the first time they are read (civ["ascii_art"], scenario["text"]).
+    # Read them with [], not .get().
+    lazy = ()
+
+    def __init__(self, pack, slot, fields):
+        super().__init__(fields)
+        self.pack = pack
+        self.slot = slot
+
+    def __missing__(self, key):
+        if key not in self.lazy:
+            raise KeyError(key)
+        value = self[key] = getattr(self.pack, "load_" + key)(self.slot)
+        return value
+
+
+class LazyCiv(LazyRecord):
+    lazy = ("ascii_art", "motto")
+
+
+class LazyParadox(LazyRecord):
+    lazy = ("text", "options", "menu")
+
+
+class CompiledPack:
+    # A content pack read from its cache: `data` is the mapped file (or the
+    # bytes just compiled, if the cache could not be written).
+
+    def __init__(self, path, data, digest):
+        self.path = path
+        self.data = data
+        self.digest = digest
+        magic, version, wrap, *counts = CACHE_HEAD.unpack_from(data)
+        if magic != CACHE_MAGIC or version != CACHE_VERSION or wrap != game.WRAP_WIDTH:
+            raise ValueError(f"{path}: stale content cache")
+        n_tags, n_tag_list, n_parcels, n_civs, n_sides, n_scenarios, n_paradoxes, n_options = counts
+        offset = CACHE_HEAD.size
+        sections = {}
+        for name, size, count in (
+            ("tags", REF.size, n_tags),
+            ("tag_list", 4, n_tag_list),
+            ("parcels", PARCEL_RECORD.size, n_parcels),
+            ("civs", CIV_RECORD.size, n_civs),
+            ("side_effects", REF.size, n_sides),
+            ("scenarios", REF.size, n_scenarios),
+            ("paradoxes", PARADOX_RECORD.size, n_paradoxes),
+            ("options", OPTION_RECORD.size, n_options),
+        ):
+            sections[name] = offset
+            offset += size * count
+        self.sections = sections
+        self.blob = offset
+        view = memoryview(data)
+
+        # Interned once here; every parcel and civ shares these strings.
+        self.tags = [sys.intern(self.text(*r)) for r in REF.iter_unpack(view[sections["tags"]:sections["tag_list"]])]
+        tag_list = array("I")
+        tag_list.frombytes(view[sections["tag_list"]:sections["parcels"]])
+
+        def tags(first, count):
+            return {self.tags[t] for t in tag_list[first:first + count]}
+
+        self.parcels = [
+            {"id": self.text(io, il), "name": self.text(no, nl), "tags": tags(first, count), "base_ripple": ripple}
+            for io, il, no, nl, first, count, ripple in PARCEL_RECORD.iter_unpack(view[sections["parcels"]:sections["civs"]])
+        ]
+        self.civilizations = [
+            LazyCiv(self, slot, {
+                "id": self.text(record[0], record[1]),
+                "name": self.text(record[2], record[3]),
+                "preferred_tags": tags(record[8], record[9]),
+                "hated_tags": tags(record[10], record[11]),
+            })
+            for slot, record in enumerate(CIV_RECORD.iter_unpack(view[sections["civs"]:sections["side_effects"]]))
+        ]
+        self.side_effects = [self.text(*r) for r in REF.iter_unpack(view[sections["side_effects"]:sections["scenarios"]])]
+        self.mission_scenarios = [
+            game.Prewrapped(self.text(*r)) for r in REF.iter_unpack(view[sections["scenarios"]:sections["paradoxes"]])
+        ]
+        self.paradoxes = [LazyParadox(self, slot, {}) for slot in range(n_paradoxes)]
+
+    def text(self, offset, length):
+        start = self.blob + offset
+        return self.data[start:start + length].decode("utf-8")
+
+    def _civ(self, slot):
+        return CIV_RECORD.unpack_from(self.data, self.sections["civs"] + slot * CIV_RECORD.size)
+
+    def _paradox(self, slot):
+        return PARADOX_RECORD.unpack_from(self.data, self.sections["paradoxes"] + slot * PARADOX_RECORD.size)
+
+    def load_ascii_art(self, slot):
+        return self.text(*self._civ(slot)[4:6])
+
+    def load_motto(self, slot):
+        return self.text(*self._civ(slot)[6:8])
+
+    def load_text(self, slot):
+        return game.Prewrapped(self.text(*self._paradox(slot)[:2]))
+
+    def load_options(self, slot):
+        _, _, first, count = self._paradox(slot)
+        options = []
+        for i in range(first, first + count):
+            lo, ll, fo, fl, ripple, harmony_all = OPTION_RECORD.unpack_from(
+                self.data, self.sections["options"] + i * OPTION_RECORD.size
+            )
+            deltas = {"ripple": ripple, "harmony_all": harmony_all}
+            options.append((self.text(lo, ll), deltas, game.Prewrapped(self.text(fo, fl))))
+        return options
+
+    def load_menu(self, slot):
+        return game.option_menu(self.paradoxes[slot]["options"])
+
+
+# ==========================
+# Loading
+# ==========================
+
+
+def cache_key(raw, wrap=game.WRAP_WIDTH):
+    h = hashlib.blake2b(raw, digest_size=16)
+    h.update(f"|{CACHE_VERSION}|{wrap}".encode())
+    return h.hexdigest()
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def load_pack(path, cache_dir=CACHE_DIR):
+    # -> CompiledPack. Compiles and caches the pack on its first load.
+    with open(path, "rb") as f:
+        raw = f.read()
+    digest = cache_key(raw)
+    cache_path = os.path.join(cache_dir, digest + ".cpc") if cache_dir else None
+    if cache_path:
+        try:
+            return CompiledPack(path, _map(cache_path), digest)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, struct.error) as exc:
+            sys.stderr.write(f"Rebuilding content cache for {path}: {exc}\n")
+
+    try:
+        pack = validate(json.loads(raw), path)
+    except UnicodeDecodeError as exc:
+        raise ValueError(f"{path}: not UTF-8 text ({exc.reason})")
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"{path}: line {exc.lineno}: {exc.msg}")
+    data = compile_pack(pack)
+    if cache_path:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            tmp = cache_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, cache_path)
+            return CompiledPack(path, _map(cache_path), digest)
+        except OSError as exc:
+            sys.stderr.write(f"Content cache not written ({exc}); using {path} uncached\n")
+    return CompiledPack(path, data, digest)
+
+
+INSTALLED = []  # digests of the packs in the catalog, in the order installed
+
+
+def install_pack(pack):
+    # Adds a loaded pack to the game's catalog. Ids must be new.
+    for kind, items, known in (
+        ("parcel", pack.parcels, game.PARCELS_BY_ID),
+        ("civilization", pack.civilizations, game.CIVS_BY_ID),
+    ):
+        for item in items:
+            if item["id"] in known:
+                raise ValueError(f"{pack.path}: {kind} id {item['id']!r} is already in the catalog")
+    game.PARCELS.extend(pack.parcels)
+    game.CIVILIZATIONS.extend(pack.civilizations)
+    game.COMEDIC_SIDE_EFFECTS.extend(pack.side_effects)
+    game.MISSION_SCENARIOS.extend(pack.mission_scenarios)
+    game.PARADOX_SCENARIOS.extend(pack.paradoxes)
+    game.build_catalog_index()
+    INSTALLED.append(pack.digest)
+
+
+def install_packs(paths, cache_dir=CACHE_DIR, missing_only=False):
+    # missing_only: skip packs this process already has, e.g. in a worker
+    # that may have been forked from the game after it installed them.
+    packs = [load_pack(path, cache_dir) for path in paths]
+    for pack in packs:
+        if not (missing_only and pack.digest in INSTALLED):
+            install_pack(pack)
+    return packs
+
+
+# ==========================
+# Command Line
+# ==========================
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check and compile Courier content packs.")
+    parser.add_argument("packs", nargs="+", help="content pack JSON files")
+    parser.add_argument("--cache", default=CACHE_DIR, help=f"cache directory (default: {CACHE_DIR})")
+    parser.add_argument("--rebuild", action="store_true", help="ignore existing caches")
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for path in args.packs:
+        try:
+            if args.rebuild:
+                with open(path, "rb") as f:
+                    stale = os.path.join(args.cache, cache_key(f.read()) + ".cpc")
+                if os.path.exists(stale):
+                    os.remove(stale)
+            started = time.perf_counter()
+            pack = load_pack(path, args.cache)
+            seconds = time.perf_counter() - started
+        except (OSError, ValueError) as exc:
+            print(f"FAIL {exc}")
+            failed += 1
+            continue
+        print(f"ok   {path}: {len(pack.parcels)} parcels, {len(pack.civilizations)} civilizations, "
+              f"{len(pack.side_effects)} side effects, {len(pack.mission_scenarios)} mission scenarios, "
+              f"{len(pack.paradoxes)} paradoxes, {len(pack.tags)} tags; loaded in {seconds * 1e3:.1f} ms "
+              f"({len(pack.data):,} byte cache {pack.digest})")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+import argparse
+import cProfile
+import json
+import math
+import os
+import pstats
+import sys
+import time
+from collections import Counter
+
+# ==========================
+# Histograms
+# ==========================
+# Durations are counted in log-spaced buckets, BUCKETS_PER_DOUBLING per
+# doubling (each about 19% wide), so a session of any length keeps a few
+# dozen counters per phase and a percentile is off by at most one bucket.
+
+BUCKETS_PER_DOUBLING = 4
+REPORT_VERSION = 1
+
+
+def bucket_of(seconds):
+    micros = seconds * 1e6
+    return math.ceil(math.log2(micros) * BUCKETS_PER_DOUBLING) if micros > 1 else 0
+
+
+def bucket_top(bucket):
+    # Upper edge of a bucket, in seconds.
+    return 2 ** (bucket / BUCKETS_PER_DOUBLING) / 1e6
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        self.buckets[bucket_of(seconds)] += 1
+
+    def percentile(self, pct):
+        if not self.count:
+            return None
+        rank = pct / 100 * (self.count - 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen > rank:
+                return min(bucket_top(bucket), self.max)
+        return self.max
+
+    def report(self):
+        ms = 1e3
+        return {
+            "count": self.count,
+            "total_ms": self.total * ms,
+            "mean_ms": self.total / self.count * ms if self.count else None,
+            "p50_ms": self.percentile(50) * ms if self.count else None,
+            "p90_ms": self.percentile(90) * ms if self.count else None,
+            "p99_ms": self.percentile(99) * ms if self.count else None,
+            "max_ms": self.max * ms,
+            # upper edge in microseconds -> count
+            "buckets": {f"{bucket_top(b) * 1e6:.0f}": n for b, n in sorted(self.buckets.items())},
+        }
+
+
+# ==========================
+# Phase Meter
+# ==========================
+# One meter per session, set in game.CURRENT_METER. A phase is measured by
+# differencing the console's running totals at its start and stop: time
+# waiting for the player, time in the clock's delays, time and bytes spent
+# writing to the terminal (one write(2) per renderer flush). "wall" is the
+# whole phase; "work" is wall minus waiting and delays, i.e. rules, layout
+# and output, the part worth optimizing.
+#
+# With profile=True every phase also runs under its own cProfile.Profile,
+# so the stats of, say, apply_parcel_effects are not mixed with those of
+# the screens around it. Profiling inflates the timings it sits inside.
+
+
+class PhaseStats:
+    __slots__ = ("wall", "work", "input", "sleep", "render", "bytes", "writes")
+
+    def __init__(self):
+        self.wall = Histogram()
+        self.work = Histogram()
+        self.input = 0.0
+        self.sleep = 0.0
+        self.render = 0.0
+        self.bytes = 0
+        self.writes = 0
+
+    def report(self):
+        return {
+            "wall": self.wall.report(),
+            "work": self.work.report(),
+            "input_ms": self.input * 1e3,
+            "sleep_ms": self.sleep * 1e3,
+            "render_ms": self.render * 1e3,
+            "bytes": self.bytes,
+            "writes": self.writes,
+        }
+
+
+class PhaseMeter:
+    def __init__(self, console, profile=False):
+        self.console = console
+        self.phases = {}  # phase name -> PhaseStats, in first-seen order
+        self.profiles = {} if profile else None
+        self._base = self._snapshot()
+        self._open = None
+
+    def _snapshot(self):
+        console = self.console
+        renderer = console.renderer
+        return (
+            time.perf_counter(), console.input_seconds, console.sleep_seconds,
+            renderer.write_seconds, renderer.bytes_written, renderer.writes,
+        )
+
+    def start(self, name):
+        if self.profiles is not None:
+            profile = self.profiles.get(name)
+            if profile is None:
+                profile = self.profiles[name] = cProfile.Profile()
+            profile.enable()
+        self._open = self._snapshot()
+
+    def stop(self, name):
+        end = self._snapshot()
+        if self.profiles is not None:
+            self.profiles[name].disable()
+        wall, waited, slept, rendered, sent, writes = (b - a for a, b in zip(self._open, end))
+        self._open = None
+        stats = self.phases.get(name)
+        if stats is None:
+            stats = self.phases[name] = PhaseStats()
+        stats.wall.add(wall)
+        stats.work.add(max(0.0, wall - waited - slept))
+        stats.input += waited
+        stats.sleep += slept
+        stats.render += rendered
+        stats.bytes += sent
+        stats.writes += writes
+
+    def report(self, top=10):
+        wall, waited, slept, rendered, sent, writes = (b - a for a, b in zip(self._base, self._snapshot()))
+        report = {
+            "version": REPORT_VERSION,
+            "session": {
+                "wall_ms": wall * 1e3,
+                "input_ms": waited * 1e3,
+                "sleep_ms": slept * 1e3,
+                "render_ms": rendered * 1e3,
+                "bytes": sent,
+                "writes": writes,
+            },
+            "phases": {name: stats.report() for name, stats in self.phases.items()},
+            "profiled": self.profiles is not None,
+        }
+        if self.profiles is not None:
+            for name, profile in self.profiles.items():
+                report["phases"][name]["profile"] = top_functions(profile, top)
+        return report
+
+    def write_report(self, path):
+        with open(path, "w", encoding="utf-8") as out:
+            json.dump(self.report(), out, indent=2)
+            out.write("\n")
+
+    def dump_profiles(self, directory, top=25):
+        # <phase>.pstats for pstats / snakeviz, <phase>.txt the top functions
+        # by cumulative time.
+        os.makedirs(directory, exist_ok=True)
+        for name, profile in self.profiles.items():
+            profile.dump_stats(os.path.join(directory, f"{name}.pstats"))
+            with open(os.path.join(directory, f"{name}.txt"), "w", encoding="utf-8") as out:
+                pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(top)
+
+
+def top_functions(profile, top):
+    # The `top` functions of a profile by own time.
+    stats = pstats.Stats(profile).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return [
+        {
+            "function": f"{os.path.basename(path)}:{line}({func})",
+            "calls": calls,
+            "tottime_ms": own * 1e3,
+            "cumtime_ms": cumulative * 1e3,
+        }
+        for (path, line, func), (_, calls, own, cumulative, _) in rows
+    ]
+
+
+# ==========================
+# Command Line
+# ==========================
+
+
+def format_report(report):
+    session = report["session"]
+    lines = [
+        f"Session: {session['wall_ms'] / 1e3:.1f}s, {session['input_ms'] / 1e3:.1f}s waiting for input, "
+        f"{session['sleep_ms'] / 1e3:.1f}s in delays, {session['render_ms']:.1f} ms writing "
+        f"{session['bytes']:,} bytes in {session['writes']:,} writes",
+        "",
+        f"{'phase':<26} {'count':>5} {'wall p50':>9} {'p90':>8} {'p99':>8} "
+        f"{'work p50':>9} {'p99':>8} {'input':>8} {'sleep':>8} {'render':>7} {'bytes':>9} {'writes':>6}",
+    ]
+    for name, phase in report["phases"].items():
+        wall = phase["wall"]
+        work = phase["work"]
+        lines.append(
+            f"{name:<26} {wall['count']:>5} {wall['p50_ms']:>9.2f} {wall['p90_ms']:>8.2f} {wall['p99_ms']:>8.2f} "
+            f"{work['p50_ms']:>9.3f} {work['p99_ms']:>8.3f} {phase['input_ms']:>8.0f} {phase['sleep_ms']:>8.0f} "
+            f"{phase['render_ms']:>7.2f} {phase['bytes']:>9,} {phase['writes']:>6,}"
+        )
+    lines.append("(times in ms; work = wall minus input and sleep)")
+    for name, phase in report["phases"].items():
+        if phase.get("profile"):
+            lines.append("")
+            lines.append(f"{name}: top functions by own time")
+            for row in phase["profile"]:
+                lines.append(f"  {row['tottime_ms']:9.3f} ms {row['calls']:>8} calls  {row['function']}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Show a turn-phase timing report written by courier_of_possibilities.py --metrics."
+    )
+    parser.add_argument("report", help="the JSON report")
+    args = parser.parse_args(argv)
+    try:
+        with open(args.report, encoding="utf-8") as f:
+            report = json.load(f)
+    except (OSError, ValueError) as err:
+        parser.error(str(err))
+    if report.get("version") != REPORT_VERSION:
+        parser.error(f"{args.report}: not a version {REPORT_VERSION} metrics report")
+    print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
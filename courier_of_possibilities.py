@@ -1,8 +1,23 @@
+import argparse
+import asyncio
+import contextvars
+import hashlib
+import heapq
+import json
 import os
+import struct
 import sys
-import time
 import random
 import textwrap
+import threading
+from array import array
+from collections import deque, namedtuple
+from itertools import islice
+from collections.abc import Mapping, MutableMapping, Sequence
+
+from courier_terminal import (
+    CURRENT_CONSOLE, Console, can_read_keys, current_console, make_clock, start_key_reader, start_stdin_reader,
+)
 
 # ==========================
 # Terminal Helpers & Styles
@@ -36,62 +51,119 @@ TEXT_SPEED = 0.02  # seconds per character
 FAST_TEXT_SPEED = 0.005
 
 
-def supports_color():
+def supports_color(stream=None):
     if sys.platform == "win32":
         return True  # Modern terminals & Warp support ANSI
-    return sys.stdout.isatty()
+    stream = stream if stream is not None else sys.stdout
+    isatty = getattr(stream, "isatty", None)
+    return bool(isatty and isatty())
 
 
+# Each session decides for itself whether it gets colors (Console.color);
+# COLOR_ENABLED is the fallback for output outside any session.
 COLOR_ENABLED = supports_color()
 
 
+def color_enabled():
+    session = CURRENT_CONSOLE.get(None)
+    if session is not None and session.color is not None:
+        return session.color
+    return COLOR_ENABLED
+
+
 def c(text, *styles):
-    if not COLOR_ENABLED:
+    if not color_enabled():
         return text
-    return "".join(styles) + text + RESET
+    styled = "".join(styles) + text + RESET
+    return Prewrapped(styled) if isinstance(text, Prewrapped) else styled
+
+
+# Catalog text is wrapped once, when it is loaded, rather than on every
+# print: slow_print() and draw_box() show Prewrapped text as it is.
+WRAP_WIDTH = 76
+
+
+class Prewrapped(str):
+    __slots__ = ()
+
+
+def prewrap(text, width=WRAP_WIDTH):
+    if isinstance(text, Prewrapped):
+        return text
+    return Prewrapped(textwrap.fill(text, width=width))
+
+
+# All screen output goes through the current session's Console: a buffered
+# renderer for output plus an input queue fed in the background. Each
+# session (one local player, or many in a server) runs in its own context.
+
+
+def console():
+    return current_console()
+
+
+def echo(text="", end="\n"):
+    console().renderer.write(text + end)
+
+
+async def pause(seconds):
+    await console().pause(seconds)
+
+
+async def ask(prompt):
+    return await console().ask(prompt)
+
+
+async def choose(prompt, count, letters="", default=None):
+    # See Console.choose: an option index, a letter, `default`, or None.
+    return await console().choose(prompt, count, letters, default)
 
 
 def clear():
-    os.system("cls" if os.name == "nt" else "clear")
+    console().renderer.clear()
 
 
-def slow_print(text, speed=TEXT_SPEED, wrap=76, indent=0):
-    if wrap:
+async def slow_print(text, speed=TEXT_SPEED, wrap=WRAP_WIDTH, indent=0):
+    if wrap and not isinstance(text, Prewrapped):
         wrapper = textwrap.TextWrapper(width=wrap, subsequent_indent=" " * indent)
         text = wrapper.fill(text)
-    for ch in text:
-        sys.stdout.write(ch)
-        sys.stdout.flush()
-        if ch != " " and ch != "\n":
-            time.sleep(speed)
-    print()
+    await console().typewrite(text, speed)
 
 
-def type_lines(lines, speed=TEXT_SPEED, wrap=76, indent=0):
+async def type_lines(lines, speed=TEXT_SPEED, wrap=WRAP_WIDTH, indent=0):
     for line in lines:
-        slow_print(line, speed=speed, wrap=wrap, indent=indent)
+        await slow_print(line, speed=speed, wrap=wrap, indent=indent)
 
 
-def wait_for_enter(prompt="\nPress Enter to continue..."):
+async def wait_for_enter(prompt="\nPress Enter to continue..."):
     try:
-        input(c(prompt, FG_CYAN, BOLD))
+        await console().wait_key(c(prompt, FG_CYAN, BOLD))
     except EOFError:
         pass
 
 
 def draw_box(title, body_lines, color=FG_CYAN):
     all_lines = [title] + body_lines
-    width = max(len(textwrap.fill(line, width=76)) for line in all_lines) + 4
+    width = max(_box_width(line) for line in all_lines) + 4
     border = "+" + "-" * (width - 2) + "+"
-    print(c(border, color))
+    echo(c(border, color))
     title_line = f"| {title.center(width - 4)} |"
-    print(c(title_line, color, BOLD))
-    print(c(border, color))
+    echo(c(title_line, color, BOLD))
+    echo(c(border, color))
     for line in body_lines:
-        wrapped = textwrap.wrap(line, width=width - 4) or [""]
+        if isinstance(line, Prewrapped):
+            wrapped = line.split("\n")
+        else:
+            wrapped = textwrap.wrap(line, width=width - 4) or [""]
         for w in wrapped:
-            print(c("| " + w.ljust(width - 4) + " |", color))
-    print(c(border, color))
+            echo(c("| " + w.ljust(width - 4) + " |", color))
+    echo(c(border, color))
+
+
+def _box_width(line):
+    if isinstance(line, Prewrapped):
+        return max(len(part) for part in line.split("\n"))
+    return len(textwrap.fill(line, width=WRAP_WIDTH))
 
 
 # ==========================
@@ -220,51 +292,1378 @@ assert len(PARCELS) >= 20
 PARADOX_THRESHOLD = 12
 MAX_RIPPLE = 30
 
+# Tags that GameState.tag_influence keeps a running count for.
+INFLUENCE_TAGS = [
+    "tech",
+    "spark",
+    "calm",
+    "aesthetic",
+    "chaos",
+    "fire",
+    "noise",
+    "tea",
+    "cozy",
+    "food",
+    "play",
+    "order",
+    "stories",
+    "nature",
+    "water",
+    "air",
+    "tradition",
+    "bureaucracy",
+    "paper",
+    "strict",
+    "culture",
+]
+
+INFLUENCE_SLOTS = {tag: i for i, tag in enumerate(INFLUENCE_TAGS)}
+
+HARMONY_JITTER = (-1, 0, 0, 1)
+JITTER_MEAN = sum(HARMONY_JITTER) / len(HARMONY_JITTER)
+JITTER_SPREAD = (sum((j - JITTER_MEAN) ** 2 for j in HARMONY_JITTER) / len(HARMONY_JITTER)) ** 0.5
+
+# Civ notes are stored as (civ index, template, parcel index) and only
+# formatted when a screen asks for them.
+NOTE_GRATEFUL = 0
+NOTE_SUSPICIOUS = 1
+NOTE_TEMPLATES = ("Grateful for {name}", "Suspicious about {name}")
+
+# Deliveries / notes an --endless session keeps in memory; the journal
+# (--record) has all of them.
+HISTORY_WINDOW = 64
+
+
+# ==========================
+# Catalog Index
+# ==========================
+# Tags are interned to single bits, and the deterministic part of every
+# (parcel, civ) delivery is precomputed, so resolving a delivery is a table
+# lookup plus the jitter. Call build_catalog_index() again after editing
+# PARCELS / CIVILIZATIONS (or their base_ripple) at runtime.
+#
+# A parcel's row of effects is only worked out the first time something
+# asks for it, so a catalog of thousands of parcels and civs does not pay
+# parcels x civs at startup.
+#
+# Catalog queries go through an inverted index instead: for every tag, the
+# parcels carrying it and the civs that prefer / hate it, as int bitsets
+# (bit i set = parcel or civ index i). Questions like "parcels civ X does
+# not hate" are a few bitset operations, not a scan of every parcel's
+# tags, and their per-civ answers are cached until the next rebuild.
+
+
+class EffectTable(Sequence):
+    # EFFECT_TABLE[parcel["index"]][civ["index"]] -> (harmony, chaos, ripple)
 
-class GameState:
     def __init__(self):
+        self.rows = []
+
+    def reset(self):
+        self.rows = [None] * len(PARCELS)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, pi):
+        row = self.rows[pi]
+        if row is None:
+            parcel = PARCELS[pi]
+            row = self.rows[pi] = [delivery_deltas(parcel, civ) for civ in CIVILIZATIONS]
+        return row
+
+
+TAG_BITS = {}  # tag -> 1 << n; INFLUENCE_TAGS get the low bits, in order
+EFFECT_TABLE = EffectTable()
+PARCELS_BY_ID = {}
+CIVS_BY_ID = {}
+TAG_PARCELS = {}  # tag -> bitset of parcels with the tag
+TAG_LOVERS = {}  # tag -> bitset of civs that prefer it
+TAG_HATERS = {}  # tag -> bitset of civs that hate it
+_QUERIES = {}  # (query, civ index) -> cached answer
+
+
+def tag_mask(tags):
+    mask = 0
+    for tag in tags:
+        bit = TAG_BITS.get(tag)
+        if bit is None:
+            bit = TAG_BITS[tag] = 1 << len(TAG_BITS)
+        mask |= bit
+    return mask
+
+
+def delivery_deltas(parcel, civ):
+    tags = parcel["tag_mask"]
+    harmony_delta = 0
+    chaos_delta = 0
+    ripple_delta = parcel["base_ripple"]
+
+    if tags & civ["preferred_mask"]:
+        harmony_delta += 2
+        ripple_delta -= 1
+    if tags & civ["hated_mask"]:
+        harmony_delta -= 2
+        chaos_delta += 2
+        ripple_delta += 2
+
+    if tags & CHAOS_MASK:
+        chaos_delta += 1
+    if tags & CALM_MASK:
+        harmony_delta += 1
+        ripple_delta = max(0, ripple_delta - 1)
+
+    return harmony_delta, chaos_delta, ripple_delta
+
+
+def build_catalog_index():
+    for idx, parcel in enumerate(PARCELS):
+        parcel["index"] = idx
+        parcel["tag_mask"] = tag_mask(parcel["tags"])
+        parcel["influence_slots"] = tuple(INFLUENCE_SLOTS[tag] for tag in INFLUENCE_TAGS if tag in parcel["tags"])
+    for idx, civ in enumerate(CIVILIZATIONS):
+        civ["index"] = idx
+        civ["preferred_mask"] = tag_mask(civ["preferred_tags"])
+        civ["hated_mask"] = tag_mask(civ["hated_tags"])
+    EFFECT_TABLE.reset()
+    _build_tag_index(TAG_PARCELS, PARCELS, "tags")
+    _build_tag_index(TAG_LOVERS, CIVILIZATIONS, "preferred_tags")
+    _build_tag_index(TAG_HATERS, CIVILIZATIONS, "hated_tags")
+    _QUERIES.clear()
+    PARCELS_BY_ID.clear()
+    PARCELS_BY_ID.update((parcel["id"], parcel) for parcel in PARCELS)
+    CIVS_BY_ID.clear()
+    CIVS_BY_ID.update((civ["id"], civ) for civ in CIVILIZATIONS)
+
+
+def bitset(indices):
+    bits = bytearray(max(indices, default=0) // 8 + 1)
+    for i in indices:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, "little")
+
+
+def bit_indices(bits):
+    # Set bit positions, lowest first.
+    digits = bin(bits)[:1:-1]
+    found = []
+    i = digits.find("1")
+    while i >= 0:
+        found.append(i)
+        i = digits.find("1", i + 1)
+    return found
+
+
+def first_index(bits):
+    return (bits & -bits).bit_length() - 1
+
+
+def _build_tag_index(index, items, field):
+    members = {}
+    for item in items:
+        for tag in item[field]:
+            members.setdefault(tag, []).append(item["index"])
+    index.clear()
+    index.update((tag, bitset(indices)) for tag, indices in members.items())
+
+
+def parcels_tagged(tags):
+    # Bitset of parcels carrying any of `tags`.
+    bits = 0
+    for tag in tags:
+        bits |= TAG_PARCELS.get(tag, 0)
+    return bits
+
+
+def _civs_with(index, parcel):
+    bits = 0
+    for tag in parcel["tags"]:
+        bits |= index.get(tag, 0)
+    return bits
+
+
+def civs_loving(parcel):
+    # Bitset of civs that prefer at least one of the parcel's tags.
+    return _civs_with(TAG_LOVERS, parcel)
+
+
+def civs_hating(parcel):
+    return _civs_with(TAG_HATERS, parcel)
+
+
+def hated_parcels(civ):
+    # Bitset of parcels with at least one tag the civ hates.
+    key = ("hated", civ["index"])
+    bits = _QUERIES.get(key)
+    if bits is None:
+        bits = _QUERIES[key] = parcels_tagged(civ["hated_tags"])
+    return bits
+
+
+def safe_parcels(civ):
+    # Indices of the parcels with no tag the civ hates.
+    key = ("safe", civ["index"])
+    found = _QUERIES.get(key)
+    if found is None:
+        found = _QUERIES[key] = bit_indices(((1 << len(PARCELS)) - 1) & ~hated_parcels(civ))
+    return found
+
+
+def loved_parcels(civ):
+    # Indices of the parcels the civ prefers and does not hate: the
+    # deliveries that always raise its harmony.
+    key = ("loved", civ["index"])
+    found = _QUERIES.get(key)
+    if found is None:
+        found = _QUERIES[key] = bit_indices(parcels_tagged(civ["preferred_tags"]) & ~hated_parcels(civ))
+    return found
+
+
+def delivery_groups(parcel):
+    # [(deltas, civ bitset)]: the civs split by what delivering `parcel`
+    # does to them (it only depends on whether a civ prefers and / or hates
+    # one of its tags), each group's deltas from delivery_deltas(). Groups
+    # are ordered by their lowest civ index; empty ones are left out.
+    everyone = (1 << len(CIVILIZATIONS)) - 1
+    lovers = civs_loving(parcel)
+    haters = civs_hating(parcel)
+    groups = []
+    for civs in (lovers & ~haters, lovers & haters, haters & ~lovers, everyone & ~(lovers | haters)):
+        if civs:
+            groups.append((delivery_deltas(parcel, CIVILIZATIONS[first_index(civs)]), civs))
+    groups.sort(key=lambda group: first_index(group[1]))
+    return groups
+
+
+tag_mask(INFLUENCE_TAGS)
+CHAOS_MASK = tag_mask(["chaos"])
+CALM_MASK = tag_mask(["calm", "cozy"])
+build_catalog_index()
+
+
+def civ_mood(harmony, chaos):
+    if harmony > chaos + 2:
+        return "glowingly content"
+    if chaos > harmony + 2:
+        return "dramatically wobbly"
+    return "balanced"
+
+
+class PersistentLog:
+    # Append-only log kept as an immutable chain of (entry, previous) nodes.
+    # A copy shares the whole chain and appends only ever add a node in
+    # front of the appender's own head, so copying is O(1) and copies never
+    # see each other's later entries.
+    #
+    # With a limit, only the newest `limit` entries are promised: once the
+    # chain holds 2 * limit, it is rebuilt from the newest `limit` and the
+    # older nodes are left to the garbage collector (O(1) amortized, at
+    # most 2 * limit nodes held). `total` still counts every append.
+    __slots__ = ("head", "size", "total", "limit")
+
+    def __init__(self, entries=(), limit=None):
+        self.head = None
+        self.size = 0
+        self.total = 0
+        self.limit = limit
+        for entry in entries:
+            self.append(entry)
+
+    def append(self, entry):
+        self.head = (entry, self.head)
+        self.size += 1
+        self.total += 1
+        if self.limit and self.size >= 2 * self.limit:
+            head = None
+            for kept in reversed(list(islice(self.newest(), self.limit))):
+                head = (kept, head)
+            self.head = head
+            self.size = self.limit
+
+    def copy(self):
+        other = PersistentLog.__new__(PersistentLog)
+        other.head = self.head
+        other.size = self.size
+        other.total = self.total
+        other.limit = self.limit
+        return other
+
+    def complete(self):
+        # True while nothing has been trimmed away.
+        return self.size == self.total
+
+    def newest(self):
+        node = self.head
+        while node is not None:
+            yield node[0]
+            node = node[1]
+
+    def __iter__(self):
+        # Oldest kept entry first.
+        return reversed(list(self.newest()))
+
+    def __len__(self):
+        return self.size
+
+    def __getstate__(self):
+        # Pickle flat: a long chain would otherwise nest one level per entry.
+        return list(self), self.limit, self.total
+
+    def __setstate__(self, saved):
+        entries, limit, total = saved
+        self.__init__(entries, limit)
+        self.total = total
+
+
+# Read/write views that keep the original dict-shaped GameState API working
+# (state.civ_states[civ_id]["harmony"], state.tag_influence[tag], ...)
+# on top of the compact array storage below.
+
+
+class CivStateView(MutableMapping):
+    __slots__ = ("_state", "_idx")
+
+    FIELDS = ("harmony", "chaos", "received", "notes")
+
+    def __init__(self, state, idx):
+        self._state = state
+        self._idx = idx
+
+    def __getitem__(self, key):
+        if key == "harmony":
+            return self._state.harmony_of(self._idx)
+        if key == "chaos":
+            return self._state.chaos[self._idx]
+        if key == "received":
+            state = self._state
+            if state.deliveries.complete():
+                return [PARCELS[pi]["id"] for pi, ci in state.deliveries if ci == self._idx]
+            # Trimmed history: catalog order, from the counters.
+            counts = state.received_counts
+            base = self._idx * len(PARCELS)
+            return [parcel["id"] for parcel in PARCELS for _ in range(counts[base + parcel["index"]])]
+        if key == "notes":
+            return [
+                NOTE_TEMPLATES[template].format(name=PARCELS[pi]["name"])
+                for ci, template, pi in self._state.notes
+                if ci == self._idx
+            ]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "harmony":
+            self._state.add_harmony(self._idx, value - self._state.harmony_of(self._idx))
+        elif key == "chaos":
+            self._state.add_chaos(self._idx, value - self._state.chaos[self._idx])
+        else:
+            raise KeyError(f"{key!r} is read-only on a civ state view")
+
+    def __delitem__(self, key):
+        raise TypeError("civ state fields cannot be removed")
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def __len__(self):
+        return len(self.FIELDS)
+
+
+class CivStatesView(Mapping):
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, civ_id):
+        return CivStateView(self._state, CIVS_BY_ID[civ_id]["index"])
+
+    def __iter__(self):
+        return (civ["id"] for civ in CIVILIZATIONS)
+
+    def __len__(self):
+        return len(self._state.base_harmony)
+
+
+class TagInfluenceView(MutableMapping):
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, tag):
+        return self._state.tag_counts[INFLUENCE_SLOTS[tag]]
+
+    def __setitem__(self, tag, value):
+        self._state.own()
+        self._state.tag_counts[INFLUENCE_SLOTS[tag]] = value
+
+    def __delitem__(self, tag):
+        raise TypeError("influence tags cannot be removed")
+
+    def __iter__(self):
+        return iter(INFLUENCE_TAGS)
+
+    def __len__(self):
+        return len(INFLUENCE_TAGS)
+
+
+class DeliveredView(Sequence):
+    __slots__ = ("_state",)
+
+    def __init__(self, state):
+        self._state = state
+
+    def __getitem__(self, i):
+        pairs = list(self._state.deliveries)[i]
+        if isinstance(i, slice):
+            return [(PARCELS[pi]["id"], CIVILIZATIONS[ci]["id"]) for pi, ci in pairs]
+        return (PARCELS[pairs[0]]["id"], CIVILIZATIONS[pairs[1]]["id"])
+
+    def __len__(self):
+        return len(self._state.deliveries)
+
+
+_ENTRIES = {}
+
+
+def intern_entry(entry):
+    # One shared tuple per distinct log entry; there are only
+    # parcels x civs x templates of them.
+    return _ENTRIES.setdefault(entry, entry)
+
+
+class GameState:
+    # Per-civ and per-tag numbers live in flat int arrays indexed by
+    # civ["index"] / INFLUENCE_SLOTS. A civ's harmony is base_harmony[ci] +
+    # harmony_offset: paradox patches that move every civ only shift the
+    # offset. With a history limit, how often each civ got each parcel is
+    # counted in received_counts[civ index * len(PARCELS) + parcel index].
+    # History (deliveries as (parcel index, civ index), notes as (civ index,
+    # template, parcel index)) lives in PersistentLogs, of at most `history`
+    # recent entries each if given. civ_states, tag_influence and delivered
+    # are views for the screens.
+    #
+    # Running aggregates keep the unlock and mood checks O(1) however many
+    # civs there are: harmony_total / chaos_total (sums of base_harmony /
+    # chaos), `spreads` (how many civs have each base_harmony - chaos), the
+    # number of content and wobbly civs, and lazy min/max heaps of
+    # base_harmony. Write harmony and chaos through add_harmony(),
+    # add_chaos() and add_harmony_all() so they stay in step.
+    #
+    # fork() shares everything: the logs are immutable chains, and the
+    # arrays and aggregates are copied on the first write after the fork
+    # (own()). Log entries are interned, so a log node is the only
+    # per-entry cost. The rules functions and the views call own() before
+    # writing; code that writes the arrays directly should do the same, or
+    # use clone(), and call rebuild_aggregates() afterwards.
+    __slots__ = (
+        "ripple_index",
+        "turn",
+        "base_harmony",
+        "harmony_offset",
+        "chaos",
+        "tag_counts",
+        "received_counts",
+        "harmony_total",
+        "chaos_total",
+        "spreads",
+        "content",
+        "wobbly",
+        "low_heap",
+        "high_heap",
+        "deliveries",
+        "notes",
+        "paradoxes_resolved",
+        "paradoxes_triggered",
+        "unlocked_final",
+        "game_over",
+        "shared",
+    )
+
+    def __init__(self, history=None):
+        civ_count = len(CIVILIZATIONS)
         self.ripple_index = 0
         self.turn = 0
-        self.delivered = []  # list of (parcel_id, civ_id)
-        self.civ_states = {
-            civ["id"]: {
-                "harmony": 0,
-                "chaos": 0,
-                "received": [],
-                "notes": [],
-            }
-            for civ in CIVILIZATIONS
-        }
-        self.tag_influence = {tag: 0 for tag in [
-            "tech",
-            "spark",
-            "calm",
-            "aesthetic",
-            "chaos",
-            "fire",
-            "noise",
-            "tea",
-            "cozy",
-            "food",
-            "play",
-            "order",
-            "stories",
-            "nature",
-            "water",
-            "air",
-            "tradition",
-            "bureaucracy",
-            "paper",
-            "strict",
-            "culture",
-        ]}
+        self.base_harmony = array("i", bytes(4 * civ_count))
+        self.harmony_offset = 0
+        self.chaos = array("i", bytes(4 * civ_count))
+        self.tag_counts = array("i", bytes(4 * len(INFLUENCE_TAGS)))
+        # Only needed once history gets trimmed.
+        self.received_counts = array("I", bytes(4 * civ_count * len(PARCELS) if history else 0))
+        self.deliveries = PersistentLog(limit=history)
+        self.notes = PersistentLog(limit=history)
         self.paradoxes_resolved = 0
         self.paradoxes_triggered = 0
         self.unlocked_final = False
         self.game_over = False
+        self.shared = False
+        self.rebuild_aggregates()
+
+    @property
+    def civ_states(self):
+        return CivStatesView(self)
+
+    @property
+    def tag_influence(self):
+        return TagInfluenceView(self)
+
+    @property
+    def delivered(self):
+        return DeliveredView(self)
+
+    # -- harmony and chaos
+
+    def harmony_of(self, ci):
+        return self.base_harmony[ci] + self.harmony_offset
+
+    def harmony_values(self):
+        offset = self.harmony_offset
+        if not offset:
+            return array("i", self.base_harmony)
+        return array("i", [h + offset for h in self.base_harmony])
+
+    def harmony_sum(self):
+        return self.harmony_total + self.harmony_offset * len(self.base_harmony)
+
+    def average_harmony(self):
+        return self.harmony_sum() / len(self.base_harmony)
+
+    def mood_counts(self):
+        # (content, balanced, wobbly), as civ_mood() would sort them.
+        return self.content, len(self.base_harmony) - self.content - self.wobbly, self.wobbly
+
+    def harmony_extremes(self):
+        # (index of the least harmonious civ, index of the most). Heap
+        # entries left behind by later changes are dropped as they surface.
+        base = self.base_harmony
+        low = self.low_heap
+        while base[low[0][1]] != low[0][0]:
+            heapq.heappop(low)
+        high = self.high_heap
+        while base[high[0][1]] != -high[0][0]:
+            heapq.heappop(high)
+        return low[0][1], high[0][1]
+
+    def add_harmony(self, ci, delta):
+        self.own()
+        spread = self.base_harmony[ci] - self.chaos[ci]
+        self.base_harmony[ci] += delta
+        self.harmony_total += delta
+        self._respread(spread, spread + delta)
+        self._push(ci)
+
+    def add_chaos(self, ci, delta):
+        self.own()
+        spread = self.base_harmony[ci] - self.chaos[ci]
+        self.chaos[ci] += delta
+        self.chaos_total += delta
+        self._respread(spread, spread - delta)
+
+    def add_harmony_all(self, delta):
+        # O(delta), not O(civs): only the offset moves, and the mood counts
+        # pick up the civs whose spread crosses a mood boundary.
+        if not delta:
+            return
+        self.own()
+        before = self.harmony_offset
+        after = self.harmony_offset = before + delta
+        count = self._count_spreads
+        if delta > 0:
+            self.content += count(3 - after, 3 - before)
+            self.wobbly -= count(-2 - after, -2 - before)
+        else:
+            self.content -= count(3 - before, 3 - after)
+            self.wobbly += count(-2 - before, -2 - after)
+
+    def _count_spreads(self, low, high):
+        # Civs with low <= base_harmony - chaos < high.
+        spreads = self.spreads
+        return sum(spreads.get(d, 0) for d in range(low, high))
+
+    def _respread(self, before, after):
+        spreads = self.spreads
+        spreads[before] -= 1
+        if not spreads[before]:
+            del spreads[before]
+        spreads[after] = spreads.get(after, 0) + 1
+        offset = self.harmony_offset
+        self.content += (after + offset > 2) - (before + offset > 2)
+        self.wobbly += (after + offset < -2) - (before + offset < -2)
+
+    def _push(self, ci):
+        value = self.base_harmony[ci]
+        heapq.heappush(self.low_heap, (value, ci))
+        heapq.heappush(self.high_heap, (-value, ci))
+        if len(self.low_heap) > 4 * len(self.base_harmony) + 16:
+            self._rebuild_heaps()
+
+    def _rebuild_heaps(self):
+        self.low_heap = [(h, ci) for ci, h in enumerate(self.base_harmony)]
+        self.high_heap = [(-h, ci) for ci, h in enumerate(self.base_harmony)]
+        heapq.heapify(self.low_heap)
+        heapq.heapify(self.high_heap)
+
+    def rebuild_aggregates(self):
+        # From scratch, O(civs): after loading or writing the arrays directly.
+        base = self.base_harmony
+        offset = self.harmony_offset
+        self.harmony_total = sum(base)
+        self.chaos_total = sum(self.chaos)
+        self.spreads = {}
+        self.content = self.wobbly = 0
+        for h, ch in zip(base, self.chaos):
+            d = h - ch
+            self.spreads[d] = self.spreads.get(d, 0) + 1
+            self.content += d + offset > 2
+            self.wobbly += d + offset < -2
+        self._rebuild_heaps()
+
+    # -- history
 
     def log_delivery(self, parcel_id, civ_id):
-        self.delivered.append((parcel_id, civ_id))
+        self.record_delivery(PARCELS_BY_ID[parcel_id]["index"], CIVS_BY_ID[civ_id]["index"])
+
+    def record_delivery(self, parcel_index, civ_index):
+        if self.received_counts:
+            self.own()
+            self.received_counts[civ_index * len(PARCELS) + parcel_index] += 1
+        self.deliveries.append(intern_entry((parcel_index, civ_index)))
+
+    def add_note(self, civ_index, template, parcel_index):
+        self.notes.append(intern_entry((civ_index, template, parcel_index)))
+
+    # -- branching
+
+    def fork(self):
+        # A branch of this state in O(1): nothing is copied until one side
+        # writes.
+        other = GameState.__new__(GameState)
+        other.ripple_index = self.ripple_index
+        other.turn = self.turn
+        other.base_harmony = self.base_harmony
+        other.harmony_offset = self.harmony_offset
+        other.chaos = self.chaos
+        other.tag_counts = self.tag_counts
+        other.received_counts = self.received_counts
+        other.harmony_total = self.harmony_total
+        other.chaos_total = self.chaos_total
+        other.spreads = self.spreads
+        other.content = self.content
+        other.wobbly = self.wobbly
+        other.low_heap = self.low_heap
+        other.high_heap = self.high_heap
+        other.paradoxes_resolved = self.paradoxes_resolved
+        other.paradoxes_triggered = self.paradoxes_triggered
+        other.unlocked_final = self.unlocked_final
+        other.game_over = self.game_over
+        other.deliveries = self.deliveries.copy()
+        other.notes = self.notes.copy()
+        other.shared = self.shared = True
+        return other
+
+    def own(self):
+        # Called before writing harmony, chaos, tag_counts or the aggregates.
+        if self.shared:
+            self.base_harmony = array("i", self.base_harmony)
+            self.chaos = array("i", self.chaos)
+            self.tag_counts = array("i", self.tag_counts)
+            self.received_counts = array("I", self.received_counts)
+            self.spreads = dict(self.spreads)
+            self.low_heap = list(self.low_heap)
+            self.high_heap = list(self.high_heap)
+            self.shared = False
+
+    def clone(self):
+        # A fork whose arrays are private from the start, leaving this
+        # state's own arrays unshared.
+        shared = self.shared
+        other = self.fork()
+        self.shared = shared
+        other.own()
+        return other
+
+    def key(self):
+        # Everything the rules look at, as one hashable value. History
+        # (which parcel went where, notes) is left out: it never feeds back
+        # into a rule, so two states that differ only there play the same.
+        return (
+            self.ripple_index,
+            self.turn,
+            self.deliveries.total,
+            self.paradoxes_triggered,
+            self.paradoxes_resolved,
+            self.unlocked_final,
+            self.game_over,
+            self.harmony_values().tobytes(),
+            self.chaos.tobytes(),
+            self.tag_counts.tobytes(),
+        )
+
+
+COMEDIC_SIDE_EFFECTS = [
+    "accidentally standardizes the universe-wide definition of 'just a minute'.",
+    "causes three parallel universes to agree on pineapple pizza, briefly.",
+    "adds a footnote to gravity that says 'when convenient'.",
+    "inspires a hit musical about filing cabinets.",
+    "teaches clouds to form constructive feedback.",
+    "results in polite time-travel tourism brochures.",
+]
+
+MISSION_SCENARIOS = [
+    "A local council requests your guidance.",
+    "A small committee of very curious beings corners you.",
+    "An ad-hoc festival forms around your delivery.",
+    "A politely urgent message pings your multidimensional pager.",
+]
+
+# (label, deltas, flavor)
+MISSION_OPTIONS = [
+    (
+        "Encourage gentle experimentation.",
+        {"harmony": +1, "chaos": 0, "ripple": +1},
+        "You suggest small cozy pilots and lots of tea breaks.",
+    ),
+    (
+        "Push for bold, flashy change.",
+        {"harmony": 0, "chaos": +2, "ripple": +2},
+        "You sketch a headline-grabbing timeline pivot.",
+    ),
+    (
+        "Advise careful documentation and patience.",
+        {"harmony": +1, "chaos": -1, "ripple": 0},
+        "You gift them a color-coded, mildly adorable manual.",
+    ),
+]
+
+PARADOX_SCENARIOS = [
+    {
+        "text": "Two civilizations invent the same board game, but with opposing rules.",
+        "options": [
+            (
+                "Let them argue it out. It's character-building.",
+                {"ripple": +3, "harmony_all": 0},
+                "The debate becomes a multiverse-wide reality show.",
+            ),
+            (
+                "Quietly standardize the rules in the archives.",
+                {"ripple": -3, "harmony_all": -1},
+                "Some timelines grumble about 'patch notes', but it works.",
+            ),
+            (
+                "Create a crossover tournament with both rule sets.",
+                {"ripple": -1, "harmony_all": +1},
+                "Chaos becomes camaraderie, with themed snacks.",
+            ),
+        ],
+    },
+    {
+        "text": "A parcel of Fireworks arrives exactly five minutes before its own invention.",
+        "options": [
+            (
+                "Label it 'research preview' and shrug.",
+                {"ripple": +2, "harmony_all": 0},
+                "History textbooks add a mysterious asterisk.",
+            ),
+            (
+                "Carefully re-route it to a timeline that already had fireworks.",
+                {"ripple": -3, "harmony_all": 0},
+                "Paradox diffused with minimal glitter.",
+            ),
+            (
+                "Host a cross-temporal safety workshop.",
+                {"ripple": -1, "harmony_all": +1},
+                "Everyone leaves with earplugs and fond memories.",
+            ),
+        ],
+    },
+]
+
+# (prompt, [(label, points, flavor), ...])
+FINAL_PUZZLE_STEPS = [
+    (
+        "Step 1: Choose the guiding principle.",
+        [
+            ("Maximize spectacle at all costs.", 0, "Fireworks forever, naps never."),
+            ("Cozy connection and mutual understanding.", 1, "Tea, stories, and reasonable snack budgets."),
+            ("Endless paperwork to prevent surprises.", 0, "Everything predictable, nothing delightful."),
+        ],
+    ),
+    (
+        "Step 2: Broadcast one idea to every civilization at once.",
+        [
+            ("Tea", 1, "The multiverse exhales in unison."),
+            ("Fireworks", 0, "Colorful, loud, mildly singed."),
+            ("Time Management", 0, "Everyone is on time and vaguely stressed."),
+        ],
+    ),
+    (
+        "Step 3: Set the tempo of causality.",
+        [
+            ("Slow and steady, with room for naps.", 1, "History becomes a well-paced cozy novel."),
+            ("Chaotic jazz solo.", 0, "Exciting, but hard to schedule."),
+            ("Endless bureaucratic queue.", 0, "Nothing breaks, but nothing starts."),
+        ],
+    ),
+]
+
+# Option menus ("[1] label", ...) are built here once, and the flavor and
+# scenario text pre-wrapped, instead of on every mission or paradox screen.
+# Content packs (courier_content) arrive already wrapped, with their menus.
+MISSION_MENU = []
+
+
+def option_menu(options):
+    return [f"[{i}] {label}" for i, (label, _, _) in enumerate(options, start=1)]
+
+
+def prepare_content():
+    MISSION_SCENARIOS[:] = [prewrap(text) for text in MISSION_SCENARIOS]
+    MISSION_OPTIONS[:] = [(label, deltas, prewrap(flavor)) for label, deltas, flavor in MISSION_OPTIONS]
+    MISSION_MENU[:] = option_menu(MISSION_OPTIONS)
+    for scenario in PARADOX_SCENARIOS:
+        if "menu" not in scenario:
+            scenario["text"] = prewrap(scenario["text"])
+            scenario["options"] = [(label, deltas, prewrap(flavor)) for label, deltas, flavor in scenario["options"]]
+            scenario["menu"] = option_menu(scenario["options"])
+    for step, (prompt, options) in enumerate(FINAL_PUZZLE_STEPS):
+        FINAL_PUZZLE_STEPS[step] = (prompt, [(label, points, prewrap(flavor)) for label, points, flavor in options])
+
+
+prepare_content()
+
+ENDING_GOLDEN = "golden_harmony"
+ENDING_BITTERSWEET = "bittersweet"
+ENDING_CHAOTIC = "chaotic_carousel"
+
+
+# ==========================
+# Rules Engine
+# ==========================
+# Everything in this section is free of terminal I/O and sleeps. The screens
+# below are a thin layer over these functions, and bots / batch tools can
+# drive a game with nothing but a GameState and a random.Random (or an
+# RngStreams, to get the same draws as a seeded session).
+
+DeliveryResult = namedtuple(
+    "DeliveryResult", "harmony_delta chaos_delta ripple_delta side_effect"
+)
+
+# One full turn of decisions. paradox_patch is only used if the turn ends up
+# over PARADOX_THRESHOLD; final_answers only if the final puzzle unlocks and
+# attempt_final is true.
+TurnAction = namedtuple(
+    "TurnAction", "parcel civ advice paradox_patch attempt_final final_answers"
+)
+TurnAction.__new__.__defaults__ = (0, True, None)
+
+# Projected civ harmony / chaos and ripple index after a delivery. harmony
+# is the expectation over HARMONY_JITTER, spread its standard deviation;
+# chaos and ripple do not depend on the jitter.
+DeliveryPreview = namedtuple("DeliveryPreview", "harmony spread chaos ripple")
+
+TurnResult = namedtuple(
+    "TurnResult", "delivery mission_scenario paradox_scenario unlock_offered ending"
+)
+
+
+RNG_STREAMS = ("offers", "delivery", "mission", "paradox")
+
+
+class RngStreams:
+    # One independent random.Random per kind of draw, reseeded at the start
+    # of every turn from (seed, stream, turn). A turn's draws therefore
+    # depend on the seed and the turn number only: refreshing the offer
+    # three times does not change which side effect the delivery rolls, and
+    # a saved game can resume from just the turn number.
+
+    def __init__(self, seed):
+        self.seed = seed
+        self.turn = None
+        for name in RNG_STREAMS:
+            setattr(self, name, random.Random())
+
+    def start_turn(self, turn):
+        self.turn = turn
+        for name in RNG_STREAMS:
+            getattr(self, name).seed(f"{self.seed}:{name}:{turn}")
+
+
+def phase_rngs(rng):
+    # (delivery, mission, paradox): a plain Random serves every phase.
+    if isinstance(rng, RngStreams):
+        return rng.delivery, rng.mission, rng.paradox
+    return rng, rng, rng
+
+
+def clamp_ripple(value):
+    return max(0, min(MAX_RIPPLE, value))
+
+
+def offer_parcels(rng=random, count=5):
+    # Simple model: all parcels are always available. sample() only draws
+    # `count` of them, however big the catalog.
+    return rng.sample(PARCELS, min(count, len(PARCELS)))
+
+
+def resolve_delivery(state, parcel, civ, rng=random):
+    pi = parcel["index"]
+    ci = civ["index"]
+    harmony_delta, chaos_delta, ripple_delta = EFFECT_TABLE[pi][ci]
+    harmony_delta += rng.choice(HARMONY_JITTER)
+
+    state.add_harmony(ci, harmony_delta)
+    state.add_chaos(ci, chaos_delta)
+
+    tag_counts = state.tag_counts
+    for slot in parcel["influence_slots"]:
+        tag_counts[slot] += 1
+
+    state.ripple_index = clamp_ripple(state.ripple_index + ripple_delta)
+    state.record_delivery(pi, ci)
+
+    side = rng.choice(COMEDIC_SIDE_EFFECTS)
+
+    if harmony_delta > 1:
+        state.add_note(ci, NOTE_GRATEFUL, pi)
+    elif harmony_delta < 0:
+        state.add_note(ci, NOTE_SUSPICIOUS, pi)
+
+    return DeliveryResult(harmony_delta, chaos_delta, ripple_delta, side)
+
+
+def preview_deliveries(state, parcels, civs=None):
+    # Every (parcel, civ) delivery at once, without touching state:
+    # rows[p][c] is the DeliveryPreview of parcels[p] -> civs[c]. Each pair
+    # is one EFFECT_TABLE lookup on top of per-civ bases read once, so this
+    # is cheap enough to run on every redraw.
+    civs = CIVILIZATIONS if civs is None else civs
+    slots = [civ["index"] for civ in civs]
+    harmony = [state.harmony_of(ci) + JITTER_MEAN for ci in slots]
+    chaos = [state.chaos[ci] for ci in slots]
+    ripple = state.ripple_index
+    rows = []
+    for parcel in parcels:
+        effects = EFFECT_TABLE[parcel["index"]]
+        row = []
+        for ci, h, ch in zip(slots, harmony, chaos):
+            dh, dc, dr = effects[ci]
+            row.append(DeliveryPreview(h + dh, JITTER_SPREAD, ch + dc, clamp_ripple(ripple + dr)))
+        rows.append(row)
+    return rows
+
+
+def draw_mission_scenario(rng=random):
+    return rng.choice(MISSION_SCENARIOS)
+
+
+def apply_mission_advice(state, civ, advice_idx):
+    label, deltas, flavor = MISSION_OPTIONS[advice_idx]
+    ci = civ["index"]
+    state.add_harmony(ci, deltas["harmony"])
+    state.add_chaos(ci, deltas["chaos"])
+    state.ripple_index = clamp_ripple(state.ripple_index + deltas["ripple"])
+    return flavor
+
+
+def paradox_due(state):
+    return state.ripple_index >= PARADOX_THRESHOLD
+
+
+def trigger_paradox(state, rng=random):
+    state.paradoxes_triggered += 1
+    return rng.choice(PARADOX_SCENARIOS)
+
+
+def apply_paradox_patch(state, scenario, patch_idx):
+    label, deltas, flavor = scenario["options"][patch_idx]
+    # Applies to all civs, as one shift of the harmony offset.
+    state.add_harmony_all(deltas["harmony_all"])
+    state.ripple_index = clamp_ripple(state.ripple_index + deltas["ripple"])
+    state.paradoxes_resolved += 1
+    return flavor
+
+
+def final_puzzle_ready(state):
+    if state.deliveries.total < 8:
+        return False
+    if state.average_harmony() < -1:
+        return False
+    if state.ripple_index > int(MAX_RIPPLE * 0.8):
+        return False
+    return True
+
+
+def score_final_answers(answers):
+    return sum(FINAL_PUZZLE_STEPS[i][1][choice][1] for i, choice in enumerate(answers))
+
+
+def ending_for(state, score):
+    if score >= 3 and state.ripple_index <= PARADOX_THRESHOLD:
+        return ENDING_GOLDEN
+    if score >= 2 and state.ripple_index < MAX_RIPPLE:
+        return ENDING_BITTERSWEET
+    return ENDING_CHAOTIC
+
+
+# One whole turn, headless: same rule order as main_loop.
+def step(state, action, rng=random):
+    state.turn += 1
+    if isinstance(rng, RngStreams):
+        rng.start_turn(state.turn)
+    delivery_rng, mission_rng, paradox_rng = phase_rngs(rng)
+    delivery = resolve_delivery(state, action.parcel, action.civ, delivery_rng)
+    emit_delivery(state, action.parcel, action.civ, delivery)
+
+    mission_scenario = draw_mission_scenario(mission_rng)
+    apply_mission_advice(state, action.civ, action.advice)
+    emit_advice(state, action.civ, action.advice)
+
+    paradox_scenario = None
+    if paradox_due(state):
+        paradox_scenario = trigger_paradox(state, paradox_rng)
+        emit_paradox(state, paradox_scenario)
+        apply_paradox_patch(state, paradox_scenario, action.paradox_patch)
+        emit_patch(state, paradox_scenario, action.paradox_patch)
+
+    ending = None
+    unlock_offered = not state.unlocked_final and final_puzzle_ready(state)
+    if unlock_offered and action.attempt_final:
+        state.unlocked_final = True
+        if action.final_answers is not None:
+            ending = ending_for(state, score_final_answers(action.final_answers))
+            emit_ending(state, ending)
+
+    return TurnResult(delivery, mission_scenario, paradox_scenario, unlock_offered, ending)
+
+
+# ==========================
+# Game Events
+# ==========================
+# Spectators (courier_spectate) follow games as a stream of small dicts:
+# start, delivery, advice, paradox, patch, ending, undo, retired. They come from
+# the screens (live players) and from step() / courier_batch (bots), never
+# from the rules functions themselves, so advisor and solver simulations
+# stay silent. Each session or bot sets its own sink in CURRENT_EVENTS;
+# without one an event costs a context variable lookup.
+
+CURRENT_EVENTS = contextvars.ContextVar("courier_events", default=None)
+
+
+def emit(kind, state, **fields):
+    sink = CURRENT_EVENTS.get()
+    if sink is not None:
+        fields["kind"] = kind
+        fields["turn"] = state.turn
+        fields["ripple"] = state.ripple_index
+        sink(fields)
+
+
+def emit_delivery(state, parcel, civ, result):
+    if CURRENT_EVENTS.get() is not None:
+        emit("delivery", state, parcel=parcel["id"], civ=civ["id"], harmony=result.harmony_delta,
+             chaos=result.chaos_delta, side_effect=result.side_effect)
+
+
+def emit_advice(state, civ, advice):
+    if CURRENT_EVENTS.get() is not None:
+        deltas = MISSION_OPTIONS[advice][1]
+        emit("advice", state, civ=civ["id"], advice=advice, harmony=deltas["harmony"], chaos=deltas["chaos"])
+
+
+def emit_paradox(state, scenario):
+    if CURRENT_EVENTS.get() is not None:
+        emit("paradox", state, text=" ".join(scenario["text"].split()))
+
+
+def emit_patch(state, scenario, patch):
+    if CURRENT_EVENTS.get() is not None:
+        emit("patch", state, patch=patch, harmony_all=scenario["options"][patch][1]["harmony_all"])
+
+
+def emit_ending(state, ending):
+    if CURRENT_EVENTS.get() is not None:
+        emit("ending", state, ending=ending, harmony=round(state.average_harmony(), 2))
+
+
+# ==========================
+# Phase Timing
+# ==========================
+# The phases of a turn run through metered(), which tells the meter in
+# CURRENT_METER (a courier_metrics.PhaseMeter) when each one starts and
+# stops. Without a meter a phase costs a context variable lookup.
+
+CURRENT_METER = contextvars.ContextVar("courier_meter", default=None)
+
+
+async def metered(name, screen):
+    # Awaits the `screen` coroutine as phase `name`.
+    meter = CURRENT_METER.get()
+    if meter is None:
+        return await screen
+    meter.start(name)
+    try:
+        return await screen
+    finally:
+        meter.stop(name)
+
+
+def metered_call(name, fn, *args):
+    meter = CURRENT_METER.get()
+    if meter is None:
+        return fn(*args)
+    meter.start(name)
+    try:
+        return fn(*args)
+    finally:
+        meter.stop(name)
+
+
+# ==========================
+# Session Journal
+# ==========================
+# A recorded session is a JSON-lines file: a header with the seed, one line
+# per finished turn with the decisions taken and a digest of the GameState
+# they led to, a "rewind" line for every undo, and an "end" line. courier_replay.py feeds the decisions back
+# through step() and checks every digest.
+
+JOURNAL_VERSION = 1
+
+
+def state_digest(state):
+    return hashlib.blake2b(repr(state.key()).encode(), digest_size=8).hexdigest()
+
+
+class SessionJournal:
+    def __init__(self, path, seed, clock=None, state=None):
+        self.file = open(path, "w", encoding="utf-8")
+        self.clock = clock
+        header = {
+            "journal": JOURNAL_VERSION,
+            "seed": seed,
+            "paradox_threshold": PARADOX_THRESHOLD,
+            "max_ripple": MAX_RIPPLE,
+            "catalog": catalog_fingerprint().hex(),
+        }
+        if state is not None and state.deliveries.limit:
+            header["history"] = state.deliveries.limit
+        if state is not None and state.turn:
+            # A resumed game: replays start from the saved state.
+            header["snapshot"] = pack_snapshot(state, seed).hex()
+        self._write(header)
+
+    def _write(self, record):
+        if self.clock is not None:
+            record["t"] = round(self.clock.now(), 3)
+        self.file.write(json.dumps(record, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def turn(self, state, parcel, civ, advice, patch, attempt_final):
+        # patch: None if no paradox; attempt_final: None if not offered.
+        self._write({
+            "turn": state.turn,
+            "parcel": parcel["id"],
+            "civ": civ["id"],
+            "advice": advice,
+            "patch": patch,
+            "final": attempt_final,
+            "digest": state_digest(state),
+        })
+
+    def rewind(self, state):
+        # The player undid back to `state`; replays restart from the state
+        # recorded at that turn.
+        self._write({"rewind": state.turn, "digest": state_digest(state)})
+
+    def finish(self, state, answers=None, ending=None, quit=False):
+        self._write({
+            "end": True,
+            "turn": state.turn,
+            "quit": quit,
+            "answers": answers,
+            "ending": ending,
+            "digest": state_digest(state),
+        })
+
+    def close(self):
+        self.file.close()
+
+
+# ==========================
+# Save Files
+# ==========================
+# A save file is a short header followed by length-prefixed records: one
+# binary GameState snapshot, then one small record per turn played since.
+# Saving a turn appends ~16 bytes; loading unpacks the last snapshot and
+# replays the turns after it through step(). Every COMPACT_EVERY turns the
+# file is rewritten as a single fresh snapshot, so long sessions keep small
+# saves and short loads.
+
+SAVE_MAGIC = b"CPS2"
+SAVE_PATH = os.path.join(os.path.expanduser("~"), ".courier_of_possibilities.save")
+COMPACT_EVERY = 32
+
+RECORD_HEAD = struct.Struct("<IB")  # payload length, kind
+RECORD_SNAPSHOT = 1
+RECORD_TURN = 2
+RECORD_END = 3
+
+# seed, turn, ripple, resolved, triggered, deliveries made, history limit
+# (0: none), deliveries kept, notes kept, unlocked, over
+SNAPSHOT_HEAD = struct.Struct("<qIHIIIIII??")
+SEED_RANGE = range(-2**63, 2**63)  # the seeds a snapshot can hold (SNAPSHOT_HEAD's q)
+TURN_RECORD = struct.Struct("<IHHBbb")  # turn (= RNG position), parcel, civ, advice, patch, final
+
+
+def catalog_fingerprint():
+    # Records store catalog indices; a save only loads against the same catalog.
+    ids = "|".join(
+        [",".join(p["id"] for p in PARCELS), ",".join(v["id"] for v in CIVILIZATIONS), ",".join(INFLUENCE_TAGS)]
+    )
+    return hashlib.blake2b(ids.encode(), digest_size=8).digest()
+
+
+def pack_snapshot(state, seed):
+    deliveries = list(state.deliveries)
+    notes = list(state.notes)
+    parts = [
+        SNAPSHOT_HEAD.pack(
+            seed,
+            state.turn,
+            state.ripple_index,
+            state.paradoxes_resolved,
+            state.paradoxes_triggered,
+            state.deliveries.total,
+            state.deliveries.limit or 0,
+            len(deliveries),
+            len(notes),
+            state.unlocked_final,
+            state.game_over,
+        ),
+        state.harmony_values().tobytes(),
+        state.chaos.tobytes(),
+        state.tag_counts.tobytes(),
+        state.received_counts.tobytes(),
+        array("H", [pi for pi, _ in deliveries]).tobytes(),
+        array("H", [ci for _, ci in deliveries]).tobytes(),
+        array("H", [n for note in notes for n in note]).tobytes(),
+    ]
+    return b"".join(parts)
+
+
+def unpack_snapshot(data):
+    head = SNAPSHOT_HEAD.unpack_from(data)
+    seed, turn, ripple, resolved, triggered, total, limit, kept, noted, unlocked, over = head
+    state = GameState(limit or None)
+    offset = SNAPSHOT_HEAD.size
+    for arr in (state.base_harmony, state.chaos, state.tag_counts, state.received_counts):
+        size = len(arr) * arr.itemsize
+        arr[:] = array(arr.typecode, data[offset:offset + size])
+        offset += size
+    state.rebuild_aggregates()
+    logs = []
+    for size in (kept, kept, 3 * noted):
+        logs.append(array("H", data[offset:offset + 2 * size]))
+        offset += 2 * size
+    parcels, civs, notes = logs
+    for pi, ci in zip(parcels, civs):
+        state.deliveries.append(intern_entry((pi, ci)))
+    state.deliveries.total = total
+    for i in range(0, len(notes), 3):
+        state.add_note(*notes[i:i + 3])
+    state.turn = turn
+    state.ripple_index = ripple
+    state.paradoxes_resolved = resolved
+    state.paradoxes_triggered = triggered
+    state.unlocked_final = unlocked
+    state.game_over = over
+    return seed, state
+
+
+def _record(kind, payload):
+    return RECORD_HEAD.pack(len(payload), kind) + payload
+
+
+class SaveFile:
+    def __init__(self, path, seed, state):
+        # Starts a fresh save of `state` at `path`.
+        self.path = path
+        self.seed = seed
+        self.file = None
+        self.compact(state)
+
+    def compact(self, state):
+        # Rewrite as header + one snapshot; atomic, so a crash leaves the
+        # old save or the new one.
+        if self.file:
+            self.file.close()
+        tmp = self.path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(SAVE_MAGIC + catalog_fingerprint())
+            f.write(_record(RECORD_SNAPSHOT, pack_snapshot(state, self.seed)))
+        os.replace(tmp, self.path)
+        self.file = open(self.path, "ab")
+        self.turns_since_snapshot = 0
+
+    def turn(self, state, parcel, civ, advice, patch, attempt_final):
+        payload = TURN_RECORD.pack(
+            state.turn,
+            parcel["index"],
+            civ["index"],
+            advice,
+            -1 if patch is None else patch,
+            -1 if attempt_final is None else int(attempt_final),
+        )
+        self.file.write(_record(RECORD_TURN, payload))
+        self.file.flush()
+        self.turns_since_snapshot += 1
+        if self.turns_since_snapshot >= COMPACT_EVERY:
+            self.compact(state)
+
+    def finish(self, ending):
+        # A finished game is not offered for resume.
+        self.file.write(_record(RECORD_END, ending.encode("ascii")))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def load_save(path):
+    # (seed, state, ending) for the save at `path`; ending is None while the
+    # game is still in progress. A torn last record is ignored.
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:4] != SAVE_MAGIC:
+        raise ValueError(f"{path}: not a Courier save file")
+    if data[4:12] != catalog_fingerprint():
+        raise ValueError(f"{path}: saved against a different parcel / civilization catalog")
+    offset = 12
+    seed = state = None
+    turns = []
+    ending = None
+    while offset + RECORD_HEAD.size <= len(data):
+        length, kind = RECORD_HEAD.unpack_from(data, offset)
+        start = offset + RECORD_HEAD.size
+        if start + length > len(data):
+            break
+        payload = data[start:start + length]
+        offset = start + length
+        if kind == RECORD_SNAPSHOT:
+            seed, state = unpack_snapshot(payload)
+            turns = []
+        elif kind == RECORD_TURN:
+            turns.append(TURN_RECORD.unpack(payload))
+        elif kind == RECORD_END:
+            ending = payload.decode("ascii")
+    if state is None:
+        raise ValueError(f"{path}: no snapshot")
+    streams = RngStreams(seed)
+    for turn, pi, ci, advice, patch, final in turns:
+        if turn != state.turn + 1:
+            raise ValueError(f"{path}: turn {turn} does not follow turn {state.turn}")
+        action = TurnAction(PARCELS[pi], CIVILIZATIONS[ci], advice, max(patch, 0), final == 1)
+        step(state, action, streams)
+    return seed, state, ending
 
 
 # ==========================
@@ -272,7 +1671,7 @@ class GameState:
 # ==========================
 
 
-def title_screen():
+async def title_screen():
     clear()
     logo_lines = [
         "   ____                          _            __      __           _ _           ",
@@ -285,19 +1684,19 @@ def title_screen():
         "                        Courier of Possibilities",
     ]
     for line in logo_lines:
-        print(c(line, FG_CYAN, BOLD))
-        time.sleep(0.05)
+        echo(c(line, FG_CYAN, BOLD))
+        await pause(0.05)
 
     subtitle = "A cozy, time-bending narrative puzzle about delivering ideas."
-    slow_print(c(subtitle, FG_MAGENTA, ITALIC), speed=TEXT_SPEED)
+    await slow_print(c(subtitle, FG_MAGENTA, ITALIC), speed=TEXT_SPEED)
 
-    print()
-    slow_print(c("Withley presents a very small, extremely polite multiverse.", FG_YELLOW), speed=TEXT_SPEED)
-    print()
-    wait_for_enter()
+    echo()
+    await slow_print(c("Withley presents a very small, extremely polite multiverse.", FG_YELLOW), speed=TEXT_SPEED)
+    echo()
+    await wait_for_enter()
 
 
-def intro_cinematic():
+async def intro_cinematic():
     clear()
     lines = [
         "The multiverse is not held together by physics.",
@@ -311,21 +1710,22 @@ def intro_cinematic():
         "Your mission: gently shepherd chaos toward a harmonious, cozy equilibrium,",
         "without letting the Ripple Index spiral into paradox-flavored soup.",
     ]
-    type_lines([c(l, FG_WHITE) for l in lines], speed=TEXT_SPEED)
-    print()
-    wait_for_enter()
+    await type_lines([c(l, FG_WHITE) for l in lines], speed=TEXT_SPEED)
+    echo()
+    await wait_for_enter()
 
 
 def show_civ_ascii(civ):
-    print(c(civ["ascii_art"], FG_CYAN))
-    print(c(f"{civ['name']}: \"{civ['motto']}\"", FG_YELLOW))
+    echo(c(civ["ascii_art"], FG_CYAN))
+    echo(c(f"{civ['name']}: \"{civ['motto']}\"", FG_YELLOW))
 
 
-def ripple_animation(state, parcel, civ):
+async def ripple_animation(state, parcel, civ):
     clear()
+    show_turn_header(state)
     title = f"Delivering '{parcel['name']}' to {civ['name']}..."
-    print(c(title, FG_GREEN, BOLD))
-    print()
+    echo(c(title, FG_GREEN, BOLD))
+    echo()
     phases = [
         "Packing conceptual bubble wrap...",
         "Threading through adjacent maybes...",
@@ -336,9 +1736,9 @@ def ripple_animation(state, parcel, civ):
     for i, phase in enumerate(phases):
         bar = bars[min(i, len(bars) - 1)]
         line = f" {bar} {phase}"
-        print(c(line, FG_MAGENTA))
-        time.sleep(0.5)
-    print()
+        echo(c(line, FG_MAGENTA))
+        await pause(0.5)
+    echo()
     swirl_frames = [
         " ~ ripple ~",
         "  ~~ ripple ~~",
@@ -347,13 +1747,12 @@ def ripple_animation(state, parcel, civ):
         "   ~ ripple ~",
     ]
     for frame in swirl_frames:
-        sys.stdout.write("\r" + c(frame.ljust(40), FG_CYAN))
-        sys.stdout.flush()
-        time.sleep(0.2)
-    print("\n")
+        echo("\r" + c(frame.ljust(40), FG_CYAN), end="")
+        await pause(0.2)
+    echo("\n")
 
 
-def show_ripple_status(state):
+def ripple_status_lines(state):
     bar_len = 20
     filled = min(bar_len, max(0, int(bar_len * state.ripple_index / MAX_RIPPLE)))
     bar = "#" * filled + "-" * (bar_len - filled)
@@ -367,136 +1766,196 @@ def show_ripple_status(state):
     else:
         color = FG_RED
         note = "Paradox sirens warming up. Maybe stop throwing fireworks at history."
-    print(c(status, color, BOLD))
-    print(c(note, FG_MAGENTA))
-
-
-# ==========================
-# Core Mechanics
-# ==========================
+    return [c(status, color, BOLD), c(note, FG_MAGENTA)]
 
 
-def choose_parcel(state):
-    clear()
-    print(c("=== IDEA PARCEL SELECTION ===", FG_CYAN, BOLD))
-    print()
-    available = PARCELS[:]  # simple model: all available always
-    random.shuffle(available)
-    choices = available[:5]
-
-    for idx, parcel in enumerate(choices, start=1):
-        tags = ", ".join(sorted(parcel["tags"]))
-        print(c(f"[{idx}] {parcel['name']}", FG_YELLOW, BOLD))
-        print(c(f"    Tags: {tags}", FG_WHITE))
-    print(c("[R] Refresh selection", FG_BLUE))
-
-    while True:
-        choice = input(c("Select a parcel (number) or R: ", FG_CYAN)).strip().lower()
-        if choice == "r":
-            return choose_parcel(state)
-        if choice.isdigit():
-            num = int(choice)
-            if 1 <= num <= len(choices):
-                return choices[num - 1]
-        print(c("Gentle nudge: that's not in the catalog.", FG_RED))
-
-
-def choose_civilization(state):
-    clear()
-    print(c("=== DESTINATION TIMELINE ===", FG_CYAN, BOLD))
-    print()
-    for idx, civ in enumerate(CIVILIZATIONS, start=1):
-        cs = state.civ_states[civ["id"]]
-        mood = "balanced"
-        if cs["harmony"] > cs["chaos"] + 2:
-            mood = "glowingly content"
-        elif cs["chaos"] > cs["harmony"] + 2:
-            mood = "dramatically wobbly"
-        print(c(f"[{idx}] {civ['name']}", FG_YELLOW, BOLD), end=" ")
-        print(c(f"(harmony {cs['harmony']:+}, chaos {cs['chaos']:+}) - {mood}", FG_WHITE))
-    print()
-
-    while True:
-        choice = input(c("Select a destination (number): ", FG_CYAN)).strip()
-        if choice.isdigit():
-            num = int(choice)
-            if 1 <= num <= len(CIVILIZATIONS):
-                return CIVILIZATIONS[num - 1]
-        print(c("Timeline not found. Did you misplace a digit?", FG_RED))
-
-
-COMEDIC_SIDE_EFFECTS = [
-    "accidentally standardizes the universe-wide definition of 'just a minute'.",
-    "causes three parallel universes to agree on pineapple pizza, briefly.",
-    "adds a footnote to gravity that says 'when convenient'.",
-    "inspires a hit musical about filing cabinets.",
-    "teaches clouds to form constructive feedback.",
-    "results in polite time-travel tourism brochures.",
-]
+def show_ripple_status(state):
+    for line in ripple_status_lines(state):
+        echo(line)
 
 
-def apply_parcel_effects(state, parcel, civ):
-    cs = state.civ_states[civ["id"]]
-    tags = parcel["tags"]
+# Every screen of a turn starts with the ripple status, on the same rows, so
+# going from one screen to the next sends nothing for it, and a rule that
+# moves the index mid-screen patches those rows in place.
 
-    harmony_delta = 0
-    chaos_delta = 0
-    ripple_delta = parcel["base_ripple"]
 
-    if tags & civ["preferred_tags"]:
-        harmony_delta += 2
-        ripple_delta -= 1
-    if tags & civ["hated_tags"]:
-        harmony_delta -= 2
-        chaos_delta += 2
-        ripple_delta += 2
+def show_turn_header(state):
+    show_ripple_status(state)
+    echo()
 
-    if "chaos" in tags:
-        chaos_delta += 1
-    if "calm" in tags or "cozy" in tags:
-        harmony_delta += 1
-        ripple_delta = max(0, ripple_delta - 1)
 
-    harmony_delta += random.choice([-1, 0, 0, 1])
+def update_turn_header(state):
+    # A terminal that cannot be patched in place gets the new status printed
+    # below instead, as the screens used to.
+    renderer = console().renderer
+    lines = ripple_status_lines(state)
+    if not all([renderer.rewrite(row, line) for row, line in enumerate(lines, start=1)]):
+        echo()
+        show_ripple_status(state)
 
-    cs["harmony"] += harmony_delta
-    cs["chaos"] += chaos_delta
-    cs["received"].append(parcel["id"])
 
-    for tag in tags:
-        if tag in state.tag_influence:
-            state.tag_influence[tag] += 1
+# ==========================
+# Core Mechanics
+# ==========================
 
-    state.ripple_index = max(0, min(MAX_RIPPLE, state.ripple_index + ripple_delta))
-    state.log_delivery(parcel["id"], civ["id"])
 
-    effect_lines = []
-    side = random.choice(COMEDIC_SIDE_EFFECTS)
-    effect_lines.append(f"The parcel {side}")
-    effect_lines.append(
-        f"In {civ['name']}, harmony shifts by {harmony_delta:+}, chaos by {chaos_delta:+}."
+def start_advisor_hint(advisor, state, choices):
+    # (task, stop event) of an advisor search over `choices`, or (None,
+    # None). The search runs in a thread while the screen is up and input
+    # keeps flowing; the hint shows when it arrives. It gets its own fork of
+    # the state, made here on the game's thread: forking marks the source
+    # shared, which must not race with the game writing to it.
+    if advisor is None:
+        return None, None
+    stop = threading.Event()
+    return asyncio.ensure_future(asyncio.to_thread(advisor.advise, state.fork(), choices, stop)), stop
+
+
+async def stop_advisor_hint(search, stop):
+    # Ends a search nobody is waiting for any more. It has to be finished
+    # before the game moves on: it walks the advisor's tree.
+    if search is not None:
+        stop.set()
+        await search
+
+
+async def choose_parcel(state, rng=random, advisor=None, offered=None):
+    # offered: a list to receive the final offer (for the destination heatmap).
+    choices = offer_parcels(rng)
+    search, stop = start_advisor_hint(advisor, state, choices)
+    hint = None
+    error = None
+    # Redrawn whole on every answer (and when a hint arrives); the renderer
+    # only resends what changed.
+    while True:
+        clear()
+        show_turn_header(state)
+        echo(c("=== IDEA PARCEL SELECTION ===", FG_CYAN, BOLD))
+        echo()
+        for idx, parcel in enumerate(choices, start=1):
+            tags = ", ".join(sorted(parcel["tags"]))
+            echo(c(f"[{idx}] {parcel['name']}", FG_YELLOW, BOLD))
+            echo(c(f"    Tags: {tags}", FG_WHITE))
+        echo(c("[R] Refresh selection", FG_BLUE))
+        if hint:
+            label = MISSION_OPTIONS[hint.advice][0]
+            echo(c(f"Advisor: [{choices.index(hint.parcel) + 1}] {hint.parcel['name']} -> {hint.civ['name']}, "
+                   f"then '{label}'", FG_MAGENTA))
+        if error:
+            echo(c(error, FG_RED))
+
+        asking = asyncio.ensure_future(choose(c("Select a parcel (number) or R: ", FG_CYAN), len(choices), "r"))
+        try:
+            if search is not None:
+                await asyncio.wait((asking, search), return_when=asyncio.FIRST_COMPLETED)
+                if not asking.done():
+                    # The hint came first: show it, then ask again.
+                    hint = search.result()
+                    search = None
+                    continue
+            choice = await asking
+        except BaseException:
+            if search is not None:
+                stop.set()  # nobody is left to show the hint to
+            raise
+        finally:
+            if not asking.done():
+                asking.cancel()
+                await asyncio.wait((asking,))
+        if choice is not None:
+            await stop_advisor_hint(search, stop)  # too late to help with this offer
+            search = None
+        if choice == "r":
+            choices = offer_parcels(rng)
+            search, stop = start_advisor_hint(advisor, state, choices)
+            hint = None
+            error = None
+            continue
+        if choice is not None:
+            if offered is not None:
+                offered[:] = choices
+            return choices[choice]
+        error = "Gentle nudge: that's not in the catalog."
+
+
+HEATMAP_CELL = 10
+
+
+def heat_cell(now, preview):
+    # Expected harmony change and ripple change of one delivery, coloured by
+    # how good the harmony looks; "!" if it would set off a paradox.
+    gain = preview.harmony - now
+    ripple = preview.ripple
+    text = f"{gain:+.1f} r{ripple:>2}{'!' if ripple >= PARADOX_THRESHOLD else ' '}".center(HEATMAP_CELL)
+    if gain >= 2:
+        return c(text, BG_GREEN, FG_BLACK)
+    if gain > 0:
+        return c(text, FG_GREEN)
+    if gain <= -2:
+        return c(text, BG_RED, FG_WHITE)
+    if gain < 0:
+        return c(text, FG_RED)
+    return c(text, FG_WHITE)
+
+
+def show_delivery_heatmap(state, parcels, chosen=None):
+    # Rows are destinations, columns the parcels on offer (the chosen one
+    # starred).
+    rows = preview_deliveries(state, parcels)
+    header = "".join(
+        f"[{p + 1}]{'*' if parcel is chosen else ''}".center(HEATMAP_CELL) for p, parcel in enumerate(parcels)
     )
-
-    if harmony_delta > 1:
-        cs["notes"].append(f"Grateful for {parcel['name']}")
-    elif harmony_delta < 0:
-        cs["notes"].append(f"Suspicious about {parcel['name']}")
-
-    return effect_lines
+    echo(c(f"{'Projected harmony / ripple':<24}{header}", FG_CYAN))
+    for idx, civ in enumerate(CIVILIZATIONS):
+        now = state.harmony_of(civ["index"])
+        cells = "".join(heat_cell(now, row[idx]) for row in rows)
+        echo(c(f"[{idx + 1}] {civ['name'][:19]:<20}", FG_YELLOW) + cells)
+    echo(c(f"Expected harmony change (+/-{JITTER_SPREAD:.1f} from luck), r = ripple after, ! = paradox.", DIM))
+
+
+async def choose_civilization(state, parcel=None, advisor=None, offer=None):
+    hint = advisor.best_civ(parcel) if advisor and parcel else None
+    offer = offer or ([parcel] if parcel else [])
+    error = None
+    while True:
+        clear()
+        show_turn_header(state)
+        echo(c("=== DESTINATION TIMELINE ===", FG_CYAN, BOLD))
+        echo()
+        for idx, civ in enumerate(CIVILIZATIONS, start=1):
+            harmony = state.harmony_of(civ["index"])
+            chaos = state.chaos[civ["index"]]
+            echo(c(f"[{idx}] {civ['name']}", FG_YELLOW, BOLD), end=" ")
+            echo(c(f"(harmony {harmony:+}, chaos {chaos:+}) - {civ_mood(harmony, chaos)}", FG_WHITE))
+        echo()
+        if offer:
+            show_delivery_heatmap(state, offer, parcel)
+            echo()
+        if hint:
+            echo(c(f"Advisor: [{hint['index'] + 1}] {hint['name']}", FG_MAGENTA))
+        if error:
+            echo(c(error, FG_RED))
+
+        choice = await choose(c("Select a destination (number): ", FG_CYAN), len(CIVILIZATIONS))
+        if choice is not None:
+            return CIVILIZATIONS[choice]
+        error = "Timeline not found. Did you misplace a digit?"
+
+
+def apply_parcel_effects(state, parcel, civ, rng=random):
+    result = resolve_delivery(state, parcel, civ, rng)
+    emit_delivery(state, parcel, civ, result)
+    return [
+        f"The parcel {result.side_effect}",
+        f"In {civ['name']}, harmony shifts by {result.harmony_delta:+}, chaos by {result.chaos_delta:+}.",
+    ]
 
 
-def mission_phase(state, parcel, civ):
+async def mission_phase(state, parcel, civ, rng=random, advisor=None):
     clear()
+    show_turn_header(state)
     title = f"Mission Debrief: {parcel['name']} -> {civ['name']}"
-    cs = state.civ_states[civ["id"]]
-
-    desc_options = [
-        "A local council requests your guidance.",
-        "A small committee of very curious beings corners you.",
-        "An ad-hoc festival forms around your delivery.",
-        "A politely urgent message pings your multidimensional pager.",
-    ]
-    scenario = random.choice(desc_options)
+    scenario = draw_mission_scenario(rng)
 
     body = [
         scenario,
@@ -505,167 +1964,83 @@ def mission_phase(state, parcel, civ):
     ]
     draw_box(title, body, color=FG_BLUE)
 
-    options = [
-        (
-            "Encourage gentle experimentation.",
-            {"harmony": +1, "chaos": 0, "ripple": +1},
-            "You suggest small cozy pilots and lots of tea breaks.",
-        ),
-        (
-            "Push for bold, flashy change.",
-            {"harmony": 0, "chaos": +2, "ripple": +2},
-            "You sketch a headline-grabbing timeline pivot.",
-        ),
-        (
-            "Advise careful documentation and patience.",
-            {"harmony": +1, "chaos": -1, "ripple": 0},
-            "You gift them a color-coded, mildly adorable manual.",
-        ),
-    ]
-
-    print()
-    for i, (label, _, _) in enumerate(options, start=1):
-        print(c(f"[{i}] {label}", FG_YELLOW))
-    print()
+    echo()
+    for line in MISSION_MENU:
+        echo(c(line, FG_YELLOW))
+    if advisor:
+        echo(c(f"Advisor: [{advisor.best_advice(parcel, civ) + 1}]", FG_MAGENTA))
+    echo()
 
     choice_idx = None
     while choice_idx is None:
-        choice = input(c("How do you advise them? ", FG_CYAN)).strip()
-        if choice.isdigit():
-            num = int(choice)
-            if 1 <= num <= len(options):
-                choice_idx = num - 1
-                break
-        print(c("That's not one of your carefully curated options.", FG_RED))
-
-    label, deltas, flavor = options[choice_idx]
-    slow_print(c(flavor, FG_WHITE), speed=TEXT_SPEED)
+        choice_idx = await choose(c("How do you advise them? ", FG_CYAN), len(MISSION_OPTIONS))
+        if choice_idx is None:
+            echo(c("That's not one of your carefully curated options.", FG_RED))
 
-    cs["harmony"] += deltas["harmony"]
-    cs["chaos"] += deltas["chaos"]
-    state.ripple_index = max(0, min(MAX_RIPPLE, state.ripple_index + deltas["ripple"]))
-
-    print()
-    show_ripple_status(state)
-    wait_for_enter()
+    flavor = apply_mission_advice(state, civ, choice_idx)
+    emit_advice(state, civ, choice_idx)
+    await slow_print(c(flavor, FG_WHITE), speed=TEXT_SPEED)
+    update_turn_header(state)
+    await wait_for_enter()
+    return choice_idx
 
 
-def paradox_phase(state):
-    state.paradoxes_triggered += 1
+async def paradox_phase(state, rng=random):
+    scenario = trigger_paradox(state, rng)
+    emit_paradox(state, scenario)
     clear()
+    show_turn_header(state)
     title = "Paradox Alert"
     body = [
         "Timeline threads begin to tangle into an aesthetically concerning knot.",
         "Somewhere, a committee of probability waves clears its throat.",
     ]
     draw_box(title, body, color=FG_RED)
-    print()
-
-    scenarios = [
-        {
-            "text": "Two civilizations invent the same board game, but with opposing rules.",
-            "options": [
-                (
-                    "Let them argue it out. It's character-building.",
-                    {"ripple": +3, "harmony_all": 0},
-                    "The debate becomes a multiverse-wide reality show.",
-                ),
-                (
-                    "Quietly standardize the rules in the archives.",
-                    {"ripple": -3, "harmony_all": -1},
-                    "Some timelines grumble about 'patch notes', but it works.",
-                ),
-                (
-                    "Create a crossover tournament with both rule sets.",
-                    {"ripple": -1, "harmony_all": +1},
-                    "Chaos becomes camaraderie, with themed snacks.",
-                ),
-            ],
-        },
-        {
-            "text": "A parcel of Fireworks arrives exactly five minutes before its own invention.",
-            "options": [
-                (
-                    "Label it 'research preview' and shrug.",
-                    {"ripple": +2, "harmony_all": 0},
-                    "History textbooks add a mysterious asterisk.",
-                ),
-                (
-                    "Carefully re-route it to a timeline that already had fireworks.",
-                    {"ripple": -3, "harmony_all": 0},
-                    "Paradox diffused with minimal glitter.",
-                ),
-                (
-                    "Host a cross-temporal safety workshop.",
-                    {"ripple": -1, "harmony_all": +1},
-                    "Everyone leaves with earplugs and fond memories.",
-                ),
-            ],
-        },
-    ]
+    echo()
 
-    scenario = random.choice(scenarios)
-    slow_print(c(scenario["text"], FG_WHITE), speed=TEXT_SPEED)
-    print()
+    await slow_print(c(scenario["text"], FG_WHITE), speed=TEXT_SPEED)
+    echo()
 
-    for i, (label, _, _) in enumerate(scenario["options"], start=1):
-        print(c(f"[{i}] {label}", FG_YELLOW))
+    for line in scenario["menu"]:
+        echo(c(line, FG_YELLOW))
 
     choice_idx = None
     while choice_idx is None:
-        choice = input(c("Choose a paradox patch: ", FG_CYAN)).strip()
-        if choice.isdigit():
-            num = int(choice)
-            if 1 <= num <= len(scenario["options"]):
-                choice_idx = num - 1
-                break
-        print(c("The paradox remains unimpressed by that input.", FG_RED))
-
-    label, deltas, flavor = scenario["options"][choice_idx]
-    print()
-    slow_print(c(flavor, FG_WHITE), speed=TEXT_SPEED)
-
-    # Apply to all civs
-    for cs in state.civ_states.values():
-        cs["harmony"] += deltas["harmony_all"]
+        choice_idx = await choose(c("Choose a paradox patch: ", FG_CYAN), len(scenario["options"]))
+        if choice_idx is None:
+            echo(c("The paradox remains unimpressed by that input.", FG_RED))
 
-    state.ripple_index = max(0, min(MAX_RIPPLE, state.ripple_index + deltas["ripple"]))
-    state.paradoxes_resolved += 1
-
-    print()
-    show_ripple_status(state)
-    wait_for_enter()
+    flavor = apply_paradox_patch(state, scenario, choice_idx)
+    emit_patch(state, scenario, choice_idx)
+    echo()
+    await slow_print(c(flavor, FG_WHITE), speed=TEXT_SPEED)
+    update_turn_header(state)
+    await wait_for_enter()
+    return choice_idx
 
 
-def check_final_puzzle_unlock(state):
+async def check_final_puzzle_unlock(state):
     if state.unlocked_final:
         return True
-    if len(state.delivered) < 8:
-        return False
-    avg_harmony = sum(cs["harmony"] for cs in state.civ_states.values()) / len(state.civ_states)
-    if avg_harmony < -1:
-        return False
-    if state.ripple_index > int(MAX_RIPPLE * 0.8):
+    if not final_puzzle_ready(state):
         return False
 
     clear()
+    show_turn_header(state)
     title = "Multiverse Alignment Threshold Reached"
     body = [
         "Branches of reality begin humming in an almost-chord.",
         "A final, delicate adjustment could harmonize them all... or scatter them like confetti.",
     ]
     draw_box(title, body, color=FG_GREEN)
-    print()
-    show_ripple_status(state)
-    print()
-    ans = input(c("Attempt the 'Harmonize the Multiverse' protocol now? (y/n): ", FG_CYAN)).strip().lower()
-    if ans.startswith("y"):
+    echo()
+    if await choose(c("Attempt the 'Harmonize the Multiverse' protocol now? (y/n): ", FG_CYAN), 0, "yn") == "y":
         state.unlocked_final = True
         return True
     return False
 
 
-def final_harmony_puzzle(state):
+async def final_harmony_puzzle(state):
     clear()
     title = "Harmonize the Multiverse"
     body = [
@@ -674,75 +2049,33 @@ def final_harmony_puzzle(state):
         "To stabilize everything, you must tune three core parameters.",
     ]
     draw_box(title, body, color=FG_MAGENTA)
-    print()
-    score = 0
-
-    # Step 1
-    print(c("Step 1: Choose the guiding principle.", FG_CYAN, BOLD))
-    opts1 = [
-        ("Maximize spectacle at all costs.", 0, "Fireworks forever, naps never."),
-        ("Cozy connection and mutual understanding.", 1, "Tea, stories, and reasonable snack budgets."),
-        ("Endless paperwork to prevent surprises.", 0, "Everything predictable, nothing delightful."),
-    ]
-    for i, (label, _, _) in enumerate(opts1, start=1):
-        print(c(f"[{i}] {label}", FG_YELLOW))
-    choice = ask_option(len(opts1))
-    _, val, desc = opts1[choice]
-    slow_print(c(desc, FG_WHITE), speed=TEXT_SPEED)
-    score += val
-    print()
-
-    # Step 2
-    print(c("Step 2: Broadcast one idea to every civilization at once.", FG_CYAN, BOLD))
-    opts2 = [
-        ("Tea", 1, "The multiverse exhales in unison."),
-        ("Fireworks", 0, "Colorful, loud, mildly singed."),
-        ("Time Management", 0, "Everyone is on time and vaguely stressed."),
-    ]
-    for i, (label, _, _) in enumerate(opts2, start=1):
-        print(c(f"[{i}] {label}", FG_YELLOW))
-    choice = ask_option(len(opts2))
-    _, val, desc = opts2[choice]
-    slow_print(c(desc, FG_WHITE), speed=TEXT_SPEED)
-    score += val
-    print()
-
-    # Step 3
-    print(c("Step 3: Set the tempo of causality.", FG_CYAN, BOLD))
-    opts3 = [
-        ("Slow and steady, with room for naps.", 1, "History becomes a well-paced cozy novel."),
-        ("Chaotic jazz solo.", 0, "Exciting, but hard to schedule."),
-        ("Endless bureaucratic queue.", 0, "Nothing breaks, but nothing starts."),
-    ]
-    for i, (label, _, _) in enumerate(opts3, start=1):
-        print(c(f"[{i}] {label}", FG_YELLOW))
-    choice = ask_option(len(opts3))
-    _, val, desc = opts3[choice]
-    slow_print(c(desc, FG_WHITE), speed=TEXT_SPEED)
-    score += val
-
-    print()
-    slow_print(c("The console hums, analyzing your choices...", FG_WHITE), speed=TEXT_SPEED)
-    time.sleep(1.0)
-    print()
-
-    # Determine ending
-    if score >= 3 and state.ripple_index <= PARADOX_THRESHOLD:
-        ending_golden_harmony(state)
-    elif score >= 2 and state.ripple_index < MAX_RIPPLE:
-        ending_bittersweet(state)
-    else:
-        ending_chaotic_carousel(state)
+    echo()
+    answers = []
+
+    for step_idx, (prompt, opts) in enumerate(FINAL_PUZZLE_STEPS):
+        if step_idx:
+            echo()
+        echo(c(prompt, FG_CYAN, BOLD))
+        for i, (label, _, _) in enumerate(opts, start=1):
+            echo(c(f"[{i}] {label}", FG_YELLOW))
+        choice = await ask_option(len(opts))
+        await slow_print(c(opts[choice][2], FG_WHITE), speed=TEXT_SPEED)
+        answers.append(choice)
+
+    echo()
+    await slow_print(c("The console hums, analyzing your choices...", FG_WHITE), speed=TEXT_SPEED)
+    await pause(1.0)
+    echo()
 
+    return answers, ending_for(state, score_final_answers(answers))
 
-def ask_option(max_num):
+
+async def ask_option(max_num):
     while True:
-        ans = input(c("Choose: ", FG_CYAN)).strip()
-        if ans.isdigit():
-            num = int(ans)
-            if 1 <= num <= max_num:
-                return num - 1
-        print(c("The console blinks politely. Try a listed option.", FG_RED))
+        choice = await choose(c("Choose: ", FG_CYAN), max_num)
+        if choice is not None:
+            return choice
+        echo(c("The console blinks politely. Try a listed option.", FG_RED))
 
 
 # ==========================
@@ -750,7 +2083,7 @@ def ask_option(max_num):
 # ==========================
 
 
-def ending_golden_harmony(state):
+async def ending_golden_harmony(state):
     clear()
     title = "Ending: Golden Harmony"
     body = [
@@ -761,16 +2094,16 @@ def ending_golden_harmony(state):
         "Even the Bureaucracy Dimension discovers the concept of 'short form'.",
     ]
     draw_box(title, body, color=FG_GREEN)
-    print()
-    slow_print(c("Your deliveries didn't just avoid disaster.", FG_WHITE), speed=TEXT_SPEED)
-    slow_print(c("They composed a multiverse where possibility feels gentle and kind.", FG_WHITE), speed=TEXT_SPEED)
-    print()
+    echo()
+    await slow_print(c("Your deliveries didn't just avoid disaster.", FG_WHITE), speed=TEXT_SPEED)
+    await slow_print(c("They composed a multiverse where possibility feels gentle and kind.", FG_WHITE), speed=TEXT_SPEED)
+    echo()
     show_ripple_status(state)
-    wait_for_enter()
-    credits()
+    await wait_for_enter()
+    await credits()
 
 
-def ending_bittersweet(state):
+async def ending_bittersweet(state):
     clear()
     title = "Ending: Bittersweet Mosaic"
     body = [
@@ -780,16 +2113,16 @@ def ending_bittersweet(state):
         "A few worlds still debate board game rules, but now it's mostly for fun.",
     ]
     draw_box(title, body, color=FG_YELLOW)
-    print()
-    slow_print(c("You steered infinity away from catastrophe and toward something livable.", FG_WHITE), speed=TEXT_SPEED)
-    slow_print(c("Not perfect. But wonderfully, stubbornly possible.", FG_WHITE), speed=TEXT_SPEED)
-    print()
+    echo()
+    await slow_print(c("You steered infinity away from catastrophe and toward something livable.", FG_WHITE), speed=TEXT_SPEED)
+    await slow_print(c("Not perfect. But wonderfully, stubbornly possible.", FG_WHITE), speed=TEXT_SPEED)
+    echo()
     show_ripple_status(state)
-    wait_for_enter()
-    credits()
+    await wait_for_enter()
+    await credits()
 
 
-def ending_chaotic_carousel(state):
+async def ending_chaotic_carousel(state):
     clear()
     title = "Ending: Cozy Chaotic Carousel"
     body = [
@@ -800,16 +2133,16 @@ def ending_chaotic_carousel(state):
         "And yet... somehow, everyone keeps finding room for naps and tea.",
     ]
     draw_box(title, body, color=FG_MAGENTA)
-    print()
-    slow_print(c("You didn't so much harmonize the multiverse as teach it to improvise.", FG_WHITE), speed=TEXT_SPEED)
-    slow_print(c("It's chaotic. It's cozy. It's home.", FG_WHITE), speed=TEXT_SPEED)
-    print()
+    echo()
+    await slow_print(c("You didn't so much harmonize the multiverse as teach it to improvise.", FG_WHITE), speed=TEXT_SPEED)
+    await slow_print(c("It's chaotic. It's cozy. It's home.", FG_WHITE), speed=TEXT_SPEED)
+    echo()
     show_ripple_status(state)
-    wait_for_enter()
-    credits()
+    await wait_for_enter()
+    await credits()
 
 
-def credits():
+async def credits():
     clear()
     lines = [
         "Courier of Possibilities",
@@ -820,10 +2153,17 @@ def credits():
         "Timelines stabilized: hopefully yours, a little bit, too.",
     ]
     draw_box("Credits", lines, color=FG_CYAN)
-    print()
-    slow_print(c("Thank you for delivering possibilities.", FG_WHITE), speed=TEXT_SPEED)
-    slow_print(c("You can always replay to explore different branches.", FG_WHITE), speed=TEXT_SPEED)
-    print()
+    echo()
+    await slow_print(c("Thank you for delivering possibilities.", FG_WHITE), speed=TEXT_SPEED)
+    await slow_print(c("You can always replay to explore different branches.", FG_WHITE), speed=TEXT_SPEED)
+    echo()
+
+
+ENDING_SCREENS = {
+    ENDING_GOLDEN: ending_golden_harmony,
+    ENDING_BITTERSWEET: ending_bittersweet,
+    ENDING_CHAOTIC: ending_chaotic_carousel,
+}
 
 
 # ==========================
@@ -831,69 +2171,258 @@ def credits():
 # ==========================
 
 
-def main_loop():
-    state = GameState()
-    title_screen()
-    intro_cinematic()
-
+async def offer_resume(state):
+    clear()
+    echo(c("=== SAVED ROUTE FOUND ===", FG_CYAN, BOLD))
+    echo()
+    echo(c(f"Turn {state.turn}, {state.deliveries.total} parcels delivered.", FG_WHITE))
+    show_ripple_status(state)
+    echo()
+    return await choose(c("Resume this route? (y/n): ", FG_CYAN), 0, "yn") == "y"
+
+
+async def main_loop(seed=None, record=None, saved=None, save_path=None, advisor=None, history=None):
+    # saved: (seed, state) of an unfinished save to offer for resume.
+    # record / save_path: where to write the session journal / save file.
+    # advisor: a courier_advisor.CourierAdvisor to show hints from.
+    # history: deliveries / notes a new game keeps in memory (None: all).
+    await title_screen()
+    state = None
+    if saved and await offer_resume(saved[1]):
+        seed, state = saved
+    if seed is None:
+        seed = random.randrange(2**32)
+    if state is None:
+        state = GameState(history)
+        await intro_cinematic()
+    streams = RngStreams(seed)
+    emit("start", state, seed=seed)
+    journal = SessionJournal(record, seed, console().clock, state) if record else None
+    save = SaveFile(save_path, seed, state) if save_path else None
+    try:
+        await _play_turns(state, streams, journal, save, advisor)
+    finally:
+        if journal:
+            journal.close()
+        if save:
+            save.close()
+
+
+async def _play_turns(state, streams, journal, save, advisor):
+    # Forks of the state at the start of every turn, for [U]ndo; as deep as
+    # the history the state keeps.
+    past = deque(maxlen=state.deliveries.limit)
     while not state.unlocked_final and not state.game_over:
+        past.append(state.fork())
         state.turn += 1
-        parcel = choose_parcel(state)
-        civ = choose_civilization(state)
+        streams.start_turn(state.turn)
+        offer = []
+        parcel = await metered("choose_parcel", choose_parcel(state, streams.offers, advisor, offer))
+        civ = await metered("choose_civilization", choose_civilization(state, parcel, advisor, offer))
 
-        ripple_animation(state, parcel, civ)
+        await metered("ripple_animation", ripple_animation(state, parcel, civ))
         clear()
+        show_turn_header(state)
         show_civ_ascii(civ)
-        print()
-        slow_print(c(f"You hand over the parcel of {parcel['name']}.", FG_WHITE), speed=TEXT_SPEED)
-        print()
-
-        effect_lines = apply_parcel_effects(state, parcel, civ)
-        type_lines([c(line, FG_WHITE) for line in effect_lines], speed=TEXT_SPEED)
-        print()
-        show_ripple_status(state)
-        print()
-        wait_for_enter()
-
-        mission_phase(state, parcel, civ)
-
-        if state.ripple_index >= PARADOX_THRESHOLD:
-            paradox_phase(state)
-
-        if check_final_puzzle_unlock(state):
+        echo()
+        await slow_print(c(f"You hand over the parcel of {parcel['name']}.", FG_WHITE), speed=TEXT_SPEED)
+        echo()
+
+        effect_lines = metered_call("apply_parcel_effects", apply_parcel_effects, state, parcel, civ, streams.delivery)
+        await type_lines([c(line, FG_WHITE) for line in effect_lines], speed=TEXT_SPEED)
+        update_turn_header(state)
+        await wait_for_enter()
+
+        advice = await metered("mission_phase", mission_phase(state, parcel, civ, streams.mission, advisor))
+        if advisor:
+            advisor.commit(parcel, civ, advice)
+
+        patch = None
+        if paradox_due(state):
+            patch = await metered("paradox_phase", paradox_phase(state, streams.paradox))
+
+        unlocked = await metered("check_final_puzzle_unlock", check_final_puzzle_unlock(state))
+        attempted = unlocked if final_puzzle_ready(state) else None
+        if journal:
+            journal.turn(state, parcel, civ, advice, patch, attempted)
+        if save:
+            save.turn(state, parcel, civ, advice, patch, attempted)
+        if unlocked:
             break
 
-        
-
-        clear()
-        print(c("=== COURIER STATUS ===", FG_CYAN, BOLD))
-        print()
-        show_ripple_status(state)
-        print()
-        print(c("[Enter] Continue deliveries", FG_YELLOW))
-        print(c("[Q]      Retire for now", FG_YELLOW))
-        ans = input(c("Choice: ", FG_CYAN)).strip().lower()
+        while True:
+            clear()
+            show_turn_header(state)
+            echo(c("=== COURIER STATUS ===", FG_CYAN, BOLD))
+            echo()
+            echo(c("[Enter] Continue deliveries", FG_YELLOW))
+            if past:
+                echo(c(f"[U]      Undo turn {state.turn}", FG_YELLOW))
+            echo(c("[Q]      Retire for now", FG_YELLOW))
+            ans = await choose(c("Choice: ", FG_CYAN), 0, "uq", default="")
+            if ans != "u" or not past:
+                break
+            # Back to the start of the turn: the same offer comes up again,
+            # since the streams reseed from the turn number.
+            state = past.pop()
+            emit("undo", state)
+            if journal:
+                journal.rewind(state)
+            if save:
+                save.compact(state)
+            if advisor:
+                advisor.reset()
         if ans == "q":
             state.game_over = True
             break
 
     if state.unlocked_final and not state.game_over:
-        final_harmony_puzzle(state)
+        answers, ending = await final_harmony_puzzle(state)
+        emit_ending(state, ending)
+        if journal:
+            journal.finish(state, answers, ending)
+        if save:
+            save.finish(ending)
+        await ENDING_SCREENS[ending](state)
     elif state.game_over:
+        emit("retired", state)
+        if journal:
+            journal.finish(state, quit=True)
         clear()
-        slow_print(c("You place your courier bag on the hook and let the timelines simmer.", FG_WHITE), speed=TEXT_SPEED)
-        slow_print(c("They'll be here, humming with possibility, when you return.", FG_WHITE), speed=TEXT_SPEED)
-        print()
+        await slow_print(c("You place your courier bag on the hook and let the timelines simmer.", FG_WHITE), speed=TEXT_SPEED)
+        await slow_print(c("They'll be here, humming with possibility, when you return.", FG_WHITE), speed=TEXT_SPEED)
+        echo()
 
 
-    
-    
-if __name__ == "__main__":
+def load_unfinished(path):
+    # (seed, state) of the save at `path` if there is a game to resume; None
+    # if there is no save or its game is over. ValueError if a save is
+    # there but can't be loaded (damaged, or saved with other content packs).
+    try:
+        seed, state, ending = load_save(path)
+    except FileNotFoundError:
+        return None
+    except (OSError, struct.error) as exc:
+        raise ValueError(f"{path}: unreadable save ({exc})") from exc
+    if ending is not None or state.game_over:
+        return None
+    return seed, state
+
+
+def existing_save(path, seed=None, new_game=False):
+    # The unfinished game at `path` to offer for resume, or None when a new
+    # game may write there. A new game only replaces an unfinished or
+    # unreadable save after --new, or after the player turns down the
+    # resume offer; anything else is a ValueError saying what to do.
+    if not path or new_game:
+        return None
     try:
+        saved = load_unfinished(path)
+    except ValueError as exc:
+        raise ValueError(f"{exc}; use --new to replace it, or --save / --no-save") from exc
+    if saved and seed is not None:
+        raise ValueError(f"{path} holds an unfinished game; leave out --seed to resume it, or use --new to replace it")
+    return saved
+
+
+async def play(session, seed=None, record=None, save_path=SAVE_PATH, saved=None, advisor=None, history=None):
+    # saved: what existing_save() found at save_path.
+    # Runs one game on `session`, reading the keyboard in the background.
+    CURRENT_CONSOLE.set(session)
+    restore = None
+    if session.raw:
+        restore = start_key_reader(session)
+    else:
+        start_stdin_reader(session)
+    try:
+        await main_loop(seed, record, saved, save_path, advisor, history)
+    except EOFError:
+        pass
+    finally:
+        session.renderer.flush()
+        if restore:
+            restore()
 
 
-        main_loop()
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Courier of Possibilities")
+    parser.add_argument("--instant", action="store_true", help="skip typewriter and animation delays")
+    parser.add_argument("--speed", type=float, default=None, help="play delays N times faster (0: no delays)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for this session's random streams")
+    parser.add_argument("--record", metavar="PATH", help="write a session journal for courier_replay.py")
+    parser.add_argument("--save", metavar="PATH", default=SAVE_PATH, help=f"save file (default: {SAVE_PATH})")
+    parser.add_argument("--no-save", action="store_true", help="do not save or resume")
+    parser.add_argument("--new", action="store_true", help="start a new game, replacing any save")
+    parser.add_argument("--advisor", nargs="?", type=float, const=50, metavar="MS",
+                        help="show move hints, searching MS milliseconds per turn (default 50)")
+    parser.add_argument("--advisor-workers", type=int, default=0, help="processes for advisor rollouts")
+    parser.add_argument("--endless", action="store_true",
+                        help=f"keep only the last {HISTORY_WINDOW} deliveries in memory (--record keeps them all)")
+    parser.add_argument("--pack", action="append", default=[], metavar="PATH",
+                        help="add a content pack (JSON); may be given more than once")
+    parser.add_argument("--line-input", action="store_true",
+                        help="type answers and press Enter instead of single keys")
+    parser.add_argument("--metrics", metavar="PATH", help="time each turn phase; write a JSON report at exit")
+    parser.add_argument("--profile", metavar="DIR",
+                        help="also run each phase under cProfile; write its stats and the report to DIR")
+    args = parser.parse_args()
+    # Tools import this file as courier_of_possibilities; make that name
+    # refer to this running copy rather than loading a second one.
+    sys.modules.setdefault("courier_of_possibilities", sys.modules[__name__])
+    if args.profile and os.path.exists(args.profile) and not os.path.isdir(args.profile):
+        parser.error(f"--profile {args.profile}: not a directory")
+    if args.metrics and os.path.isdir(args.metrics):
+        parser.error(f"--metrics {args.metrics}: is a directory")
+    if args.seed is not None and args.seed not in SEED_RANGE:
+        parser.error(f"--seed must be a 64-bit integer, from {SEED_RANGE.start} to {SEED_RANGE.stop - 1}")
+    if args.pack:
+        from courier_content import install_packs
+
+        try:
+            install_packs(args.pack)
+        except (OSError, ValueError) as exc:
+            parser.error(str(exc))
+    session = Console(
+        clock=make_clock(0 if args.instant else args.speed),
+        color=supports_color(),
+        raw=not args.line_input and can_read_keys(),
+    )
+    save_path = None if args.no_save else args.save
+    try:
+        saved = existing_save(save_path, args.seed, args.new)
+    except ValueError as exc:
+        parser.error(str(exc))
+    meter = None
+    if args.metrics or args.profile:
+        from courier_metrics import PhaseMeter
+
+        meter = PhaseMeter(session, profile=bool(args.profile))
+        CURRENT_METER.set(meter)
+    advisor = None
+    if args.advisor:
+        from courier_advisor import CourierAdvisor
+
+        advisor = CourierAdvisor(budget=args.advisor / 1000, workers=args.advisor_workers, packs=args.pack)
+    try:
+        history = HISTORY_WINDOW if args.endless else None
+        asyncio.run(play(session, args.seed, args.record, save_path, saved, advisor, history))
     except KeyboardInterrupt:
-        print("\n" + c("Courier link gracefully closed.", FG_CYAN))
-
-
+        session.renderer.write("\n" + c("Courier link gracefully closed.", FG_CYAN) + "\n")
+    finally:
+        session.renderer.flush()
+        if advisor:
+            advisor.close()
+        if meter:
+            # The report first, and each output on its own: one that cannot
+            # be written (disk full, a path taken meanwhile) costs only itself.
+            outputs = []
+            if args.metrics:
+                outputs.append(("Metrics report", lambda: meter.write_report(args.metrics)))
+            if args.profile:
+                outputs.append(("Profiles", lambda: meter.dump_profiles(args.profile)))
+                outputs.append(("Profile report", lambda: meter.write_report(os.path.join(args.profile, "report.json"))))
+            for what, write in outputs:
+                try:
+                    write()
+                except OSError as exc:
+                    sys.stderr.write(f"{what} not written ({exc})\n")
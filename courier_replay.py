@@ -0,0 +1,198 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import courier_content
+import courier_of_possibilities as game
+
+# ==========================
+# Journal Loading
+# ==========================
+# Journals come from `courier_of_possibilities.py --record PATH`: a header,
+# one record per finished turn, and an "end" record if the session got that
+# far.
+
+Journal = namedtuple("Journal", "path header turns end")
+
+
+def load_journal(path):
+    with open(path, encoding="utf-8") as f:
+        lines = [line for line in f if line.strip()]
+    records = []
+    for i, line in enumerate(lines):
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            if i == len(lines) - 1:
+                break  # torn last line: the session died mid-write
+            raise ValueError(f"{path}: line {i + 1} is not valid JSON")
+    if not records or records[0].get("journal") != game.JOURNAL_VERSION:
+        raise ValueError(f"{path}: not a version {game.JOURNAL_VERSION} session journal")
+    turns = [r for r in records[1:] if not r.get("end")]
+    end = next((r for r in records[1:] if r.get("end")), None)
+    return Journal(path, records[0], turns, end)
+
+
+def find_journals(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".jsonl"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+# ==========================
+# Replay
+# ==========================
+# Decisions go back through game.step() with the session's RngStreams, so a
+# replay makes exactly the draws the live session made, with no screens and
+# no delays. Every turn's GameState digest is checked against the journal.
+# A fork of every turn's state is kept for the journal's rewinds.
+#
+# The journal is also where an --endless session's full history lives:
+# history() rebuilds every delivery and note from it.
+
+ReplayResult = namedtuple("ReplayResult", "path turns ending mismatch seconds recorded_seconds")
+
+
+def journal_action(entry, answers=None):
+    return game.TurnAction(
+        game.PARCELS_BY_ID[entry["parcel"]],
+        game.CIVS_BY_ID[entry["civ"]],
+        entry["advice"],
+        entry["patch"] or 0,
+        bool(entry["final"]),
+        answers,
+    )
+
+
+def start_state(journal):
+    if "snapshot" in journal.header:
+        return game.unpack_snapshot(bytes.fromhex(journal.header["snapshot"]))[1]
+    return game.GameState(journal.header.get("history"))
+
+
+def walk(journal, state):
+    # Plays the journal from `state`: yields (entry, state, result) after
+    # every turn and (entry, state, None) after every rewind. The state
+    # yielded is the live one; fork it to keep it.
+    streams = game.RngStreams(journal.header["seed"])
+    answers = journal.end["answers"] if journal.end else None
+    depth = state.deliveries.limit
+    past = {state.turn: state.fork()}
+    for entry in journal.turns:
+        if "rewind" in entry:
+            state = past[entry["rewind"]].fork()
+            yield entry, state, None
+            continue
+        result = game.step(state, journal_action(entry, answers), streams)
+        past[state.turn] = state.fork()
+        if depth:
+            # An --endless session can only undo as far back as it keeps history.
+            past.pop(state.turn - depth - 1, None)
+        yield entry, state, result
+
+
+def replay(journal):
+    catalog = journal.header.get("catalog")
+    if catalog and catalog != game.catalog_fingerprint().hex():
+        return ReplayResult(journal.path, 0, None, "recorded with other content packs (see --pack)", 0.0, None)
+    state = start_state(journal)
+    end = journal.end
+    ending = None
+    started = time.perf_counter()
+    for entry, state, result in walk(journal, state):
+        digest = game.state_digest(state)
+        if result is None:
+            if digest != entry["digest"]:
+                return _result(journal, state, ending, started, f"rewind to {entry['rewind']}: state {digest} != recorded {entry['digest']}")
+            continue
+        ending = result.ending
+        if state.turn != entry["turn"] or digest != entry["digest"]:
+            return _result(journal, state, ending, started, f"turn {entry['turn']}: state {digest} != recorded {entry['digest']}")
+    mismatch = None
+    if end:
+        if end["quit"]:
+            state.game_over = True
+        digest = game.state_digest(state)
+        if digest != end["digest"]:
+            mismatch = f"end: state {digest} != recorded {end['digest']}"
+        elif ending != end["ending"]:
+            mismatch = f"end: ending {ending} != recorded {end['ending']}"
+    return _result(journal, state, ending, started, mismatch)
+
+
+def _result(journal, state, ending, started, mismatch):
+    seconds = time.perf_counter() - started
+    last = journal.end or (journal.turns[-1] if journal.turns else journal.header)
+    return ReplayResult(journal.path, state.turn, ending, mismatch, seconds, last.get("t"))
+
+
+def history(journal):
+    # [(turn, parcel id, civ id, note or None)] along the recorded line,
+    # undone turns dropped.
+    state = start_state(journal)
+    lines = []
+    seen = state.notes.total
+    for entry, state, result in walk(journal, state):
+        if result is None:
+            while lines and lines[-1][0] > entry["rewind"]:
+                lines.pop()
+        else:
+            note = None
+            if state.notes.total > seen:
+                ci, template, pi = state.notes.head[0]
+                note = game.NOTE_TEMPLATES[template].format(name=game.PARCELS[pi]["name"])
+            lines.append((state.turn, entry["parcel"], entry["civ"], note))
+        seen = state.notes.total
+    return lines
+
+
+def format_result(result):
+    status = "ok  " if result.mismatch is None else "FAIL"
+    line = f"{status} {result.path}: {result.turns} turns, ending {result.ending or '-'}, {result.seconds * 1e3:.2f} ms"
+    if result.recorded_seconds:
+        line += f" (live {result.recorded_seconds:.1f} s, x{result.recorded_seconds / max(result.seconds, 1e-9):,.0f})"
+    if result.mismatch:
+        line += f"\n     {result.mismatch}"
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded Courier sessions and check their final states.")
+    parser.add_argument("paths", nargs="+", help="journal files, or directories of *.jsonl journals")
+    parser.add_argument("--repeat", type=int, default=1, help="replay each journal N times (timing)")
+    parser.add_argument("--history", action="store_true", help="print every delivery and note instead of checking")
+    parser.add_argument("--pack", action="append", default=[], metavar="PATH", help="content pack the sessions used")
+    args = parser.parse_args(argv)
+    try:
+        courier_content.install_packs(args.pack)
+    except (OSError, ValueError) as err:
+        parser.error(str(err))
+
+    failed = 0
+    for path in find_journals(args.paths):
+        journal = load_journal(path)
+        if args.history:
+            print(f"{path}:")
+            for turn, parcel, civ, note in history(journal):
+                print(f"  {turn:>6}  {parcel:<18} -> {civ:<22} {note or ''}")
+            continue
+        result = replay(journal)
+        if args.repeat > 1:
+            best = result.seconds
+            for _ in range(args.repeat - 1):
+                best = min(best, replay(journal).seconds)
+            result = result._replace(seconds=best)
+        failed += result.mismatch is not None
+        print(format_result(result))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
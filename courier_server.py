@@ -0,0 +1,367 @@
+import argparse
+import asyncio
+import codecs
+import sys
+
+import courier_of_possibilities as game
+from courier_terminal import AnsiTerminal, Console, PlainTerminal, Renderer, make_clock, split_keys
+
+# ==========================
+# Telnet Protocol
+# ==========================
+# Just enough of telnet (RFC 854) for a line-mode client: option
+# negotiation is answered or refused, TERMINAL-TYPE (RFC 1091) tells a
+# session whether its player can see colors, and NAWS (RFC 1073) the size
+# of their window. Offering to ECHO and SUPPRESS-GO-AHEAD (RFC 857/858)
+# asks the client for character mode: keys are sent as they are pressed
+# and the server echoes them, so a choice is one keystroke and one round
+# trip. Clients that ignore negotiation (netcat and friends) get plain
+# text and line input.
+
+IAC, DONT, DO, WONT, WILL, SB, SE = 255, 254, 253, 252, 251, 250, 240
+ECHO, SGA, TTYPE, NAWS = 1, 3, 24, 31
+TTYPE_IS, TTYPE_SEND = 0, 1
+
+PLAIN_TERMINALS = {"", "dumb", "unknown", "network"}
+NEGOTIATE_SECONDS = 0.5  # how long a new session waits to learn its terminal
+DEFAULT_SIZE = (80, 24)
+WRITE_LIMIT = 256 * 1024  # bytes a client may leave unread before it is dropped
+
+
+class TelnetParser:
+    # Bytes in, typed lines out (or keys, once the client agrees to
+    # character mode). Negotiation replies collect in `replies` for the
+    # caller to send; terminal_type stays None until the client says what
+    # it is ("" if it won't).
+
+    def __init__(self):
+        self.state = "data"
+        self.verb = None
+        self.line = bytearray()
+        self.sub = bytearray()
+        self.replies = bytearray()
+        self.terminal_type = None
+        self.size = None
+        self.resized = False
+        self.offered = set()  # options we said WILL to
+        self.agreed = set()  # ... and the client said DO to
+        self.keys = False
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self._cr = False
+
+    def offer_keys(self):
+        # The bytes asking for character mode.
+        self.offered.update((ECHO, SGA))
+        return bytes((IAC, WILL, ECHO, IAC, WILL, SGA))
+
+    def withdraw_keys(self):
+        # The bytes taking the offer back (the session went on in line mode).
+        self.offered.clear()
+        self.agreed.clear()
+        self.keys = False
+        return bytes((IAC, WONT, ECHO, IAC, WONT, SGA))
+
+    def feed(self, data):
+        lines = []
+        for byte in data:
+            state = self.state
+            if state == "data":
+                if byte == IAC:
+                    self.state = "iac"
+                elif self.keys:
+                    if not (self._cr and byte in (0, 10)):  # Enter is CR NUL or CR LF
+                        self.line.append(byte)
+                elif byte == 13 or (byte == 10 and not self._cr):
+                    lines.append(self.line.decode("utf-8", "replace"))
+                    self.line.clear()
+                elif byte in (8, 127):
+                    del self.line[-1:]
+                elif byte not in (0, 10):
+                    self.line.append(byte)
+                self._cr = byte == 13
+            elif state == "iac":
+                if byte == IAC:
+                    self.line.append(IAC)
+                    self.state = "data"
+                elif byte == SB:
+                    self.sub.clear()
+                    self.state = "sb"
+                elif byte in (WILL, WONT, DO, DONT):
+                    self.verb = byte
+                    self.state = "option"
+                else:
+                    self.state = "data"  # NOP, GA, break, ...
+            elif state == "option":
+                self._negotiate(self.verb, byte)
+                self.state = "data"
+            elif state == "sb":
+                if byte == IAC:
+                    self.state = "sb_iac"
+                else:
+                    self.sub.append(byte)
+            else:  # sb_iac
+                if byte == SE:
+                    self._subnegotiation(bytes(self.sub))
+                    self.state = "data"
+                else:
+                    self.sub.append(byte)
+                    self.state = "sb"
+        if self.keys and self.line:
+            lines.extend(split_keys(self._decoder.decode(bytes(self.line))))
+            self.line.clear()
+        return lines
+
+    def _negotiate(self, verb, option):
+        if verb == WILL and option == TTYPE:
+            self.replies += bytes((IAC, SB, TTYPE, TTYPE_SEND, IAC, SE))
+        elif verb == WONT and option == TTYPE:
+            self._settle("")
+        elif verb == DO and option in self.offered:
+            self.agreed.add(option)
+            self.keys = self.agreed == self.offered
+        elif verb == DONT and option in self.offered:
+            self.offered.clear()  # no character mode, then
+            self.keys = False
+        elif verb == DO:
+            self.replies += bytes((IAC, WONT, option))  # we offer no options
+        elif verb == WILL and option != NAWS:
+            self.replies += bytes((IAC, DONT, option))
+
+    def _subnegotiation(self, sub):
+        if len(sub) >= 2 and sub[0] == TTYPE and sub[1] == TTYPE_IS:
+            self._settle(sub[2:].decode("ascii", "replace"))
+        elif len(sub) >= 5 and sub[0] == NAWS:
+            columns = sub[1] << 8 | sub[2]
+            rows = sub[3] << 8 | sub[4]
+            if columns and rows:
+                self.size = (columns, rows)
+                self.resized = True
+
+    def _settle(self, terminal_type):
+        if self.terminal_type is None:
+            self.terminal_type = terminal_type
+
+
+def wants_color(terminal_type):
+    return terminal_type is not None and terminal_type.lower() not in PLAIN_TERMINALS
+
+
+class TelnetStream:
+    # The renderer's output stream for one client. Writes go into the
+    # socket's buffer and never wait; a client that stops reading is cut
+    # off at WRITE_LIMIT instead of holding memory (or anyone else) up.
+
+    def __init__(self, writer):
+        self.writer = writer
+
+    def write(self, text):
+        transport = self.writer.transport
+        if transport.is_closing():
+            return
+        if transport.get_write_buffer_size() > WRITE_LIMIT:
+            transport.abort()
+            return
+        self.writer.write(text.replace("\r\n", "\n").replace("\n", "\r\n").encode("utf-8", "replace"))
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return True
+
+
+# ==========================
+# Game Server
+# ==========================
+# One asyncio process, one task per connection. Every session has its own
+# Console (renderer, input queue, clock, colors) and runs main_loop in its
+# own context, so its GameState and RngStreams are its own; the catalog is
+# shared and read-only. Turns are pure computation measured in
+# microseconds and every wait is an await, so a session only ever holds
+# the loop between two screens. Sessions do not save or record.
+
+
+class CourierServer:
+    def __init__(self, host="127.0.0.1", port=2323, color="auto", speed=None, history=None, max_sessions=5000,
+                 hub=None, keys=True):
+        # hub: a courier_spectate.EventHub to stream every session's game to.
+        # keys: offer clients character mode (single-key answers).
+        self.host = host
+        self.port = port
+        self.color = color  # "auto" (ask the client), "always" or "never"
+        self.keys = keys
+        self.speed = speed
+        self.history = history
+        self.max_sessions = max_sessions
+        self.hub = hub
+        self.started = 0
+        self.sessions = {}  # handler task -> its connection's writer
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, self.host, self.port, backlog=1024)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self):
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        # Hangs up on everyone; each session then ends like any dropped
+        # connection.
+        self.server.close()
+        for writer in self.sessions.values():
+            writer.transport.abort()
+        await asyncio.gather(*self.sessions, return_exceptions=True)
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        if len(self.sessions) >= self.max_sessions:
+            writer.write(b"The courier office is full. Please try again soon.\r\n")
+            writer.close()
+            return
+        task = asyncio.current_task()
+        self.sessions[task] = writer
+        try:
+            await self._session(reader, writer)
+        except ConnectionError:
+            pass
+        finally:
+            del self.sessions[task]
+            writer.close()
+
+    async def _session(self, reader, writer):
+        parser = TelnetParser()
+        early = []  # lines (or keys) typed before the session started
+        if self.color == "auto" or self.keys:
+            hello = bytes((IAC, DO, TTYPE, IAC, DO, NAWS))
+            if self.keys:
+                hello += parser.offer_keys()
+            writer.write(hello)
+            try:
+                await asyncio.wait_for(self._negotiate(reader, writer, parser, early), NEGOTIATE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        if self.color == "auto":
+            color = wants_color(parser.terminal_type)
+        else:
+            color = self.color == "always"
+        raw = parser.keys
+        if parser.offered and not raw:
+            writer.write(parser.withdraw_keys())  # too late: the session reads lines
+
+        renderer = Renderer(
+            stream=TelnetStream(writer),
+            terminal=AnsiTerminal() if color else PlainTerminal(),
+            differential=color,
+            size=parser.size or DEFAULT_SIZE,
+        )
+        session = Console(renderer=renderer, clock=make_clock(self.speed), color=color, raw=raw)
+        feed = session.feed_key if raw else session.feed
+        playing = asyncio.ensure_future(self._play(session))
+        for line in early:
+            if raw:
+                session.feed_key(line)
+            else:
+                session.push(line)
+        try:
+            while not playing.done():
+                reading = asyncio.ensure_future(reader.read(4096))
+                await asyncio.wait((reading, playing), return_when=asyncio.FIRST_COMPLETED)
+                if not reading.done():
+                    reading.cancel()
+                    break
+                data = reading.result()
+                if not data:
+                    break  # hung up: nobody left to show the rest to
+                for line in parser.feed(data):
+                    feed(line)
+                if parser.replies:
+                    writer.write(bytes(parser.replies))
+                    parser.replies.clear()
+                if parser.resized:
+                    renderer.size = parser.size
+                    parser.resized = False
+        finally:
+            if not playing.done():
+                playing.cancel()
+                await asyncio.wait((playing,))
+        if not playing.cancelled():
+            playing.result()  # a crash in the game shows up here
+            if not writer.transport.is_closing():
+                await writer.drain()
+
+    async def _negotiate(self, reader, writer, parser, early):
+        # Reads until the client has said what terminal it is; lines typed
+        # meanwhile go to `early`.
+        while parser.terminal_type is None:
+            data = await reader.read(4096)
+            if not data:
+                break
+            early.extend(parser.feed(data))
+            if parser.replies:
+                writer.write(bytes(parser.replies))
+                parser.replies.clear()
+
+    async def _play(self, session):
+        # Runs in its own task, so setting the console here is private to
+        # this session.
+        game.CURRENT_CONSOLE.set(session)
+        if self.hub:
+            self.started += 1
+            game.CURRENT_EVENTS.set(self.hub.sink(f"player-{self.started}"))
+        try:
+            await game.main_loop(history=self.history)
+        except EOFError:
+            pass
+        finally:
+            session.renderer.flush()
+
+
+# ==========================
+# Command Line
+# ==========================
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Host Courier of Possibilities for many players over telnet.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=2323)
+    parser.add_argument("--color", choices=("auto", "always", "never"), default="auto",
+                        help="auto: colors for clients that report a capable terminal type")
+    parser.add_argument("--speed", type=float, default=None, help="play delays N times faster (0: no delays)")
+    parser.add_argument("--max-sessions", type=int, default=5000)
+    parser.add_argument("--endless", action="store_true",
+                        help=f"sessions keep only the last {game.HISTORY_WINDOW} deliveries in memory")
+    parser.add_argument("--pack", action="append", default=[], metavar="PATH", help="add a content pack")
+    parser.add_argument("--line-input", action="store_true", help="do not offer clients single-key input")
+    args = parser.parse_args(argv)
+    if args.pack:
+        import courier_content
+
+        try:
+            courier_content.install_packs(args.pack)
+        except (OSError, ValueError) as err:
+            parser.error(str(err))
+
+    async def run():
+        server = await CourierServer(
+            args.host, args.port, args.color, args.speed,
+            game.HISTORY_WINDOW if args.endless else None, args.max_sessions, keys=not args.line_input,
+        ).start()
+        print(f"Courier server on {args.host}:{server.port} (telnet {args.host} {server.port})", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+import argparse
+import sys
+import time
+import tracemalloc
+from math import comb
+
+import courier_of_possibilities as game
+
+# ==========================
+# Canonical State
+# ==========================
+# For the golden ending only four numbers matter:
+#
+#   ripple      ripple_index (0..MAX_RIPPLE)
+#   delivered   parcels delivered, capped at 8 (the unlock only asks ">= 8")
+#   harmony     the sum of civ harmony (the unlock asks "average >= -1")
+#   turns_left  the horizon
+#
+# Which civ holds the harmony, chaos, tag_influence, notes and the mission
+# scenario drawn never feed back into a rule. Harmony is also clamped to
+# the band where it can still make a difference: far enough above -C that
+# no run of bad turns can pull it under before the horizon, every value is
+# as good as any other, and likewise far enough below.
+#
+# The final puzzle is always answered for 3 points, so attempting it is
+# golden exactly when ripple <= PARADOX_THRESHOLD.
+
+DEFAULT_HORIZON = 30
+
+
+class Solver:
+    def __init__(self, refresh=True, offer_size=5):
+        # refresh: the [R] refresh in choose_parcel is free and unlimited, so
+        # with it the player can always get any parcel. Without it every turn
+        # offers a uniform random `offer_size`-subset (what courier_batch
+        # policies see).
+        self.refresh = refresh
+        self.offer_size = offer_size
+        self.civ_count = len(game.CIVILIZATIONS)
+        self.threshold = game.PARADOX_THRESHOLD
+        self.max_ripple = game.MAX_RIPPLE
+        self.unlock_ripple = int(game.MAX_RIPPLE * 0.8)
+        self.jitter = game.HARMONY_JITTER
+        self.missions = [(d["harmony"], d["ripple"]) for _, d, _ in game.MISSION_OPTIONS]
+        self.paradoxes = [
+            [(d["harmony_all"] * self.civ_count, d["ripple"]) for _, d, _ in s["options"]]
+            for s in game.PARADOX_SCENARIOS
+        ]
+
+        # Distinct (harmony, ripple) delivery effects, and which one each
+        # (parcel, civ) pair has.
+        self.effects = []
+        index = {}
+        self.effect_of = []
+        for row in game.EFFECT_TABLE:
+            ids = []
+            for harmony, _, ripple in row:
+                ids.append(index.setdefault((harmony, ripple), len(index)))
+            self.effect_of.append(ids)
+        self.effects = sorted(index, key=index.get)
+        # Most promising first, so a max can stop as soon as one reaches 1.
+        self.effect_order = sorted(range(len(self.effects)), key=lambda e: self.effects[e][1] - self.effects[e][0])
+        self.mission_order = sorted(self.missions, key=lambda m: m[1] - m[0])
+
+        # Largest possible harmony drop / gain over one whole turn.
+        patches = [h for options in self.paradoxes for h, _ in options]
+        self.max_drop = -(
+            min(h for h, _ in self.effects) + min(self.jitter)
+            + min(0, min(h for h, _ in self.missions)) + min(0, min(patches))
+        )
+        self.max_gain = (
+            max(h for h, _ in self.effects) + max(self.jitter)
+            + max(0, max(h for h, _ in self.missions)) + max(0, max(patches))
+        )
+
+        # P(the k-th best of n parcels is the best one offered).
+        n = len(game.PARCELS)
+        total = comb(n, offer_size)
+        self.rank_weights = [comb(n - k, offer_size - 1) / total for k in range(1, n + 1)]
+
+        self.turn_table = {}  # (turns_left, ripple, delivered, harmony) -> value
+        self.after_table = {}  # same key, after the delivery, before advice
+        self.nodes = 0
+
+    # -- canonical keys
+
+    def canonical(self, turns_left, ripple, delivered, harmony):
+        floor = -self.civ_count
+        high = floor + self.max_drop * turns_left
+        low = floor - self.max_gain * turns_left - 1
+        return turns_left, ripple, min(delivered, 8), max(low, min(high, harmony))
+
+    def state_key(self, state, turns_left):
+        return self.canonical(turns_left, state.ripple_index, state.deliveries.total, state.harmony_sum())
+
+    def clamp(self, ripple):
+        return 0 if ripple < 0 else self.max_ripple if ripple > self.max_ripple else ripple
+
+    # -- values
+
+    def turn_value(self, turns_left, ripple, delivered, harmony):
+        # Start of a turn: the parcel offer and the destination are next.
+        if turns_left <= 0:
+            return 0.0
+        key = self.canonical(turns_left, ripple, delivered, harmony)
+        value = self.turn_table.get(key)
+        if value is None:
+            if self.refresh:
+                self.nodes += 1
+                value = 0.0
+                for e in self.effect_order:
+                    value = max(value, self.effect_value(e, *key))
+                    if value >= 1.0:
+                        break
+            else:
+                effect_values = self.effect_values(*key)
+                best = sorted((max(effect_values[e] for e in ids) for ids in self.effect_of), reverse=True)
+                value = sum(w * v for w, v in zip(self.rank_weights, best))
+            self.turn_table[key] = value
+        return value
+
+    def effect_values(self, turns_left, ripple, delivered, harmony):
+        # Expected value of each distinct delivery effect, over the jitter.
+        self.nodes += 1
+        return [self.effect_value(e, turns_left, ripple, delivered, harmony) for e in range(len(self.effects))]
+
+    def effect_value(self, e, turns_left, ripple, delivered, harmony):
+        dh, dr = self.effects[e]
+        after_ripple = self.clamp(ripple + dr)
+        delivered = min(delivered + 1, 8)
+        after_value = self.after_value
+        total = 0.0
+        for j in self.jitter:
+            total += after_value(turns_left, after_ripple, delivered, harmony + dh + j)
+        return total / len(self.jitter)
+
+    def after_value(self, turns_left, ripple, delivered, harmony):
+        # After the delivery: mission advice, paradox, unlock.
+        key = self.canonical(turns_left, ripple, delivered, harmony)
+        value = self.after_table.get(key)
+        if value is None:
+            turns_left, ripple, delivered, harmony = key
+            value = 0.0
+            for dh, dr in self.mission_order:
+                value = max(value, self.paradox_value(turns_left, self.clamp(ripple + dr), delivered, harmony + dh))
+                if value >= 1.0:
+                    break
+            self.after_table[key] = value
+        return value
+
+    def advice_values(self, turns_left, ripple, delivered, harmony):
+        return [
+            self.paradox_value(turns_left, self.clamp(ripple + dr), delivered, harmony + dh)
+            for dh, dr in self.missions
+        ]
+
+    def paradox_value(self, turns_left, ripple, delivered, harmony):
+        if ripple < self.threshold:
+            return self.unlock_value(turns_left, ripple, delivered, harmony)
+        total = 0.0
+        for options in self.paradoxes:
+            best = 0.0
+            for dh, dr in options:
+                best = max(best, self.unlock_value(turns_left, self.clamp(ripple + dr), delivered, harmony + dh))
+                if best >= 1.0:
+                    break
+            total += best
+        return total / len(self.paradoxes)
+
+    def patch_values(self, options, turns_left, ripple, delivered, harmony):
+        return [
+            self.unlock_value(turns_left, self.clamp(ripple + dr), delivered, harmony + dh) for dh, dr in options
+        ]
+
+    def unlock_value(self, turns_left, ripple, delivered, harmony):
+        if self.unlock_ready(ripple, delivered, harmony) and ripple <= self.threshold:
+            return 1.0
+        return self.turn_value(turns_left - 1, ripple, delivered, harmony)
+
+    def unlock_ready(self, ripple, delivered, harmony):
+        return delivered >= 8 and harmony >= -self.civ_count and ripple <= self.unlock_ripple
+
+    def value(self, state, turns_left):
+        # P(golden ending) from the start of state's next turn, playing
+        # optimally for at most `turns_left` more turns.
+        if state.unlocked_final:
+            return 1.0 if state.ripple_index <= self.threshold else 0.0
+        return self.turn_value(turns_left, state.ripple_index, state.deliveries.total, state.harmony_sum())
+
+
+# ==========================
+# Solver Policy
+# ==========================
+# Plays the solved strategy; plugs into courier_batch like any policy:
+#   python courier_batch.py --policy courier_solver:SolverPolicy --max-turns 30
+# The batch runner offers five parcels and no refresh, so that is what this
+# policy solves for.
+
+
+class SolverPolicy:
+    def __init__(self, horizon=DEFAULT_HORIZON, solver=None):
+        self.horizon = horizon
+        self.solver = solver or Solver(refresh=False)
+
+    def _turns_left(self, state):
+        # state.turn has already been advanced for the turn being played.
+        return max(1, self.horizon - state.turn + 1)
+
+    def _delivery_values(self, state):
+        s = self.solver
+        key = s.canonical(self._turns_left(state), state.ripple_index, state.deliveries.total, state.harmony_sum())
+        return s.effect_values(*key)
+
+    def choose_parcel(self, state, offer, rng):
+        values = self._delivery_values(state)
+        effect_of = self.solver.effect_of
+        return max(offer, key=lambda parcel: max(values[e] for e in effect_of[parcel["index"]]))
+
+    def choose_civ(self, state, parcel, rng):
+        values = self._delivery_values(state)
+        ids = self.solver.effect_of[parcel["index"]]
+        return game.CIVILIZATIONS[max(range(len(ids)), key=lambda c: values[ids[c]])]
+
+    def choose_advice(self, state, parcel, civ, rng):
+        s = self.solver
+        key = s.canonical(self._turns_left(state), state.ripple_index, state.deliveries.total, state.harmony_sum())
+        values = s.advice_values(*key)
+        return max(range(len(values)), key=values.__getitem__)
+
+    def choose_patch(self, state, scenario, rng):
+        s = self.solver
+        options = [
+            (d["harmony_all"] * s.civ_count, d["ripple"]) for _, d, _ in scenario["options"]
+        ]
+        key = s.canonical(self._turns_left(state), state.ripple_index, state.deliveries.total, state.harmony_sum())
+        values = s.patch_values(options, *key)
+        return max(range(len(values)), key=values.__getitem__)
+
+    def attempt_final(self, state, rng):
+        return state.ripple_index <= game.PARADOX_THRESHOLD
+
+    def final_answers(self, state, rng):
+        return [max(range(len(opts)), key=lambda i: opts[i][1]) for _, opts in game.FINAL_PUZZLE_STEPS]
+
+
+# ==========================
+# Command Line
+# ==========================
+
+
+def solve(horizon, refresh=True, measure_memory=True):
+    # (solver, value of a fresh game, seconds, peak bytes or None)
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10 * horizon + 100))
+    if measure_memory:
+        tracemalloc.start()
+    started = time.perf_counter()
+    solver = Solver(refresh=refresh)
+    value = solver.value(game.GameState(), horizon)
+    seconds = time.perf_counter() - started
+    peak = None
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return solver, value, seconds, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve Courier for the best chance of the golden ending.")
+    parser.add_argument("--horizon", type=int, default=DEFAULT_HORIZON, help="turns the courier gets")
+    parser.add_argument("--no-refresh", action="store_true", help="solve without the free [R] refresh (batch rules)")
+    parser.add_argument("--curve", action="store_true", help="also print the value for every shorter horizon")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc (faster)")
+    args = parser.parse_args(argv)
+
+    solver, value, seconds, peak = solve(args.horizon, not args.no_refresh, not args.no_memory)
+    rules = "no refresh, 5-parcel offers" if args.no_refresh else "free refresh"
+    print(f"P(golden harmony) from a new game, {args.horizon} turns, {rules}: {value:.6f}")
+    print(f"States: {len(solver.turn_table):,} turn + {len(solver.after_table):,} post-delivery "
+          f"({solver.nodes:,} expanded) in {seconds:.2f}s")
+    if peak is not None:
+        print(f"Peak traced memory: {peak / 2**20:.1f} MiB")
+    if args.curve:
+        print()
+        print("turns  P(golden)")
+        fresh = game.GameState()
+        for turns in range(1, args.horizon + 1):
+            print(f"{turns:>5}  {solver.value(fresh, turns):.6f}")
+
+
+if __name__ == "__main__":
+    main()
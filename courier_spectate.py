@@ -0,0 +1,182 @@
+import argparse
+import asyncio
+import json
+import random
+import sys
+
+import courier_batch
+import courier_of_possibilities as game
+
+# ==========================
+# Event Hub
+# ==========================
+# Spectators connect over TCP and receive every game event as one JSON
+# line, tagged with the game it belongs to. publish() serializes an event
+# once and queues it; once per pass of the event loop the queued lines are
+# joined and the same bytes go to every spectator's socket buffer, so a
+# burst of events costs one write per spectator, and nothing ever waits. A
+# spectator whose unread output passes HIGH_WATER stops getting events
+# until it has read below LOW_WATER, then first receives a
+# {"kind": "gap", "dropped": n} line, so a slow viewer loses events
+# instead of slowing the game or anyone else.
+
+HIGH_WATER = 64 * 1024
+LOW_WATER = 16 * 1024
+
+
+class Spectator:
+    __slots__ = ("transport", "task", "dropped")
+
+    def __init__(self, transport, task):
+        self.transport = transport
+        self.task = task
+        self.dropped = 0
+
+
+class EventHub:
+    def __init__(self):
+        self.spectators = set()
+        self.pending = []  # serialized lines waiting for the next flush
+        self.published = 0
+        self.dropped = 0
+        self.server = None
+
+    def sink(self, game_id):
+        # The callable to put in game.CURRENT_EVENTS for one game.
+        def publish(event):
+            event["game"] = game_id
+            self.publish(event)
+
+        return publish
+
+    def publish(self, event):
+        self.published += 1
+        if not self.spectators:
+            return
+        if not self.pending:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self.pending.append(json.dumps(event, separators=(",", ":")))
+
+    def _flush(self):
+        count = len(self.pending)
+        data = ("\n".join(self.pending) + "\n").encode()
+        self.pending.clear()
+        for spectator in self.spectators:
+            transport = spectator.transport
+            if transport.is_closing():
+                continue
+            queued = transport.get_write_buffer_size()
+            if spectator.dropped:
+                if queued > LOW_WATER:
+                    spectator.dropped += count
+                    self.dropped += count
+                    continue
+                transport.write(b'{"kind":"gap","dropped":%d}\n' % spectator.dropped)
+                spectator.dropped = 0
+            elif queued > HIGH_WATER:
+                spectator.dropped = count
+                self.dropped += count
+                continue
+            transport.write(data)
+
+    async def start(self, host="127.0.0.1", port=2324):
+        self.server = await asyncio.start_server(self._watch, host, port, backlog=1024)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def close(self):
+        if self.server:
+            self.server.close()
+            for spectator in self.spectators:
+                spectator.transport.abort()
+            await asyncio.gather(*[spectator.task for spectator in self.spectators], return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def _watch(self, reader, writer):
+        spectator = Spectator(writer.transport, asyncio.current_task())
+        self.spectators.add(spectator)
+        try:
+            # Spectators have nothing to say; reading only notices them leave.
+            while await reader.read(4096):
+                pass
+        except ConnectionError:
+            pass
+        finally:
+            self.spectators.discard(spectator)
+            writer.close()
+
+
+# ==========================
+# Bot Tournaments
+# ==========================
+# Bots play courier_batch games turn by turn, `turn_delay` seconds apart
+# so there is something to watch, each in its own task with its own event
+# sink. A finished bot starts a new game.
+
+
+async def play_bot(hub, name, policy_spec, seed, turn_delay, max_turns, games=None):
+    game.CURRENT_EVENTS.set(hub.sink(name))
+    policy = courier_batch.resolve_policy(policy_spec)
+    played = 0
+    while games is None or played < games:
+        rng = random.Random(seed + played)
+        state = game.GameState()
+        game.emit("start", state, seed=seed + played, policy=policy_spec)
+        record = None
+        while record is None and state.turn < max_turns:
+            record = courier_batch.play_turn(policy, state, rng)
+            await asyncio.sleep(turn_delay)
+        if record is None:
+            game.emit("retired", state)
+        played += 1
+
+
+async def tournament(hub, bots, policy_spec, seed, turn_delay, max_turns, games=None):
+    await asyncio.gather(*[
+        play_bot(hub, f"bot-{i}", policy_spec, seed + 1000003 * i, turn_delay, max_turns, games)
+        for i in range(bots)
+    ])
+
+
+# ==========================
+# Command Line
+# ==========================
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stream Courier games to spectators as JSON lines over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2324, help="spectator port")
+    parser.add_argument("--bots", type=int, default=8, help="bot games to run at once")
+    parser.add_argument("--policy", default="cozy", help="bot policy (see courier_batch.py)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--turn-delay", type=float, default=1.0, help="seconds between a bot's turns")
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--players", type=int, metavar="PORT",
+                        help="also host telnet players on PORT (courier_server) and stream their games")
+    args = parser.parse_args(argv)
+
+    async def run():
+        hub = EventHub()
+        port = await hub.start(args.host, args.port)
+        print(f"Spectators: nc {args.host} {port}", flush=True)
+        tasks = [tournament(hub, args.bots, args.policy, args.seed, args.turn_delay, args.max_turns)]
+        if args.players is not None:
+            import courier_server
+
+            server = await courier_server.CourierServer(args.host, args.players, hub=hub).start()
+            print(f"Players: telnet {args.host} {server.port}", flush=True)
+            tasks.append(server.serve_forever())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            await hub.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
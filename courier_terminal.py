@@ -0,0 +1,811 @@
+import asyncio
+import codecs
+import contextvars
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from collections import deque
+
+# ==========================
+# Buffered Frame Renderer
+# ==========================
+# Screens compose their output into one buffer and it reaches the terminal
+# as a single write + flush, either when someone needs to see it (a prompt,
+# a pause) or once per typewriter tick.
+
+ANSI_ESCAPE = re.compile(r"\x1b\[[0-9;?]*[A-Za-z]")
+
+TICK = 1 / 30  # seconds between typewriter flushes
+
+
+RESET = "\x1b[0m"
+ERASE_LINE = "\x1b[K"
+ERASE_BELOW = "\x1b[J"
+
+
+def visible_width(text):
+    return len(ANSI_ESCAPE.sub("", text))
+
+
+def _shared_prefix(a, b):
+    # Length of the common prefix of two lines, never ending inside an
+    # escape sequence.
+    n = 0
+    limit = min(len(a), len(b))
+    while n < limit and a[n] == b[n]:
+        n += 1
+    cut = a.rfind("\x1b", 0, n)
+    if cut != -1:
+        match = ANSI_ESCAPE.match(b, cut)
+        if not match or match.end() > n:
+            n = cut
+    return n
+
+
+def _active_style(prefix):
+    # SGR sequences still in effect at the end of `prefix`, so a line can be
+    # resumed mid-way with the right colors.
+    codes = ANSI_ESCAPE.findall(prefix)
+    for i in range(len(codes) - 1, -1, -1):
+        if codes[i] == RESET:
+            return "".join(codes[i + 1:])
+    return "".join(codes)
+
+
+class Renderer:
+    # Besides buffering, the renderer keeps a model of the lines on screen.
+    # clear() starts a new back buffer instead of wiping the terminal; the
+    # first flush after it compares the back buffer with the previous frame
+    # and only sends the lines that changed (or just the new tail of a line
+    # that grew). Output after that first flush streams straight through.
+    # Frames that do not fit the terminal, or terminals without cursor
+    # addressing, fall back to clear + full redraw.
+
+    def __init__(self, stream=None, terminal=None, differential=None, size=None):
+        self.stream = stream if stream is not None else sys.stdout
+        self.terminal = terminal if terminal is not None else detect_terminal(self.stream)
+        self.differential = differential  # None: on when the stream is a terminal
+        self.size = size  # (columns, rows); None: ask the terminal each frame
+        self._buf = []
+        self.bytes_written = 0
+        self.writes = 0  # one write(2) per flush
+        self.write_seconds = 0.0
+        self._lines = [""]
+        self._prev_lines = None
+        self._known = False
+        self._composing = False
+
+    def write(self, text):
+        self._track(text)
+        if not self._composing:
+            self._buf.append(text)
+
+    def line(self, text=""):
+        self.write(text + "\n")
+
+    def echoed(self, text):
+        # Text the terminal displayed by itself, like the echo of a typed answer.
+        self._track(text)
+
+    def _track(self, text):
+        lines = self._lines
+        for j, part in enumerate(text.split("\n")):
+            if j:
+                lines.append("")
+            if "\r" in part:
+                lines[-1] = part.rpartition("\r")[2]
+            else:
+                lines[-1] += part
+
+    def clear(self):
+        # Drop anything not yet shown; it would be wiped anyway.
+        self._buf.clear()
+        if not self._composing:
+            self._prev_lines = self._lines if self._known else None
+            self._composing = True
+        self._lines = [""]
+
+    def flush(self):
+        if self._composing:
+            self._composing = False
+            self._render_frame()
+        if not self._buf:
+            return
+        frame = "".join(self._buf)
+        self._buf.clear()
+        started = time.perf_counter()
+        self.stream.write(frame)
+        self.stream.flush()
+        self.write_seconds += time.perf_counter() - started
+        self.bytes_written += len(frame.encode("utf-8", "replace"))
+        self.writes += 1
+
+    def rewrite(self, row, text):
+        # Replaces line `row` (1-based) of what is on screen, e.g. a readout
+        # that changed under text still being shown, and puts the cursor
+        # back where it was. False if the terminal cannot be patched in
+        # place; the screen is left as it was.
+        lines = self._lines
+        if row > len(lines):
+            return False
+        before = lines[row - 1]
+        if before == text:
+            return True
+        if not self._composing:
+            if not (self._known and self._use_diff(lines, lines)):
+                return False
+            move_to = self.terminal.move_to
+            keep = _shared_prefix(before, text)
+            start = visible_width(text[:keep]) + 1
+            self._buf.append(RESET + move_to(row, start) + _active_style(text[:keep]) + text[keep:])
+            if visible_width(before) > visible_width(text):
+                self._buf.append(ERASE_LINE)
+            self._buf.append(RESET + move_to(len(lines), visible_width(lines[-1]) + 1) + _active_style(lines[-1]))
+        lines[row - 1] = text  # while composing, the frame goes out whole anyway
+        return True
+
+    def _use_diff(self, old, new):
+        if old is None or not getattr(self.terminal, "supports_cursor", False):
+            return False
+        if self.differential is None:
+            isatty = getattr(self.stream, "isatty", None)
+            if not (isatty and isatty()):
+                return False
+        elif not self.differential:
+            return False
+        columns, rows = self.size or shutil.get_terminal_size()
+        for frame in (old, new):
+            if len(frame) > rows:
+                return False
+            for line in frame:
+                if visible_width(line) >= columns:
+                    return False
+        return True
+
+    def _render_frame(self):
+        new = self._lines
+        old = self._prev_lines
+        self._prev_lines = None
+        self._known = True
+        full = "\n".join(new)
+        if self._use_diff(old, new):
+            patch = self._diff(old, new)
+            # A screen that shares little with the last one is cheaper to
+            # repaint than to patch.
+            if len(patch) < len(full) + len(CLEAR_SCREEN):
+                self._buf.append(patch)
+                return
+        self._repaint(new)
+
+    def _repaint(self, lines):
+        self._lines = [""]
+        self.terminal.clear(self)  # takes no room in the model
+        self._lines = lines
+        self._buf.append("\n".join(lines))
+
+    def _diff(self, old, new):
+        move_to = self.terminal.move_to
+        out = [RESET]
+        row, col = len(old), visible_width(old[-1]) + 1  # cursor sits after the last thing shown
+        for target, line in enumerate(new, start=1):
+            before = old[target - 1] if target <= len(old) else ""
+            if line == before:
+                continue
+            keep = _shared_prefix(before, line)
+            start = visible_width(line[:keep]) + 1
+            text = _active_style(line[:keep]) + line[keep:]
+            if target == row:
+                if start != col:
+                    out.append("\r" if start == 1 else f"\x1b[{start}G")
+            elif target == row + 1 and start == 1:
+                out.append("\r\n")
+            else:
+                out.append(move_to(target, start))
+            out.append(text)
+            row, col = target, start + visible_width(text)
+            if visible_width(before) > visible_width(line):
+                out.append(ERASE_LINE)
+        end_row, end_col = len(new), visible_width(new[-1]) + 1
+        if (row, col) != (end_row, end_col):
+            out.append(move_to(end_row, end_col))
+        if len(old) > len(new):
+            out.append(ERASE_BELOW)
+        return "".join(out)
+
+    def invalidate(self):
+        # Something else drew on the terminal (typed-ahead input echoed by the
+        # tty): the model no longer matches, so the next frame repaints whole.
+        self._known = False
+
+
+# ==========================
+# Terminal Backends
+# ==========================
+# Clearing the screen is an escape sequence appended to the current frame,
+# not a `cls` / `clear` child process.
+
+CLEAR_SCREEN = "\x1b[H\x1b[2J\x1b[3J"  # home, clear screen, drop scrollback (what `clear` does)
+
+
+class AnsiTerminal:
+    supports_cursor = True
+
+    def __init__(self, stream=None):
+        self.stream = stream if stream is not None else sys.stdout
+
+    def clear(self, renderer):
+        renderer.write(CLEAR_SCREEN)
+
+    def move_to(self, row, col=1):
+        return f"\x1b[{row};{col}H"
+
+
+class WindowsConsoleTerminal(AnsiTerminal):
+    # Windows 10+ consoles understand ANSI once virtual terminal processing is
+    # switched on. Older consoles get the same clear done through the
+    # console API instead.
+
+    STD_OUTPUT_HANDLE = -11
+    ENABLE_VIRTUAL_TERMINAL_PROCESSING = 0x0004
+
+    def __init__(self, stream=None):
+        super().__init__(stream)
+        self._kernel32 = None
+        self._handle = None
+        self.vt_enabled = self._enable_vt()
+        self.supports_cursor = self.vt_enabled
+
+    def _enable_vt(self):
+        try:
+            import ctypes
+            from ctypes import wintypes
+        except ImportError:
+            return False
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        handle = kernel32.GetStdHandle(self.STD_OUTPUT_HANDLE)
+        mode = wintypes.DWORD()
+        if not kernel32.GetConsoleMode(handle, ctypes.byref(mode)):
+            return True  # not a console (redirected / mintty): plain ANSI it is
+        self._kernel32 = kernel32
+        self._handle = handle
+        return bool(kernel32.SetConsoleMode(handle, mode.value | self.ENABLE_VIRTUAL_TERMINAL_PROCESSING))
+
+    def clear(self, renderer):
+        if self.vt_enabled:
+            renderer.write(CLEAR_SCREEN)
+            return
+        renderer.flush()
+        self._console_clear()
+
+    def _console_clear(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class COORD(ctypes.Structure):
+            _fields_ = [("X", wintypes.SHORT), ("Y", wintypes.SHORT)]
+
+        class SMALL_RECT(ctypes.Structure):
+            _fields_ = [(name, wintypes.SHORT) for name in ("Left", "Top", "Right", "Bottom")]
+
+        class CONSOLE_SCREEN_BUFFER_INFO(ctypes.Structure):
+            _fields_ = [
+                ("dwSize", COORD),
+                ("dwCursorPosition", COORD),
+                ("wAttributes", wintypes.WORD),
+                ("srWindow", SMALL_RECT),
+                ("dwMaximumWindowSize", COORD),
+            ]
+
+        k32 = self._kernel32
+        info = CONSOLE_SCREEN_BUFFER_INFO()
+        if not k32.GetConsoleScreenBufferInfo(self._handle, ctypes.byref(info)):
+            return
+        cells = info.dwSize.X * info.dwSize.Y
+        written = wintypes.DWORD()
+        origin = COORD(0, 0)
+        k32.FillConsoleOutputCharacterW(self._handle, ctypes.c_wchar(" "), cells, origin, ctypes.byref(written))
+        k32.FillConsoleOutputAttribute(self._handle, info.wAttributes, cells, origin, ctypes.byref(written))
+        k32.SetConsoleCursorPosition(self._handle, origin)
+
+
+class PlainTerminal:
+    # No escape sequences at all (dumb terminals, bare TCP clients): a
+    # clear is just a blank line, and every frame is drawn in full.
+    supports_cursor = False
+
+    def clear(self, renderer):
+        renderer.write("\n")
+
+
+def detect_terminal(stream=None):
+    if sys.platform == "win32":
+        return WindowsConsoleTerminal(stream)
+    return AnsiTerminal(stream)
+
+
+# ==========================
+# Clocks
+# ==========================
+# Every delay in the game goes through the session's clock. The real clock
+# sleeps; a scaled clock sleeps `factor` times faster; the virtual clock
+# only moves its own hands forward. now() is always in game seconds, so a
+# timeline recorded under any of them reads the same.
+
+
+class RealClock:
+    virtual = False
+
+    def __init__(self, record=False):
+        self.timeline = [] if record else None  # (start, seconds) per delay
+        self._origin = time.monotonic()
+
+    def now(self):
+        return time.monotonic() - self._origin
+
+    async def sleep(self, seconds, wake=None):
+        # Returns early if the `wake` event gets set.
+        if self.timeline is not None:
+            self.timeline.append((self.now(), seconds))
+        if wake is None:
+            await asyncio.sleep(seconds)
+            return
+        try:
+            await asyncio.wait_for(wake.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+class ScaledClock(RealClock):
+    def __init__(self, factor, record=False):
+        super().__init__(record)
+        self.factor = factor
+
+    def now(self):
+        return (time.monotonic() - self._origin) * self.factor
+
+    async def sleep(self, seconds, wake=None):
+        if self.timeline is not None:
+            self.timeline.append((self.now(), seconds))
+        real = seconds / self.factor
+        if wake is None:
+            await asyncio.sleep(real)
+            return
+        try:
+            await asyncio.wait_for(wake.wait(), real)
+        except asyncio.TimeoutError:
+            pass
+
+
+class VirtualClock:
+    virtual = True
+
+    def __init__(self, record=True):
+        self.timeline = [] if record else None
+        self._now = 0.0
+
+    def now(self):
+        return self._now
+
+    async def sleep(self, seconds, wake=None):
+        if self.timeline is not None:
+            self.timeline.append((self._now, seconds))
+        self._now += seconds
+        await asyncio.sleep(0)  # still a scheduling point, like a real sleep
+
+
+def make_clock(speed=None):
+    # speed: None or 1 for real time, N for N times faster, 0 for virtual.
+    if speed == 0:
+        return VirtualClock()
+    if speed is None or speed == 1:
+        return RealClock()
+    return ScaledClock(speed)
+
+
+# ==========================
+# Async Console
+# ==========================
+# One Console per player: a renderer, the lines they typed, and the skip
+# flag. Screens are coroutines; waiting for input or for an animation frame
+# never blocks the event loop, so input keeps arriving while an animation
+# plays and several consoles can share one process.
+#
+# A line that arrives while nothing is asking skips the running animation:
+# every pause returns at once and typewriters print the rest in one go, so
+# the screen jumps to its final frame. An empty line (just Enter) is used
+# up by the skip; anything else stays queued as the answer to the next
+# prompt.
+#
+# A raw console gets keys instead of lines (a terminal in cbreak mode, a
+# telnet client in character mode). Choices are answered by one keystroke,
+# keys that answer nothing are ignored rather than rejected, and keys typed
+# ahead are kept in order: Enter or space pressed during an animation only
+# skips it, any other key skips it and answers the next prompt, and a
+# "Press Enter" pause is dismissed by any key, keeping all but Enter and
+# space for what comes next.
+
+CURRENT_CONSOLE = contextvars.ContextVar("courier_console")
+
+ENTER_KEYS = ("\r", "\n")
+CONTINUE_KEYS = ("\r", "\n", " ")
+ERASE_KEYS = ("\x7f", "\b")
+DIGITS = "0123456789"
+KEY_SEQUENCE = re.compile(r"\x1b(?:\[[0-9;?]*[A-Za-z~]|O.)?|.", re.S)  # arrows etc. stay one key
+
+
+def split_keys(text):
+    return KEY_SEQUENCE.findall(text)
+
+
+def parse_choice(answer, count, letters=""):
+    # A typed line as a choice: the 0-based option for "1".."count", or the
+    # letter in `letters` it starts with; None if it is neither.
+    answer = answer.strip().lower()
+    if answer.isdigit() and answer.isascii():
+        number = int(answer)
+        return number - 1 if 1 <= number <= count else None
+    if answer and answer[0] in letters:
+        return answer[0]
+    return None
+
+
+def current_console():
+    return CURRENT_CONSOLE.get()
+
+
+def typewriter_chunks(text, speed, tick=TICK):
+    # Split `text` into (chunk, delay) pairs with the pacing of one glyph
+    # per `speed` seconds (spaces, newlines and escape sequences are free),
+    # batched so there is one write and one sleep per tick.
+    start = 0
+    owed = 0.0
+    i = 0
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == "\x1b":
+            match = ANSI_ESCAPE.match(text, i)
+            if match:
+                i = match.end()
+                continue
+        i += 1
+        if ch != " " and ch != "\n":
+            owed += speed
+            if owed >= tick:
+                yield text[start:i], owed
+                start = i
+                owed = 0.0
+    yield text[start:], owed
+
+
+def typing_time(text, speed):
+    # Total delay typewriter_chunks would spread over `text`.
+    visible = ANSI_ESCAPE.sub("", text)
+    return (len(visible) - visible.count(" ") - visible.count("\n")) * speed
+
+
+class Console:
+    def __init__(self, renderer=None, clock=None, tick=TICK, color=None, raw=False):
+        # color: whether this player's terminal shows ANSI colors; None
+        # leaves it to the game's process-wide default.
+        # raw: input arrives through feed_key() a keystroke at a time, and
+        # the console echoes what is typed.
+        self.renderer = renderer if renderer is not None else Renderer()
+        self.clock = clock if clock is not None else RealClock()
+        self.tick = tick
+        self.color = color
+        self.raw = raw
+        self.lines = asyncio.Queue()
+        self.keys = deque()  # type-ahead for a raw console
+        self._key_ready = asyncio.Event()
+        self.skip = asyncio.Event()
+        self.waiting = False
+        self.input_seconds = 0.0  # spent waiting for the player
+        self.sleep_seconds = 0.0  # spent in the clock's delays
+
+    # -- input side (called on the event loop by whatever reads the keyboard)
+
+    def feed(self, line):
+        # `line` without its newline; None means end of input.
+        if line is None or self.waiting:
+            self.push(line)
+            return
+        self.skip.set()
+        self.renderer.invalidate()
+        if line.strip():
+            self.lines.put_nowait(line)
+
+    def push(self, line):
+        # Queue an answer without the skip handling (piped or scripted input).
+        if line is None:
+            self.skip.set()
+        self.lines.put_nowait(line)
+
+    def feed_key(self, key):
+        # One keystroke (an escape sequence counts as one); None means end
+        # of input.
+        if key is not None and not self.waiting:
+            self.skip.set()
+            if key in CONTINUE_KEYS:
+                return
+        elif key is None:
+            self.skip.set()
+        self.keys.append(key)
+        self._key_ready.set()
+
+    async def _next_key(self, take=True):
+        if not self.keys:
+            started = time.perf_counter()
+            while not self.keys:
+                self._key_ready.clear()
+                await self._key_ready.wait()
+            self.input_seconds += time.perf_counter() - started
+        key = self.keys[0]
+        if key is None:
+            raise EOFError  # left queued: later prompts are at EOF too
+        if take:
+            self.keys.popleft()
+        return key
+
+    async def ask(self, prompt):
+        renderer = self.renderer
+        renderer.write(prompt)
+        renderer.flush()
+        self.skip.clear()
+        self.waiting = True
+        try:
+            if self.raw:
+                return await self._read_line()
+            started = time.perf_counter()
+            line = await self.lines.get()
+            self.input_seconds += time.perf_counter() - started
+        finally:
+            self.waiting = False
+        if line is None:
+            self.lines.put_nowait(None)  # stay at EOF for later prompts
+            raise EOFError
+        renderer.echoed(line + "\n")
+        return line
+
+    async def _read_line(self):
+        renderer = self.renderer
+        typed = []
+        while True:
+            key = await self._next_key()
+            if key in ENTER_KEYS:
+                renderer.write("\n")
+                renderer.flush()
+                return "".join(typed)
+            if key in ERASE_KEYS:
+                if typed:
+                    typed.pop()
+                    renderer.write("\b \b")
+                    renderer.invalidate()
+            elif key.isprintable() and len(key) == 1:
+                typed.append(key)
+                renderer.write(key)
+            renderer.flush()
+
+    async def choose(self, prompt, count, letters="", default=None):
+        # The 0-based index of option "1".."count", one of `letters`, or
+        # `default` for a bare Enter. A line that answers nothing gives None
+        # (the caller says why and asks again); a raw console never does:
+        # a digit answers as soon as no further digit could make a valid
+        # number, and keys that answer nothing are ignored.
+        if not self.raw:
+            answer = await self.ask(prompt)
+            if default is not None and not answer.strip():
+                return default
+            return parse_choice(answer, count, letters)
+        renderer = self.renderer
+        renderer.write(prompt)
+        renderer.flush()
+        self.skip.clear()
+        self.waiting = True
+        digits = ""
+        try:
+            while True:
+                key = (await self._next_key()).lower()
+                if key in ENTER_KEYS:
+                    if digits:
+                        answer = int(digits) - 1
+                        break
+                    if default is not None:
+                        answer = default
+                        break
+                elif key in ERASE_KEYS:
+                    if digits:
+                        digits = digits[:-1]
+                        renderer.write("\b \b")
+                        renderer.invalidate()
+                        renderer.flush()
+                elif len(key) == 1 and key in DIGITS:
+                    number = int(digits + key)
+                    if 1 <= number <= count:
+                        digits += key
+                        renderer.write(key)
+                        if number * 10 > count:
+                            answer = number - 1
+                            break
+                        renderer.flush()
+                elif len(key) == 1 and key in letters and not digits:
+                    renderer.write(key)
+                    answer = key
+                    break
+        finally:
+            self.waiting = False
+        renderer.write("\n")
+        renderer.flush()  # the echo reaches the screen before a new frame is diffed against it
+        if self.keys:
+            self.skip.set()  # typed further ahead: don't play what's in between
+        return answer
+
+    async def wait_key(self, prompt):
+        # A "Press Enter" pause. On a raw console any key ends it, and any
+        # key but Enter or space stays queued for the next prompt.
+        if not self.raw:
+            await self.ask(prompt)
+            return
+        renderer = self.renderer
+        renderer.write(prompt)
+        renderer.flush()
+        self.skip.clear()
+        self.waiting = True
+        try:
+            key = await self._next_key(take=False)
+        finally:
+            self.waiting = False
+        if key in CONTINUE_KEYS:
+            self.keys.popleft()
+        renderer.write("\n")
+        renderer.flush()
+        if self.keys:
+            self.skip.set()
+
+    # -- pacing
+
+    async def pause(self, seconds):
+        # Skipped frames are not even flushed: the next frame replaces them.
+        if self.skip.is_set():
+            return
+        self.renderer.flush()
+        await self._sleep(seconds, self.skip)
+
+    async def _sleep(self, seconds, wake=None):
+        started = time.perf_counter()
+        await self.clock.sleep(seconds, wake)
+        self.sleep_seconds += time.perf_counter() - started
+
+    async def typewrite(self, text, speed, end="\n"):
+        renderer = self.renderer
+        if self.skip.is_set() or speed <= 0:
+            renderer.write(text + end)
+            return
+        if self.clock.virtual:
+            # Nobody is watching the ticks; keep the timing, not the writes.
+            renderer.write(text + end)
+            await self._sleep(typing_time(text, speed))
+            return
+        chunks = typewriter_chunks(text, speed, self.tick)
+        for chunk, delay in chunks:
+            renderer.write(chunk)
+            if self.skip.is_set():
+                renderer.write("".join(rest for rest, _ in chunks))
+                break
+            await self.pause(delay)
+        renderer.write(end)
+        renderer.flush()
+
+
+def start_stdin_reader(console, stream=None, loop=None):
+    # Blocking readline() lives on a daemon thread and hands each line to
+    # the loop, so the game itself never waits inside input(). Piped input
+    # is all answers; only a person at a terminal can type to skip.
+    stream = stream if stream is not None else sys.stdin
+    loop = loop if loop is not None else asyncio.get_running_loop()
+    isatty = getattr(stream, "isatty", None)
+    deliver = console.feed if isatty and isatty() else console.push
+
+    def pump():
+        try:
+            for line in iter(stream.readline, ""):
+                loop.call_soon_threadsafe(deliver, line.rstrip("\r\n"))
+        except (OSError, ValueError, RuntimeError):
+            pass
+        try:
+            loop.call_soon_threadsafe(deliver, None)
+        except RuntimeError:
+            pass  # loop already closed
+
+    thread = threading.Thread(target=pump, name="courier-stdin", daemon=True)
+    thread.start()
+    return thread
+
+
+def can_read_keys(stream=None):
+    # Whether start_key_reader() can work on `stream`.
+    stream = stream if stream is not None else sys.stdin
+    isatty = getattr(stream, "isatty", None)
+    if not (isatty and isatty()):
+        return False
+    if sys.platform == "win32":
+        return True
+    try:
+        import termios  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def start_key_reader(console, stream=None, loop=None):
+    # Like start_stdin_reader, for a raw console: the terminal goes into
+    # cbreak mode (keys arrive as they are pressed, unechoed; Ctrl-C still
+    # interrupts) and each key is handed to console.feed_key. Ctrl-D (or
+    # Ctrl-Z on Windows) ends input. Returns the function that puts the
+    # terminal back.
+    stream = stream if stream is not None else sys.stdin
+    loop = loop if loop is not None else asyncio.get_running_loop()
+
+    def deliver(keys):
+        for key in keys:
+            console.feed_key(key)
+
+    if sys.platform == "win32":
+        import msvcrt
+        import _thread
+
+        def pump():
+            while True:
+                key = msvcrt.getwch()
+                if key in ("\x00", "\xe0"):
+                    msvcrt.getwch()  # second half of an arrow or function key
+                    continue
+                if key == "\x03":
+                    _thread.interrupt_main()
+                    loop.call_soon_threadsafe(lambda: None)  # wake the loop to notice
+                    return
+                try:
+                    loop.call_soon_threadsafe(deliver, [None if key == "\x1a" else key])
+                except RuntimeError:
+                    return  # loop already closed
+                if key == "\x1a":
+                    return
+
+        def restore():
+            pass  # getwch() never changed the console mode
+    else:
+        import termios
+        import tty
+
+        fd = stream.fileno()
+        saved = termios.tcgetattr(fd)
+        tty.setcbreak(fd)
+        decoder = codecs.getincrementaldecoder(getattr(stream, "encoding", None) or "utf-8")("replace")
+
+        def restore():
+            termios.tcsetattr(fd, termios.TCSADRAIN, saved)
+
+        def pump():
+            while True:
+                try:
+                    data = os.read(fd, 256)
+                except OSError:
+                    data = b""
+                text = decoder.decode(data)
+                eof = not data or "\x04" in text
+                keys = split_keys(text.partition("\x04")[0])
+                if eof:
+                    keys.append(None)
+                try:
+                    loop.call_soon_threadsafe(deliver, keys)
+                except RuntimeError:
+                    return
+                if eof:
+                    return
+
+    thread = threading.Thread(target=pump, name="courier-keys", daemon=True)
+    thread.start()
+    return restore
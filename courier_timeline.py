@@ -0,0 +1,155 @@
+import argparse
+import sys
+import time
+import tracemalloc
+from collections import Counter, namedtuple
+
+import courier_content
+import courier_of_possibilities as game
+import courier_replay
+
+# ==========================
+# Timeline Tree
+# ==========================
+# Every branch holds its own GameState, forked from its parent's, so a tree
+# with thousands of branches shares all history and only keeps the per-civ
+# numbers that actually differ. Turns draw from the session's RngStreams, so
+# two branches that make the same decisions on the same turn see the same
+# dice.
+
+Branch = namedtuple("Branch", "state parent action result")
+
+
+class Timeline:
+    def __init__(self, seed, state=None):
+        self.streams = game.RngStreams(seed)
+        self.root = Branch(state or game.GameState(), None, None, None)
+
+    def play(self, branch, action):
+        # A child of `branch` one turn later; `branch` itself is untouched.
+        state = branch.state.fork()
+        result = game.step(state, action, self.streams)
+        return Branch(state, branch, action, result)
+
+    def path(self, branch):
+        line = []
+        while branch is not None:
+            line.append(branch)
+            branch = branch.parent
+        return line[::-1]
+
+
+def from_journal(journal):
+    # (timeline, line): line[i] is the branch the recorded session was on
+    # after its i-th turn (line[0] the start), undos already applied.
+    timeline = Timeline(journal.header["seed"], courier_replay.start_state(journal))
+    answers = journal.end["answers"] if journal.end else None
+    line = [timeline.root]
+    for entry in journal.turns:
+        if "rewind" in entry:
+            del line[entry["rewind"] - timeline.root.state.turn + 1:]
+            continue
+        line.append(timeline.play(line[-1], courier_replay.journal_action(entry, answers)))
+    return timeline, line
+
+
+def what_if(timeline, line, turn, parcel=None, civ=None):
+    # Replays the recorded line with a different delivery on `turn`, then the
+    # recorded decisions for every later turn; returns the new branches.
+    first = turn - timeline.root.state.turn
+    if not 1 <= first < len(line):
+        raise ValueError(f"turn {turn} is not on the recorded line")
+    branch = line[first - 1]
+    branches = []
+    for i, recorded in enumerate(line[first:]):
+        action = recorded.action
+        if i == 0:
+            action = action._replace(parcel=parcel or action.parcel, civ=civ or action.civ)
+        branch = timeline.play(branch, action)
+        branches.append(branch)
+        if branch.result.ending or branch.state.game_over:
+            break
+    return branches
+
+
+# ==========================
+# Command Line
+# ==========================
+
+
+def _summary(branch):
+    state = branch.state
+    action = branch.action
+    average = state.average_harmony()
+    ending = branch.result.ending or ""
+    return (f"{state.turn:>4}  {action.parcel['id']:<18} {action.civ['id']:<22} "
+            f"ripple {state.ripple_index:>2}  harmony {average:+5.2f}  {ending}")
+
+
+def show_what_if(timeline, line, turn, parcel, civ):
+    branches = what_if(timeline, line, turn, parcel, civ)
+    first = turn - timeline.root.state.turn
+    print("recorded:")
+    for branch in line[first:first + len(branches)]:
+        print("  " + _summary(branch))
+    print("what if:")
+    for branch in branches:
+        print("  " + _summary(branch))
+
+
+def fan_out(timeline, line, turn):
+    # Every (parcel, civ) delivery on `turn`, each played on with the recorded
+    # decisions. All branches stay alive until the report is printed.
+    tracemalloc.start()
+    started = time.perf_counter()
+    outcomes = []
+    for parcel in game.PARCELS:
+        for civ in game.CIVILIZATIONS:
+            outcomes.append(what_if(timeline, line, turn, parcel, civ))
+    seconds = time.perf_counter() - started
+    kept = sum(len(branches) for branches in outcomes)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    endings = Counter(branches[-1].result.ending or "-" for branches in outcomes)
+    print(f"{len(outcomes)} alternatives for turn {turn}, {kept:,} branches in {seconds * 1e3:.1f} ms, "
+          f"{peak / 1024:.0f} KiB peak ({peak / max(kept, 1):.0f} bytes per branch)")
+    for ending, count in endings.most_common():
+        print(f"  {ending:<18} {count}")
+    best = min(outcomes, key=lambda branches: (branches[-1].state.ripple_index, -branches[-1].state.harmony_sum()))
+    print("calmest:")
+    for branch in best:
+        print("  " + _summary(branch))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Branch a recorded Courier session and see where other choices lead.")
+    parser.add_argument("journal", help="a session journal from --record")
+    parser.add_argument("--turn", type=int, required=True, help="the turn to change")
+    parser.add_argument("--parcel", help="parcel id to send instead")
+    parser.add_argument("--civ", help="civilization id to send it to instead")
+    parser.add_argument("--fan", action="store_true", help="try every parcel and civilization on that turn")
+    parser.add_argument("--pack", action="append", default=[], metavar="PATH", help="content pack the session used")
+    args = parser.parse_args(argv)
+    try:
+        courier_content.install_packs(args.pack)
+    except (OSError, ValueError) as err:
+        parser.error(str(err))
+
+    timeline, line = from_journal(courier_replay.load_journal(args.journal))
+    try:
+        if args.fan:
+            fan_out(timeline, line, args.turn)
+            return 0
+        parcel = game.PARCELS_BY_ID[args.parcel] if args.parcel else None
+        civ = game.CIVS_BY_ID[args.civ] if args.civ else None
+        show_what_if(timeline, line, args.turn, parcel, civ)
+    except KeyError as err:
+        parser.error(f"unknown id {err}")
+    except ValueError as err:
+        parser.error(str(err))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
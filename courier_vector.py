@@ -0,0 +1,247 @@
+import time
+from collections import namedtuple
+
+import numpy as np
+
+import courier_of_possibilities as game
+
+# ==========================
+# Rule Tables
+# ==========================
+# Everything apply_parcel_effects / mission_phase / paradox_phase decide
+# without randomness is flattened into small integer arrays up front, so a
+# step over K games is a handful of gathers and adds.
+
+JITTER = np.array(game.HARMONY_JITTER, dtype=np.int32)
+
+ENDING_CODES = [game.ENDING_GOLDEN, game.ENDING_BITTERSWEET, game.ENDING_CHAOTIC]
+NO_ENDING = -1
+
+
+class RuleTables:
+    def __init__(self):
+        parcels = game.PARCELS
+        civs = game.CIVILIZATIONS
+        self.tags = list(game.INFLUENCE_TAGS)
+
+        effects = np.array(game.EFFECT_TABLE, dtype=np.int32).reshape(len(parcels), len(civs), 3)
+        self.harmony = effects[:, :, 0]
+        self.chaos = effects[:, :, 1]
+        self.ripple = effects[:, :, 2]
+
+        self.delivery = effects.reshape(-1, 3)
+
+        self.parcel_tags = np.zeros((len(parcels), len(self.tags)), dtype=np.int32)
+        for p, parcel in enumerate(parcels):
+            for slot in parcel["influence_slots"]:
+                self.parcel_tags[p, slot] = 1
+
+        self.mission_harmony = np.array([d["harmony"] for _, d, _ in game.MISSION_OPTIONS], dtype=np.int32)
+        self.mission_chaos = np.array([d["chaos"] for _, d, _ in game.MISSION_OPTIONS], dtype=np.int32)
+        self.mission_ripple = np.array([d["ripple"] for _, d, _ in game.MISSION_OPTIONS], dtype=np.int32)
+        self.mission = np.stack([self.mission_harmony, self.mission_chaos, self.mission_ripple], axis=-1)
+
+        self.paradox_ripple = np.array(
+            [[d["ripple"] for _, d, _ in s["options"]] for s in game.PARADOX_SCENARIOS], dtype=np.int32
+        )
+        self.paradox_harmony = np.array(
+            [[d["harmony_all"] for _, d, _ in s["options"]] for s in game.PARADOX_SCENARIOS], dtype=np.int32
+        )
+
+        self.final_points = np.array(
+            [[points for _, points, _ in opts] for _, opts in game.FINAL_PUZZLE_STEPS], dtype=np.int32
+        )
+
+
+# ==========================
+# Vectorized Environment
+# ==========================
+
+VectorStep = namedtuple(
+    "VectorStep",
+    "active harmony_delta chaos_delta ripple_delta paradox scenario unlock_offered ending",
+)
+
+
+class VectorCourierEnv:
+    # K independent games held as arrays. Games that finish (final puzzle
+    # unlocked, or max_turns reached) stay frozen until reset().
+
+    def __init__(self, num_games, seed=None, max_turns=None, tables=None):
+        self.num_games = num_games
+        self.max_turns = max_turns
+        self.tables = tables or RuleTables()
+        self.rng = np.random.default_rng(seed)
+        self.num_parcels, self.num_civs = self.tables.harmony.shape
+        self._rows = np.arange(num_games)
+        self.reset()
+
+    def reset(self, mask=None):
+        k, c, t = self.num_games, self.num_civs, len(self.tables.tags)
+        if mask is None:
+            self.harmony = np.zeros((k, c), dtype=np.int32)
+            self.chaos = np.zeros((k, c), dtype=np.int32)
+            self.tag_influence = np.zeros((k, t), dtype=np.int32)
+            self.ripple_index = np.zeros(k, dtype=np.int32)
+            self.turn = np.zeros(k, dtype=np.int32)
+            self.delivered = np.zeros(k, dtype=np.int32)
+            self.paradoxes_triggered = np.zeros(k, dtype=np.int32)
+            self.paradoxes_resolved = np.zeros(k, dtype=np.int32)
+            self.unlocked_final = np.zeros(k, dtype=bool)
+            self.done = np.zeros(k, dtype=bool)
+            self.ending = np.full(k, NO_ENDING, dtype=np.int8)
+            return
+        for name in (
+            "harmony", "chaos", "tag_influence", "ripple_index", "turn", "delivered",
+            "paradoxes_triggered", "paradoxes_resolved", "unlocked_final", "done",
+        ):
+            getattr(self, name)[mask] = 0
+        self.ending[mask] = NO_ENDING
+
+    def offers(self, count=5):
+        # Uniform random `count`-subsets of the catalog per game, like offer_parcels.
+        keys = self.rng.random((self.num_games, self.num_parcels), dtype=np.float32)
+        return np.argpartition(keys, count - 1, axis=1)[:, :count]
+
+    def step(self, parcel, civ, advice, patch=0, attempt_final=True, final_answers=None,
+             jitter=None, paradox_scenario=None):
+        # parcel/civ/advice/patch: int arrays of shape (K,) (or scalars).
+        # jitter and paradox_scenario can be passed in to replay a known
+        # sequence of draws; otherwise they come from self.rng.
+        tb = self.tables
+        k = self.num_games
+        active = ~self.done
+        parcel = np.broadcast_to(np.asarray(parcel, dtype=np.intp), (k,))
+        civ = np.broadcast_to(np.asarray(civ, dtype=np.intp), (k,))
+        advice = np.broadcast_to(np.asarray(advice, dtype=np.intp), (k,))
+        patch = np.broadcast_to(np.asarray(patch, dtype=np.intp), (k,))
+        # Frozen games get all-zero deltas. The common all-active case skips
+        # the masking multiplies entirely.
+        everyone = bool(active.all())
+        on = None if everyone else active.astype(np.int32)
+
+        # -- delivery (resolve_delivery)
+        if jitter is None:
+            jitter = JITTER[self.rng.integers(0, len(JITTER), size=k)]
+        deltas = tb.delivery[parcel * self.num_civs + civ]  # (K, 3): harmony, chaos, ripple
+        harmony_delta = deltas[:, 0] + jitter
+        chaos_delta = deltas[:, 1]
+        ripple_delta = deltas[:, 2]
+        tag_delta = tb.parcel_tags[parcel]
+
+        # -- mission advice (apply_mission_advice)
+        mission = tb.mission[advice]  # (K, 3)
+
+        # Harmony and chaos are never clamped, so the delivery and mission
+        # deltas for the same civ land in a single scatter.
+        civ_harmony = harmony_delta + mission[:, 0]
+        civ_chaos = chaos_delta + mission[:, 1]
+        mission_ripple = mission[:, 2]
+        if not everyone:
+            harmony_delta *= on
+            chaos_delta = chaos_delta * on
+            ripple_delta = ripple_delta * on
+            tag_delta *= on[:, None]
+            civ_harmony *= on
+            civ_chaos *= on
+            mission_ripple = mission_ripple * on
+        flat = self._rows * self.num_civs + civ
+        self.harmony.ravel()[flat] += civ_harmony
+        self.chaos.ravel()[flat] += civ_chaos
+        self.tag_influence += tag_delta
+        max_ripple = game.MAX_RIPPLE
+        np.clip(self.ripple_index + ripple_delta, 0, max_ripple, out=self.ripple_index)
+        np.clip(self.ripple_index + mission_ripple, 0, max_ripple, out=self.ripple_index)
+        self.turn += active
+        self.delivered += active
+
+        # -- paradox (trigger_paradox + apply_paradox_patch)
+        paradox = active & (self.ripple_index >= game.PARADOX_THRESHOLD)
+        if paradox_scenario is None:
+            paradox_scenario = self.rng.integers(0, len(tb.paradox_ripple), size=k)
+        paradox_scenario = np.where(paradox, paradox_scenario, -1)
+        if paradox.any():
+            scn = paradox_scenario[paradox]
+            chosen = patch[paradox]
+            self.harmony[paradox] += tb.paradox_harmony[scn, chosen][:, None]
+            self.ripple_index[paradox] = np.clip(
+                self.ripple_index[paradox] + tb.paradox_ripple[scn, chosen], 0, max_ripple
+            )
+            self.paradoxes_triggered += paradox
+            self.paradoxes_resolved += paradox
+
+        # -- final puzzle unlock (final_puzzle_ready + ending_for)
+        unlock_offered = (
+            active
+            & ~self.unlocked_final
+            & (self.delivered >= 8)
+            & (self.harmony.sum(axis=1) >= -self.num_civs)  # average harmony >= -1
+            & (self.ripple_index <= int(max_ripple * 0.8))
+        )
+        unlocking = unlock_offered & np.broadcast_to(np.asarray(attempt_final, dtype=bool), (k,))
+        self.unlocked_final |= unlocking
+        if final_answers is not None and unlocking.any():
+            answers = np.broadcast_to(np.asarray(final_answers, dtype=np.intp), (k, len(tb.final_points)))
+            score = tb.final_points[np.arange(len(tb.final_points)), answers].sum(axis=1)
+            ending = np.where(
+                (score >= 3) & (self.ripple_index <= game.PARADOX_THRESHOLD),
+                0,
+                np.where((score >= 2) & (self.ripple_index < max_ripple), 1, 2),
+            )
+            self.ending[unlocking] = ending[unlocking]
+
+        self.done |= unlocking
+        if self.max_turns is not None:
+            self.done |= self.turn >= self.max_turns
+
+        return VectorStep(
+            active, harmony_delta, chaos_delta, ripple_delta, paradox,
+            paradox_scenario, unlock_offered, self.ending.copy(),
+        )
+
+    def load_state(self, i, state):
+        self.harmony[i] = state.harmony_values()
+        self.chaos[i] = state.chaos
+        self.tag_influence[i] = state.tag_counts
+        self.ripple_index[i] = state.ripple_index
+        self.turn[i] = state.turn
+        self.delivered[i] = state.deliveries.total
+        self.paradoxes_triggered[i] = state.paradoxes_triggered
+        self.paradoxes_resolved[i] = state.paradoxes_resolved
+        self.unlocked_final[i] = state.unlocked_final
+        self.done[i] = state.unlocked_final or state.game_over
+        self.ending[i] = NO_ENDING
+
+    def summary(self, i):
+        # Plain-Python view of game i, handy for comparing against GameState.
+        return {
+            "harmony": self.harmony[i].tolist(),
+            "chaos": self.chaos[i].tolist(),
+            "tag_influence": dict(zip(self.tables.tags, self.tag_influence[i].tolist())),
+            "ripple_index": int(self.ripple_index[i]),
+            "turn": int(self.turn[i]),
+            "delivered": int(self.delivered[i]),
+            "paradoxes_triggered": int(self.paradoxes_triggered[i]),
+            "paradoxes_resolved": int(self.paradoxes_resolved[i]),
+            "unlocked_final": bool(self.unlocked_final[i]),
+            "ending": ENDING_CODES[self.ending[i]] if self.ending[i] != NO_ENDING else None,
+        }
+
+
+def _benchmark(num_games=100_000, steps=20, seed=0):
+    env = VectorCourierEnv(num_games, seed=seed)
+    rng = np.random.default_rng(seed + 1)
+    started = time.perf_counter()
+    for _ in range(steps):
+        offer = env.offers()
+        parcel = offer[:, 0]
+        civ = rng.integers(0, env.num_civs, size=num_games)
+        advice = rng.integers(0, len(game.MISSION_OPTIONS), size=num_games)
+        env.step(parcel, civ, advice, patch=1, final_answers=(1, 0, 0))
+    elapsed = time.perf_counter() - started
+    print(f"{num_games:,} games x {steps} steps: {1000 * elapsed / steps:.1f} ms/step "
+          f"({num_games * steps / elapsed:,.0f} game-turns/s)")
+
+
+if __name__ == "__main__":
+    _benchmark()
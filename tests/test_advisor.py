@@ -0,0 +1,61 @@
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import pytest
+
+import courier_of_possibilities as game
+from courier_advisor import CourierAdvisor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PACK = {
+    "name": "Test Pack",
+    "parcels": [{"id": "test_parcel", "name": "Test Parcel", "tags": ["quiet", "test"], "base_ripple": 7}],
+    "civilizations": [{"id": "test_civ", "name": "Testers", "motto": "Again.", "preferred_tags": ["test"],
+                       "hated_tags": []}],
+}
+
+# Runs in a fresh interpreter: installs the pack, then has a pool worker
+# work out the effect classes from its own catalog.
+WORKER_CATALOG = """
+import multiprocessing, sys
+multiprocessing.set_start_method(sys.argv[1])
+import courier_advisor
+from courier_content import install_packs
+
+install_packs([sys.argv[2]])
+advisor = courier_advisor.CourierAdvisor(workers=1, packs=[sys.argv[2]])
+try:
+    print(advisor.pool.submit(courier_advisor.effect_classes).result() == courier_advisor.effect_classes())
+finally:
+    advisor.close()
+"""
+
+
+@pytest.mark.parametrize("method", [m for m in ("fork", "spawn") if m in multiprocessing.get_all_start_methods()])
+def test_workers_see_the_content_packs(tmp_path, method):
+    path = tmp_path / "pack.json"
+    path.write_text(json.dumps(PACK))
+    env = dict(os.environ, XDG_CACHE_HOME=str(tmp_path / "cache"))
+    done = subprocess.run([sys.executable, "-c", WORKER_CATALOG, method, str(path)], cwd=ROOT, env=env,
+                          capture_output=True, text=True, timeout=60)
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.split() == ["True"]
+
+
+def test_no_offer_no_advice():
+    assert CourierAdvisor(budget=0.01, seed=1).advise(game.GameState(), []) is None
+
+
+def test_advice_is_on_offer_and_leaves_the_state_alone():
+    state = game.GameState()
+    before = state.key()
+    offer = game.PARCELS[:3]
+    advisor = CourierAdvisor(budget=0.02, seed=1)
+    advice = advisor.advise(state.fork(), offer)
+    assert advice.parcel in offer
+    assert advice.civ in game.CIVILIZATIONS
+    assert state.key() == before
@@ -0,0 +1,150 @@
+import io
+import random
+import re
+
+from courier_terminal import ANSI_ESCAPE, AnsiTerminal, Renderer
+
+CONTROL = re.compile(r"\x1b\[([0-9;?]*)([A-Za-z])|\r|\n|[^\x1b\r\n]")
+
+
+class Screen:
+    # Just enough of a terminal to replay what the renderer sends: cursor
+    # moves, erases, CR/LF and printable text. Colors are ignored.
+
+    def __init__(self):
+        self.rows = [[]]
+        self.row = self.col = 0
+
+    def feed(self, data):
+        for match in CONTROL.finditer(data):
+            token = match.group(0)
+            if token == "\r":
+                self.col = 0
+            elif token == "\n":
+                self.row += 1
+                self.col = 0
+            elif match.group(2):
+                self._escape(match.group(1), match.group(2))
+            else:
+                self._put(token)
+
+    def _escape(self, args, kind):
+        numbers = [int(n) for n in args.split(";") if n]
+        if kind == "H":
+            row, col = (numbers + [1, 1])[:2] if numbers else (1, 1)
+            self.row, self.col = row - 1, col - 1
+        elif kind == "G":
+            self.col = numbers[0] - 1
+        elif kind == "K":
+            del self._line()[self.col:]
+        elif kind == "J":
+            if numbers and numbers[0] in (2, 3):
+                self.rows = [[]]
+            else:
+                del self._line()[self.col:]
+                del self.rows[self.row + 1:]
+
+    def _line(self):
+        while len(self.rows) <= self.row:
+            self.rows.append([])
+        return self.rows[self.row]
+
+    def _put(self, char):
+        line = self._line()
+        line.extend(" " * (self.col - len(line)))
+        if self.col < len(line):
+            line[self.col] = char
+        else:
+            line.append(char)
+        self.col += 1
+
+    def text(self):
+        rows = ["".join(row).rstrip() for row in self.rows]
+        while len(rows) > 1 and not rows[-1]:
+            rows.pop()
+        return rows
+
+
+def shown(renderer):
+    rows = [ANSI_ESCAPE.sub("", line).rstrip() for line in renderer._lines]
+    while len(rows) > 1 and not rows[-1]:
+        rows.pop()
+    return rows
+
+
+def random_line(rng):
+    words = ["harmony", "chaos", "ripple", "parcel", "[1]", "==", "Vel'Thar", "ok"]
+    parts = []
+    for _ in range(rng.randrange(6)):
+        word = rng.choice(words)
+        if rng.random() < 0.3:
+            word = f"\x1b[{rng.choice([1, 31, 32, 35])}m{word}\x1b[0m"
+        parts.append(word)
+    return " ".join(parts)
+
+
+def renderer_and_screen():
+    stream = io.StringIO()
+    renderer = Renderer(stream=stream, terminal=AnsiTerminal(stream), differential=True, size=(100, 40))
+    return renderer, stream
+
+
+# ==========================
+# Differential Frames
+# ==========================
+
+def test_diffed_frames_rebuild_the_screen():
+    rng = random.Random(5)
+    renderer, stream = renderer_and_screen()
+    screen = Screen()
+    frame = [random_line(rng) for _ in range(8)]
+    for _ in range(300):
+        # Mostly small edits to the last frame, now and then a new screen.
+        if rng.random() < 0.1:
+            frame = [random_line(rng) for _ in range(rng.randrange(1, 20))]
+        else:
+            frame = list(frame)
+            for _ in range(rng.randrange(1, 4)):
+                at = rng.randrange(len(frame) + 1)
+                if at == len(frame) or rng.random() < 0.2:
+                    frame.insert(at, random_line(rng))
+                elif rng.random() < 0.2 and len(frame) > 1:
+                    del frame[at]
+                else:
+                    words = frame[at].split(" ")
+                    frame[at] = " ".join(words[: rng.randrange(len(words) + 1)] + [random_line(rng)])
+        renderer.clear()
+        renderer.write("\n".join(frame))
+        renderer.flush()
+        screen.feed(stream.getvalue())
+        stream.seek(0)
+        stream.truncate()
+        assert screen.text() == shown(renderer)
+        last = renderer._lines
+        assert (screen.row, screen.col) == (len(last) - 1, len(ANSI_ESCAPE.sub("", last[-1])))
+
+
+def test_rewrite_patches_a_line_and_keeps_the_cursor():
+    rng = random.Random(9)
+    renderer, stream = renderer_and_screen()
+    screen = Screen()
+    renderer.clear()
+    renderer.write("\n".join(random_line(rng) for _ in range(6)) + "\nPrompt: ")
+    renderer.flush()
+    for _ in range(100):
+        assert renderer.rewrite(rng.randrange(1, 7), random_line(rng))
+        renderer.flush()
+        screen.feed(stream.getvalue())
+        stream.seek(0)
+        stream.truncate()
+        assert screen.text() == shown(renderer)
+        assert (screen.row, screen.col) == (6, len("Prompt: "))
+
+
+def test_rewrite_declines_without_a_known_screen():
+    renderer = Renderer(stream=io.StringIO(), terminal=AnsiTerminal(), differential=False, size=(100, 40))
+    renderer.clear()
+    renderer.write("status\nPrompt: ")
+    renderer.flush()
+    assert not renderer.rewrite(1, "new status")
+    assert renderer._lines[0] == "status"
@@ -0,0 +1,43 @@
+import random
+
+import courier_of_possibilities as game
+
+
+def random_action(rng):
+    return game.TurnAction(
+        rng.choice(game.PARCELS), rng.choice(game.CIVILIZATIONS),
+        rng.randrange(len(game.MISSION_OPTIONS)), rng.randrange(3), False,
+    )
+
+
+def test_preview_matches_the_delivery():
+    # Every preview of every offer along a random game: chaos and ripple
+    # exactly, harmony up to the jitter the delivery actually rolled.
+    rng = random.Random(5)
+    state = game.GameState()
+    streams = game.RngStreams(5)
+    for _ in range(60):
+        offer = game.offer_parcels(rng)
+        rows = game.preview_deliveries(state, offer)
+        for parcel, row in zip(offer, rows):
+            for civ, preview in zip(game.CIVILIZATIONS, row):
+                branch = state.fork()
+                result = game.resolve_delivery(branch, parcel, civ, rng)
+                jitter = result.harmony_delta - game.EFFECT_TABLE[parcel["index"]][civ["index"]][0]
+                ci = civ["index"]
+                assert preview.harmony - game.JITTER_MEAN + jitter == branch.harmony_of(ci)
+                assert preview.chaos == branch.chaos[ci]
+                assert preview.ripple == branch.ripple_index
+                assert preview.spread == game.JITTER_SPREAD
+        game.step(state, random_action(rng), streams)
+    assert state.paradoxes_triggered  # the offset path got exercised too
+
+
+def test_preview_of_a_civ_subset():
+    state = game.GameState()
+    game.step(state, random_action(random.Random(1)), game.RngStreams(1))
+    civs = game.CIVILIZATIONS[1::2]
+    full = game.preview_deliveries(state, game.PARCELS)
+    some = game.preview_deliveries(state, game.PARCELS, civs)
+    for row_full, row_some in zip(full, some):
+        assert row_some == [row_full[civ["index"]] for civ in civs]
@@ -0,0 +1,90 @@
+import random
+import struct
+
+import pytest
+
+import courier_of_possibilities as game
+
+
+def play_turns(save, state, streams, turns, rng):
+    # Plays `turns` turns through step(), saving each one the way
+    # _play_turns does.
+    for _ in range(turns):
+        parcel = rng.choice(game.PARCELS)
+        civ = rng.choice(game.CIVILIZATIONS)
+        action = game.TurnAction(parcel, civ, rng.randrange(3), 1, False)
+        game.step(state, action, streams)
+        save.turn(state, parcel, civ, action.advice, action.paradox_patch, None)
+
+
+def test_round_trip_across_compactions(tmp_path, monkeypatch):
+    monkeypatch.setattr(game, "COMPACT_EVERY", 4)
+    path = str(tmp_path / "game.save")
+    state = game.GameState()
+    save = game.SaveFile(path, 7, state)
+    streams = game.RngStreams(7)
+    rng = random.Random(1)
+    for turns in (1, 3, 4, 6):  # before, at and past a compaction
+        play_turns(save, state, streams, turns, rng)
+        seed, loaded, ending = game.load_save(path)
+        assert (seed, ending) == (7, None)
+        assert loaded.key() == state.key()
+    save.close()
+
+
+def test_finished_game_is_not_offered(tmp_path):
+    path = str(tmp_path / "game.save")
+    state = game.GameState()
+    save = game.SaveFile(path, 3, state)
+    play_turns(save, state, game.RngStreams(3), 2, random.Random(2))
+    save.finish(game.ENDING_BITTERSWEET)
+    save.close()
+    assert game.load_save(path)[2] == game.ENDING_BITTERSWEET
+    assert game.load_unfinished(path) is None
+
+
+def test_torn_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / "game.save")
+    state = game.GameState()
+    save = game.SaveFile(path, 5, state)
+    play_turns(save, state, game.RngStreams(5), 3, random.Random(3))
+    save.close()
+    with open(path, "ab") as f:
+        f.write(game.RECORD_HEAD.pack(game.TURN_RECORD.size, game.RECORD_TURN) + b"\x04")
+    assert game.load_save(path)[1].key() == state.key()
+
+
+def test_unusable_saves_are_refused(tmp_path, monkeypatch):
+    path = str(tmp_path / "game.save")
+    with open(path, "wb") as f:
+        f.write(b"not a save")
+    with pytest.raises(ValueError):
+        game.existing_save(path)
+    assert game.existing_save(path, new_game=True) is None
+
+    game.SaveFile(path, 9, game.GameState()).close()
+    monkeypatch.setattr(game, "catalog_fingerprint", lambda: b"\0" * 8)
+    with pytest.raises(ValueError, match="catalog"):
+        game.existing_save(path)
+
+
+def test_seed_does_not_replace_an_unfinished_game(tmp_path):
+    path = str(tmp_path / "game.save")
+    state = game.GameState()
+    save = game.SaveFile(path, 11, state)
+    play_turns(save, state, game.RngStreams(11), 2, random.Random(4))
+    save.close()
+    with pytest.raises(ValueError, match="unfinished"):
+        game.existing_save(path, seed=7)
+    seed, loaded = game.existing_save(path)
+    assert seed == 11 and loaded.key() == state.key()
+    assert game.existing_save(str(tmp_path / "missing.save"), seed=7) is None
+
+
+def test_snapshot_holds_every_allowed_seed():
+    state = game.GameState()
+    seeds = game.SEED_RANGE
+    for seed in (seeds.start, seeds.stop - 1):
+        assert game.unpack_snapshot(game.pack_snapshot(state, seed))[0] == seed
+    with pytest.raises(struct.error):
+        game.pack_snapshot(state, seeds.stop)
@@ -0,0 +1,187 @@
+import pickle
+import random
+
+import courier_of_possibilities as game
+
+
+def random_action(rng):
+    return game.TurnAction(
+        rng.choice(game.PARCELS), rng.choice(game.CIVILIZATIONS),
+        rng.randrange(len(game.MISSION_OPTIONS)), rng.randrange(3), False,
+    )
+
+
+def played(turns, seed, history=None):
+    state = game.GameState(history)
+    streams = game.RngStreams(seed)
+    rng = random.Random(seed)
+    for _ in range(turns):
+        game.step(state, random_action(rng), streams)
+    return state
+
+
+def snapshot(state):
+    return state.key(), list(state.deliveries), list(state.notes), dict(state.civ_states[game.CIVILIZATIONS[0]["id"]])
+
+
+# ==========================
+# Forks and Undo
+# ==========================
+
+
+def test_fork_is_isolated_both_ways():
+    parent = played(12, 1)
+    before = snapshot(parent)
+    child = parent.fork()
+    assert snapshot(child) == before
+
+    rng = random.Random(2)
+    for _ in range(6):
+        game.step(child, random_action(rng), game.RngStreams(2))
+    assert snapshot(parent) == before
+
+    after_child = snapshot(child)
+    for _ in range(6):
+        game.step(parent, random_action(rng), game.RngStreams(3))
+    assert snapshot(child) == after_child
+
+
+def test_view_writes_do_not_leak_across_a_fork():
+    parent = played(5, 4)
+    child = parent.fork()
+    civ_id = game.CIVILIZATIONS[2]["id"]
+    tag = game.INFLUENCE_TAGS[0]
+    child.civ_states[civ_id]["harmony"] += 7
+    child.civ_states[civ_id]["chaos"] -= 3
+    child.tag_influence[tag] += 1
+    assert parent.civ_states[civ_id]["harmony"] == child.civ_states[civ_id]["harmony"] - 7
+    assert parent.civ_states[civ_id]["chaos"] == child.civ_states[civ_id]["chaos"] + 3
+    assert parent.tag_influence[tag] == child.tag_influence[tag] - 1
+
+
+def test_undo_replays_the_same_turn():
+    # _play_turns keeps a fork from the start of each turn; going back to
+    # it and playing the turn again draws the same numbers.
+    state = played(8, 6)
+    streams = game.RngStreams(6)
+    action = random_action(random.Random(7))
+    start = state.fork()
+    first = game.step(state, action, streams)
+    played_once = snapshot(state)
+
+    state = start
+    retry = state.fork()
+    assert game.step(state, action, streams) == first
+    assert snapshot(state) == played_once
+    assert retry.turn == 8  # the kept fork is still at the start of the turn
+
+
+def test_clone_is_private_from_the_start():
+    state = played(4, 8)
+    copy = state.clone()
+    assert not state.shared and not copy.shared
+    copy.add_harmony(0, 5)
+    assert state.harmony_of(0) == copy.harmony_of(0) - 5
+    assert pickle.loads(pickle.dumps(state)).key() == state.key()
+
+
+# ==========================
+# Bounded History
+# ==========================
+
+
+def chain_length(log):
+    node, length = log.head, 0
+    while node is not None:
+        node, length = node[1], length + 1
+    return length
+
+
+def test_bounded_history_soak():
+    # An --endless session against an unbounded one over the same turns:
+    # same rules state, at most 2 * limit log nodes held, and the newest
+    # `limit` entries and per-civ counts still right.
+    limit = game.HISTORY_WINDOW
+    bounded = game.GameState(limit)
+    full = game.GameState()
+    rng = random.Random(9)
+    for turn in range(1, 3001):
+        action = random_action(rng)
+        game.step(bounded, action, game.RngStreams(turn))
+        game.step(full, action, game.RngStreams(turn))
+        if turn % 250 == 0:
+            assert bounded.key() == full.key()
+            for log in (bounded.deliveries, bounded.notes):
+                assert chain_length(log) == len(log) < 2 * limit
+            assert bounded.deliveries.total == full.deliveries.total == turn
+            assert list(bounded.deliveries)[-limit:] == list(full.deliveries)[-limit:]
+            assert list(bounded.notes)[-limit:] == list(full.notes)[-limit:]
+    assert not bounded.deliveries.complete()
+    for civ in game.CIVILIZATIONS:
+        received = bounded.civ_states[civ["id"]]["received"]
+        assert sorted(received) == sorted(full.civ_states[civ["id"]]["received"])
+
+
+def test_bounded_history_survives_forks_and_pickling():
+    state = played(300, 10, history=16)
+    branch = state.fork()
+    game.step(branch, random_action(random.Random(11)), game.RngStreams(11))
+    assert len(state.deliveries) < 32 and state.deliveries.total == 300
+    assert branch.deliveries.total == 301
+    copy = pickle.loads(pickle.dumps(state))
+    assert copy.key() == state.key()
+    assert list(copy.deliveries) == list(state.deliveries)
+    assert copy.deliveries.limit == 16 and copy.deliveries.total == 300
+
+
+# ==========================
+# Aggregates
+# ==========================
+
+
+def check_aggregates(state):
+    # The running aggregates against a recount from scratch.
+    harmony = list(state.harmony_values())
+    chaos = list(state.chaos)
+    fresh = state.clone()
+    fresh.rebuild_aggregates()
+    assert state.harmony_total == fresh.harmony_total == sum(state.base_harmony)
+    assert state.chaos_total == fresh.chaos_total == sum(chaos)
+    assert {d: n for d, n in state.spreads.items() if n} == fresh.spreads
+    assert state.harmony_sum() == sum(harmony)
+    moods = [game.civ_mood(h, ch) for h, ch in zip(harmony, chaos)]
+    content, balanced, wobbly = state.mood_counts()
+    assert (content, balanced, wobbly) == (
+        moods.count("glowingly content"), moods.count("balanced"), moods.count("dramatically wobbly"),
+    )
+    low, high = state.harmony_extremes()
+    assert harmony[low] == min(harmony) and harmony[high] == max(harmony)
+
+
+def test_incremental_aggregates_match_a_recount():
+    # 20k random steps mixing turns, view writes, paradox-style shifts,
+    # forks and pickling.
+    rng = random.Random(12)
+    states = [game.GameState()]
+    streams = game.RngStreams(12)
+    civ_ids = [civ["id"] for civ in game.CIVILIZATIONS]
+    for i in range(20000):
+        state = rng.choice(states)
+        roll = rng.random()
+        if roll < 0.5:
+            game.step(state, random_action(rng), streams)
+        elif roll < 0.65:
+            view = state.civ_states[rng.choice(civ_ids)]
+            view[rng.choice(("harmony", "chaos"))] += rng.randint(-4, 4)
+        elif roll < 0.8:
+            state.add_harmony_all(rng.randint(-3, 3))
+        elif roll < 0.95:
+            if len(states) < 8:
+                states.append(state.fork())
+            else:
+                states[rng.randrange(len(states))] = state.fork()
+        else:
+            states[states.index(state)] = pickle.loads(pickle.dumps(state))
+        if i % 10 == 0:
+            for state in states:
+                check_aggregates(state)
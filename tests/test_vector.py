@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import courier_of_possibilities as game
+import courier_vector
+
+
+def scalar_summary(state, ending):
+    return {
+        "harmony": list(state.harmony_values()),
+        "chaos": list(state.chaos),
+        "tag_influence": dict(state.tag_influence),
+        "ripple_index": state.ripple_index,
+        "turn": state.turn,
+        "delivered": state.deliveries.total,
+        "paradoxes_triggered": state.paradoxes_triggered,
+        "paradoxes_resolved": state.paradoxes_resolved,
+        "unlocked_final": state.unlocked_final,
+        "ending": ending,
+    }
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_vector_env_matches_step_draw_for_draw(seed):
+    # Plays the same games through step() and VectorCourierEnv.step(),
+    # handing the vector env the jitter and paradox scenarios step() drew.
+    games = 64
+    answers = (1, 0, 0)
+    rng = random.Random(seed)
+    states = [game.GameState() for _ in range(games)]
+    rngs = [random.Random(f"{seed}:{i}") for i in range(games)]
+    endings = [None] * games
+    env = courier_vector.VectorCourierEnv(games, seed=seed)
+    for _ in range(40):
+        parcel = np.zeros(games, dtype=np.intp)
+        civ = np.zeros(games, dtype=np.intp)
+        advice = np.zeros(games, dtype=np.intp)
+        patch = np.zeros(games, dtype=np.intp)
+        jitter = np.zeros(games, dtype=np.int32)
+        scenario = np.zeros(games, dtype=np.intp)
+        for i, state in enumerate(states):
+            if state.unlocked_final:
+                continue  # finished: frozen in the vector env too
+            action = game.TurnAction(
+                rng.choice(game.PARCELS), rng.choice(game.CIVILIZATIONS),
+                rng.randrange(len(game.MISSION_OPTIONS)), rng.randrange(3), True, answers,
+            )
+            result = game.step(state, action, rngs[i])
+            parcel[i] = action.parcel["index"]
+            civ[i] = action.civ["index"]
+            advice[i] = action.advice
+            patch[i] = action.paradox_patch
+            base = game.EFFECT_TABLE[action.parcel["index"]][action.civ["index"]][0]
+            jitter[i] = result.delivery.harmony_delta - base
+            if result.paradox_scenario is not None:
+                scenario[i] = game.PARADOX_SCENARIOS.index(result.paradox_scenario)
+            if result.ending is not None:
+                endings[i] = result.ending
+        env.step(parcel, civ, advice, patch, final_answers=answers, jitter=jitter, paradox_scenario=scenario)
+        for i, state in enumerate(states):
+            assert env.summary(i) == scalar_summary(state, endings[i]), f"game {i}, turn {state.turn}"
+    assert env.unlocked_final.any() and env.paradoxes_triggered.any()